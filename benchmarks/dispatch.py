@@ -0,0 +1,116 @@
+"""
+Measures the dispatch overhead of the thread engine.
+
+The simulated crawl does not touch the network: every step "fetches" by
+sleeping for a fixed amount of time and then fans out a few children, which
+produces the short lulls where workers find the queue empty.
+
+Reported values:
+
+- time to first dispatch: from ``start()`` to the first step being executed
+- dispatch latency: from ``schedule()`` to the scheduled step being executed
+- tail idle time: from the last step finishing to ``start()`` returning
+
+Usage::
+
+    python benchmarks/dispatch.py [--workers 8] [--depth 4] [--fanout 3]
+"""
+
+import argparse
+import threading
+import time
+
+from crawlster import Crawlster, Configuration, start
+from crawlster.handlers.base import BaseItemHandler
+
+
+class NullHandler(BaseItemHandler):
+    def handle(self, item):
+        pass
+
+
+class FanOutCrawler(Crawlster):
+    item_handler = NullHandler()
+
+    fetch_time = 0.005
+    depth = 4
+    fanout = 3
+
+    def __init__(self, config):
+        self.lock = threading.Lock()
+        self.first_dispatch = None
+        self.last_finish = None
+        self.latencies = []
+        super(FanOutCrawler, self).__init__(config)
+
+    def record(self, scheduled_at):
+        now = time.perf_counter()
+        with self.lock:
+            if self.first_dispatch is None:
+                self.first_dispatch = now
+            if scheduled_at is not None:
+                self.latencies.append(now - scheduled_at)
+
+    def finished(self):
+        with self.lock:
+            self.last_finish = time.perf_counter()
+
+    @start
+    def step_start(self, url):
+        self.record(None)
+        self.fan_out(url, 0)
+        self.finished()
+
+    def step_page(self, url, level, scheduled_at):
+        self.record(scheduled_at)
+        time.sleep(self.fetch_time)
+        self.fan_out(url, level)
+        self.finished()
+
+    def fan_out(self, url, level):
+        if level >= self.depth:
+            return
+        for _ in range(self.fanout):
+            self.schedule(self.step_page, url, level + 1,
+                          time.perf_counter())
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def run(workers, depth, fanout):
+    FanOutCrawler.depth = depth
+    FanOutCrawler.fanout = fanout
+    crawler = FanOutCrawler(Configuration({
+        'core.start_urls': ['http://localhost/'],
+        'core.workers': workers,
+        'log.level': 'warning'
+    }))
+    started = time.perf_counter()
+    crawler.start()
+    returned = time.perf_counter()
+    latencies = crawler.latencies
+    ms = 1000
+    print('jobs:                    {}'.format(len(latencies) + 1))
+    print('total time:              {:.1f} ms'.format(
+        (returned - started) * ms))
+    print('time to first dispatch:  {:.2f} ms'.format(
+        (crawler.first_dispatch - started) * ms))
+    print('dispatch latency mean:   {:.2f} ms'.format(
+        sum(latencies) / len(latencies) * ms))
+    print('dispatch latency p99:    {:.2f} ms'.format(
+        percentile(latencies, 99) * ms))
+    print('tail idle time:          {:.2f} ms'.format(
+        (returned - crawler.last_finish) * ms))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--fanout', type=int, default=3)
+    args = parser.parse_args()
+    run(args.workers, args.depth, args.fanout)
@@ -0,0 +1,82 @@
+"""
+Compares the link extraction paths of the extract helper.
+
+For every page of a corpus, the absolute urls of the links are extracted
+with:
+
+- ``css``: ``extract.css(body, 'a, area', attr='href')`` followed by
+  ``urls.multi_join()``, with each available parser backend
+- ``links``: ``extract.links(body, url)``, which scans the raw bytes
+
+The pages are read from the ``.html`` files of a directory passed with
+``--corpus``; without it, a corpus of generated pages is used (see
+``benchmarks/parsers.py``).
+
+Reported values, per path: the average time per page, including the parsing
+for the ``css`` path, and the number of links found.
+
+Usage::
+
+    python benchmarks/links.py [--corpus DIR] [--pages 200] [--repeat 3]
+"""
+
+import argparse
+import time
+
+from parsers import generate_corpus, load_corpus
+
+from crawlster.helpers.extract import Content, PARSERS
+from crawlster.helpers.links import extract_links
+from crawlster.helpers.urls import UrlsHelper
+
+BASE_URL = 'http://example.com/dir/page.html'
+
+
+def css_links(parser):
+    urls = UrlsHelper()
+
+    def extract(page):
+        hrefs = Content(page, parser).css('a, area', get_attr='href')
+        return urls.multi_join(BASE_URL, hrefs)
+    return extract
+
+
+def scan_links(page):
+    return extract_links(page, BASE_URL)
+
+
+def measure(extract, corpus, repeat):
+    links = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for page in corpus:
+            links += len(extract(page))
+    elapsed = time.perf_counter() - started
+    return elapsed / (len(corpus) * repeat), links // repeat
+
+
+def main(args):
+    if args.corpus:
+        corpus = load_corpus(args.corpus)
+    else:
+        corpus = generate_corpus(args.pages)
+    corpus = [page.encode() for page in corpus]
+    print('{} pages, {:.1f} KiB per page'.format(
+        len(corpus), sum(map(len, corpus)) / len(corpus) / 1024))
+    paths = [('links', scan_links)]
+    for parser, backend in sorted(PARSERS.items()):
+        if backend.available:
+            paths.append(('css ({})'.format(parser), css_links(parser)))
+    ms = 1000
+    for name, extract in paths:
+        per_page, links = measure(extract, corpus, args.repeat)
+        print('{:<24} {:8.2f} ms/page {:8} links'.format(
+            name, per_page * ms, links))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--corpus')
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    main(parser.parse_args())
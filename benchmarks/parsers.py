@@ -0,0 +1,114 @@
+"""
+Compares the parser backends of the extract helper.
+
+Each available backend parses every page of a corpus, then extracts the
+links from it with ``css('a', get_attr='href')``. The pages are read from
+the ``.html`` files of a directory passed with ``--corpus`` (e.g. pages saved
+from the sites you crawl); without it, a corpus of generated pages is used.
+
+Reported values, per backend:
+
+- the average parse time per page
+- the average link extraction time per page
+- the memory used by the parsed pages, per page
+
+The memory is measured in a separate process per backend, as the growth of
+its peak resident set size while it keeps all the parsed pages, because the
+C based parsers do not allocate through the Python allocator.
+
+Usage::
+
+    python benchmarks/parsers.py [--corpus DIR] [--pages 200] [--repeat 3]
+"""
+
+import argparse
+import glob
+import multiprocessing
+import os
+import random
+import resource
+import time
+
+from crawlster.helpers.extract import Content, PARSERS
+
+
+def generate_corpus(pages):
+    rng = random.Random(0)
+    corpus = []
+    for page in range(pages):
+        rows = ''.join(
+            '<li class="item"><a href="/page/{0}/{1}" rel="next">Item '
+            '<b>{1}</b></a><p>{2}</p></li>'.format(
+                page, index, 'lorem ipsum ' * rng.randint(5, 50))
+            for index in range(rng.randint(50, 300)))
+        corpus.append(
+            '<!DOCTYPE html><html><head><title>Page {}</title></head><body>'
+            '<div id="main"><ul>{}</ul></div><br><img src="/logo.png">'
+            '</body></html>'.format(page, rows))
+    return corpus
+
+
+def load_corpus(directory):
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.htm*'))):
+        with open(path, 'rb') as f:
+            corpus.append(f.read().decode('utf-8', errors='replace'))
+    return corpus
+
+
+def measure_time(parser, corpus, repeat):
+    parse_time = select_time = 0
+    links = 0
+    for _ in range(repeat):
+        for page in corpus:
+            content = Content(page, parser)
+            started = time.perf_counter()
+            content.parsed_data
+            parse_time += time.perf_counter() - started
+            started = time.perf_counter()
+            links += len(content.css('a', get_attr='href'))
+            select_time += time.perf_counter() - started
+    runs = len(corpus) * repeat
+    return parse_time / runs, select_time / runs, links // repeat
+
+
+def measure_memory(parser, corpus, results):
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    trees = [Content(page, parser).parsed_data for page in corpus]
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((after - before) * 1024 / len(trees))
+
+
+def main(args):
+    if args.corpus:
+        corpus = load_corpus(args.corpus)
+    else:
+        corpus = generate_corpus(args.pages)
+    size = sum(len(page) for page in corpus)
+    print('{} pages, {:.1f} KiB per page'.format(
+        len(corpus), size / len(corpus) / 1024))
+    ms = 1000
+    for parser, backend in sorted(PARSERS.items()):
+        if not backend.available:
+            print('{} parser not installed'.format(parser))
+            continue
+        parse, select, links = measure_time(parser, corpus, args.repeat)
+        results = multiprocessing.Queue()
+        process = multiprocessing.Process(
+            target=measure_memory, args=(parser, corpus, results))
+        process.start()
+        memory = results.get()
+        process.join()
+        print('{} parser'.format(parser))
+        print('  parse:             {:.2f} ms/page'.format(parse * ms))
+        print('  links:             {:.2f} ms/page ({} links)'.format(
+            select * ms, links))
+        print('  memory:            {:.0f} KiB/page'.format(memory / 1024))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--corpus')
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    main(parser.parse_args())
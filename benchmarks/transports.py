@@ -0,0 +1,185 @@
+"""
+Compares the requests (HTTP/1.1) and httpx (HTTP/2) transports.
+
+Both transports fetch the same number of pages with the same number of
+worker threads from a local server that answers after a fixed delay: an
+HTTP/1.1 server for the requests transport and an HTTP/2 server (with prior
+knowledge) for the httpx transport. Pass ``--url`` to fetch a real site with
+both transports instead, in which case the connection counts are not
+available.
+
+Reported values:
+
+- total time and requests per second
+- request latency percentiles
+- the number of connections accepted by the server
+
+Requires ``httpx[http2]``.
+
+Usage::
+
+    python benchmarks/transports.py [--workers 32] [--requests 500]
+                                    [--delay 0.01] [--url URL]
+"""
+
+import argparse
+import http.server
+import socketserver
+import threading
+import time
+
+from crawlster import Crawlster, Configuration, start
+from crawlster.handlers.base import BaseItemHandler
+
+BODY = b'x' * 2048
+
+
+class NullHandler(BaseItemHandler):
+    def handle(self, item):
+        pass
+
+
+class FetchCrawler(Crawlster):
+    item_handler = NullHandler()
+
+    url = None
+    requests = 500
+
+    def __init__(self, config):
+        self.lock = threading.Lock()
+        self.latencies = []
+        super(FetchCrawler, self).__init__(config)
+
+    @start
+    def step_start(self, url):
+        for index in range(self.requests):
+            self.schedule(self.step_fetch, index)
+
+    def step_fetch(self, index):
+        started = time.perf_counter()
+        resp = self.http.get('{}/{}'.format(self.url, index))
+        elapsed = time.perf_counter() - started
+        if resp is None:
+            return
+        with self.lock:
+            self.latencies.append(elapsed)
+
+
+class Http1Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    delay = 0.01
+    connections = 0
+
+    def setup(self):
+        type(self).connections += 1
+        super(Http1Handler, self).setup()
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+class Http2Handler(socketserver.BaseRequestHandler):
+    """HTTP/2 server answering each stream from a timer thread"""
+    delay = 0.01
+    connections = 0
+
+    def handle(self):
+        import h2.config
+        import h2.connection
+        import h2.events
+
+        type(self).connections += 1
+        conn = h2.connection.H2Connection(
+            config=h2.config.H2Configuration(client_side=False))
+        lock = threading.Lock()
+
+        def respond(stream_id):
+            with lock:
+                conn.send_headers(stream_id, [
+                    (':status', '200'), ('content-length', str(len(BODY)))])
+                conn.send_data(stream_id, BODY, end_stream=True)
+                self.request.sendall(conn.data_to_send())
+
+        with lock:
+            conn.initiate_connection()
+            self.request.sendall(conn.data_to_send())
+        while True:
+            data = self.request.recv(65535)
+            if not data:
+                break
+            with lock:
+                for event in conn.receive_data(data):
+                    if isinstance(event, h2.events.RequestReceived):
+                        threading.Timer(self.delay, respond,
+                                        (event.stream_id,)).start()
+                self.request.sendall(conn.data_to_send())
+
+
+def serve(server_cls, handler_cls):
+    server = server_cls(('127.0.0.1', 0), handler_cls)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:{}'.format(server.server_address[1])
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def run(transport, url, workers, requests):
+    FetchCrawler.url = url
+    FetchCrawler.requests = requests
+    crawler = FetchCrawler(Configuration({
+        'core.start_urls': [url],
+        'core.workers': workers,
+        'log.level': 'warning',
+        'http.transport': transport,
+        'http.http2_prior_knowledge': url.startswith('http://')
+    }))
+    started = time.perf_counter()
+    crawler.start()
+    total = time.perf_counter() - started
+    latencies = crawler.latencies
+    ms = 1000
+    print('{} transport'.format(transport))
+    print('  requests:          {}/{}'.format(len(latencies), requests))
+    print('  total time:        {:.1f} ms'.format(total * ms))
+    print('  requests/s:        {:.0f}'.format(len(latencies) / total))
+    print('  latency p50:       {:.2f} ms'.format(
+        percentile(latencies, 50) * ms))
+    print('  latency p99:       {:.2f} ms'.format(
+        percentile(latencies, 99) * ms))
+
+
+def main(args):
+    if args.url:
+        run('requests', args.url, args.workers, args.requests)
+        run('httpx', args.url, args.workers, args.requests)
+        return
+    Http1Handler.delay = Http2Handler.delay = args.delay
+    server, url = serve(http.server.ThreadingHTTPServer, Http1Handler)
+    run('requests', url, args.workers, args.requests)
+    print('  connections:       {}'.format(Http1Handler.connections))
+    server.shutdown()
+    server, url = serve(socketserver.ThreadingTCPServer, Http2Handler)
+    run('httpx', url, args.workers, args.requests)
+    print('  connections:       {}'.format(Http2Handler.connections))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--delay', type=float, default=0.01)
+    parser.add_argument('--url')
+    main(parser.parse_args())
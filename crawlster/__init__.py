@@ -1,9 +1,10 @@
 from .config import Configuration, JsonConfiguration
-from .core import Crawlster, start
+from .core import Crawlster, start, cpu_bound
 
 __all__ = [
     'Crawlster',
     'Configuration',
     'JsonConfiguration',
-    'start'
+    'start',
+    'cpu_bound'
 ]
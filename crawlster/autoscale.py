@@ -0,0 +1,70 @@
+"""This module contains the policy used for resizing the worker pool."""
+import math
+
+from crawlster.exceptions import ConfigurationError
+
+
+class Autoscaler(object):
+    """Decides the size of the worker pool based on the current load.
+
+    The pool grows when there are more pending jobs than idle workers. If
+    the average fetch latency is known, it grows with the number of workers
+    required to drain the backlog within one interval (the jobs of a crawler
+    are usually dominated by the time spent waiting for responses),
+    otherwise with one worker per pending job. The pool never more than
+    doubles in one step.
+
+    The pool shrinks gradually, halving the number of idle workers, when
+    there are no pending jobs.
+    """
+
+    def __init__(self, min_workers, max_workers, interval):
+        """Initializes the policy
+
+        Args:
+            min_workers (int):
+                The minimum size of the pool
+            max_workers (int):
+                The maximum size of the pool
+            interval (float):
+                The number of seconds between two resize decisions
+        """
+        if min_workers < 1 or max_workers < min_workers:
+            raise ConfigurationError(
+                'Invalid worker limits: min={}, max={}'.format(
+                    min_workers, max_workers))
+        if interval <= 0:
+            raise ConfigurationError(
+                'Invalid autoscale interval: {}'.format(interval))
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.interval = interval
+
+    def clamp(self, count):
+        """Restricts a pool size to the configured limits"""
+        return max(self.min_workers, min(self.max_workers, count))
+
+    def desired(self, current, busy, backlog, latency=None):
+        """Returns the number of workers the pool should have
+
+        Args:
+            current (int):
+                The current size of the pool
+            busy (int):
+                The number of workers that are processing a job
+            backlog (int):
+                The number of pending jobs
+            latency (float or None):
+                The average fetch latency in seconds, None if unknown
+        """
+        idle = max(current - busy, 0)
+        if backlog > idle:
+            if latency:
+                extra = math.ceil(backlog * latency / self.interval)
+            else:
+                extra = backlog - idle
+            extra = min(extra, max(current, 1))
+            return self.clamp(current + extra)
+        if not backlog and idle:
+            return self.clamp(current - max(idle // 2, 1))
+        return self.clamp(current)
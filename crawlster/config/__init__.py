@@ -1,7 +1,7 @@
 from .config import Configuration, JsonConfiguration
 from .options import (ConfigOption, Required,
                       NumberOption, StringOption, ListOption, ChoiceOption,
-                      UrlOption)
+                      UrlOption, BoolOption)
 
 __all__ = [
     'Configuration',
@@ -13,5 +13,6 @@ __all__ = [
     'StringOption',
     'ListOption',
     'ChoiceOption',
-    'UrlOption'
+    'UrlOption',
+    'BoolOption'
 ]
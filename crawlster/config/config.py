@@ -1,7 +1,8 @@
 import json
 import os
 
-from crawlster.config.options import ListOption, NumberOption
+from crawlster.config.options import (ListOption, NumberOption,
+                                      ChoiceOption, BoolOption)
 from crawlster.exceptions import OptionNotDefinedError, \
     MissingValueError
 
@@ -10,7 +11,14 @@ from crawlster.validators import ValidationError
 
 CORE_OPTIONS = {
     'core.start_urls': ListOption(required=True),
-    'core.workers': NumberOption(default=os.cpu_count())
+    'core.workers': NumberOption(default=os.cpu_count()),
+    'core.processes': NumberOption(default=os.cpu_count()),
+    'core.engine': ChoiceOption(('threads', 'asyncio'), default='threads'),
+    'core.concurrency': NumberOption(default=100),
+    'core.autoscale': BoolOption(default=False),
+    'core.min_workers': NumberOption(default=1),
+    'core.max_workers': NumberOption(default=64),
+    'core.autoscale_interval': NumberOption(default=1.0)
 }
 
 
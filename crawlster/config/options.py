@@ -91,6 +91,11 @@ class StringOption(OptionWithDefaultValidators):
     default_validators = [validate_isinstance(str)]
 
 
+class BoolOption(OptionWithDefaultValidators):
+    """A boolean option"""
+    default_validators = [validate_isinstance(bool)]
+
+
 class ListOption(OptionWithDefaultValidators):
     """A list/tuple option"""
     default_validators = [validate_isinstance((list, tuple))]
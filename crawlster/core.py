@@ -1,14 +1,21 @@
+import asyncio
 import datetime
+import multiprocessing
 import queue
 import threading
-import time
 import sys
 import traceback
+import weakref
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
+from crawlster import parallel
+from crawlster.autoscale import Autoscaler
 from crawlster.handlers.stream import StreamItemHandler
 from crawlster.helpers.extract import ExtractHelper
 from crawlster.helpers.log import LoggingHelper
 from crawlster.helpers import UrlsHelper, RegexHelper
+from crawlster.helpers.checkpoint import CheckpointHelper
+from crawlster.helpers.robots import RobotsHelper
 from crawlster.exceptions import get_full_error_msg, ConfigurationError
 from crawlster.helpers.queue import QueueHelper
 from crawlster.helpers.http.requests import RequestsHelper
@@ -23,6 +30,40 @@ def start(method):
     return method
 
 
+def cpu_bound(method):
+    """Decorator for marking steps that are executed in a process pool.
+
+    Useful for steps that spend most of their time parsing, because they
+    no longer compete for the GIL with the other workers. Such steps
+    receive their arguments pickled and may only use the process safe
+    helpers (``extract``, ``urls``, ``regex``, ``log`` and ``stats``) besides
+    ``self.schedule()`` and ``self.submit_item()``. The size of the pool is
+    given by the ``core.processes`` option.
+    """
+    method._crawlster_cpu_bound = True
+    return method
+
+
+# the jobs processed by the worker threads and by the coroutine steps, used
+# for determining the depth of the jobs they schedule
+_local = threading.local()
+_task_jobs = weakref.WeakKeyDictionary()
+# asyncio.current_task() was added in Python 3.7
+_current_task = getattr(asyncio, 'current_task', None) or \
+    asyncio.Task.current_task
+
+
+def get_current_job():
+    """Returns the job processed by the calling thread or asyncio task"""
+    job = getattr(_local, 'job', None)
+    loop = getattr(_local, 'loop', None)
+    if job is None and loop is not None:
+        task = _current_task(loop)
+        if task is not None:
+            job = _task_jobs.get(task)
+    return job
+
+
 class JobTypes:
     FUNC = 'func'
     EXIT = 'exit'
@@ -33,6 +74,15 @@ class Job(object):
 
     def __init__(self, type):
         self.type = type
+        #: identifier assigned by the checkpoint helper
+        self.id = None
+
+    def to_state(self):
+        """Returns a picklable representation of the job
+
+        See :py:meth:`Crawlster.job_from_state` for the reverse operation.
+        """
+        return {'type': self.type, 'id': self.id}
 
     def __repr__(self):
         return "Job(type={type})".format(type=self.type)
@@ -41,11 +91,55 @@ class Job(object):
 class FuncJob(Job):
     """Job used to tell the worker what to execute next"""
 
-    def __init__(self, func, args, kwargs):
+    def __init__(self, func, args, kwargs, priority=None, depth=0):
+        """Initializes the job
+
+        Args:
+            func (callable):
+                The step to be executed
+            args (tuple):
+                The positional arguments for the step
+            kwargs (dict):
+                The keyword arguments for the step
+            priority (float or None):
+                The priority of the job, used by the ``'priority'`` queue
+                strategy. Higher values are processed first.
+            depth (int):
+                The number of steps that led to this job
+        """
         super(FuncJob, self).__init__(JobTypes.FUNC)
         self.func = func
         self.args = args
         self.kwargs = kwargs
+        self.priority = priority
+        self.depth = depth
+
+    def to_state(self):
+        """Returns a picklable representation of the job
+
+        The step is stored by name instead of the bound method.
+        """
+        state = super(FuncJob, self).to_state()
+        state.update({
+            'step': self.func.__name__,
+            'args': self.args,
+            'kwargs': self.kwargs,
+            'priority': self.priority,
+            'depth': self.depth
+        })
+        return state
+
+    @property
+    def url(self):
+        """The url processed by the job, if it can be determined
+
+        It is the ``url`` keyword argument or the first positional argument
+        of the step, if it is a string.
+        """
+        url = self.kwargs.get('url')
+        if url is None and self.args:
+            url = self.args[0]
+        return url if isinstance(url, str) else None
 
     def __repr__(self):
         return "Job(type={}, func={}, args= {}, kwargs={})".format(
@@ -60,6 +154,24 @@ class ExitJob(Job):
         super(ExitJob, self).__init__(JobTypes.EXIT)
 
 
+class LoopWaker(object):
+    """Queue listener that wakes up the asyncio dispatcher
+
+    The jobs are added by the steps in flight, so the event is set after the
+    job is in the queue at the latest when the step is done.
+    """
+
+    def __init__(self, loop, event):
+        self.loop = loop
+        self.event = event
+
+    def job_added(self, job):
+        self.loop.call_soon_threadsafe(self.event.set)
+
+    def job_done(self, job):
+        self.loop.call_soon_threadsafe(self.event.set)
+
+
 class Crawlster(object):
     """Base class for web crawlers
 
@@ -69,12 +181,16 @@ class Crawlster(object):
     """
     # constants
     HELPER_FLAG = 'is_helper'
+    ENGINE_THREADS = 'threads'
+    ENGINE_ASYNCIO = 'asyncio'
     # stats
     STAT_ITEMS = 'items'
     STAT_ERRORS = 'errors'
     STAT_START_TIME = 'time.start'
     STAT_FINISH_TIME = 'time.finish'
     STAT_DURATION = 'time.duration'
+    STAT_WORKERS = 'workers.current'
+    STAT_WORKERS_HISTORY = 'workers.history'
 
     # Helpers
     # =======
@@ -90,6 +206,8 @@ class Crawlster(object):
     urls = UrlsHelper()
     regex = RegexHelper()
     extract = ExtractHelper()
+    checkpoint = CheckpointHelper()
+    robots = RobotsHelper()
 
     # a single item handler or a list/tuple of them
     item_handler = StreamItemHandler()
@@ -101,6 +219,12 @@ class Crawlster(object):
             raise ConfigurationError(get_full_error_msg('missing_config'))
 
         self.pool = None
+        self.process_pool = None
+        self._process_pool_lock = threading.Lock()
+        self.autoscaler = None
+        self._pool_lock = threading.Lock()
+        self._busy_workers = 0
+        self._retiring_workers = 0
         self.populate_config()
         self.inject_helpers()
         self.inject_handlers()
@@ -153,12 +277,24 @@ class Crawlster(object):
 
     def init_context(self):
         """Initializes the crawler context (the queue and the worker pool)"""
-        # prepare queue
-        self.pool = self.get_pool()
+        # the asyncio engine dispatches the jobs from the event loop
+        if self.config.get('core.engine') == self.ENGINE_THREADS:
+            self.autoscaler = self.get_autoscaler()
+            self.pool = self.get_pool()
+
+    def get_autoscaler(self):
+        """Creates the pool resizing policy if autoscaling is enabled"""
+        if not self.config.get('core.autoscale'):
+            return None
+        return Autoscaler(self.config.get('core.min_workers'),
+                          self.config.get('core.max_workers'),
+                          self.config.get('core.autoscale_interval'))
 
     def get_pool(self):
         """Creates and returns the worker pool"""
         workers = self.config.get('core.workers')
+        if self.autoscaler:
+            workers = self.autoscaler.clamp(workers)
         pool = []
         for _ in range(workers):
             pool.append(threading.Thread(target=self.worker))
@@ -170,18 +306,17 @@ class Crawlster(object):
         func = self.get_start_step()
         if not func:
             raise ConfigurationError('Could not find start step')
-        start_urls = self.config.get('core.start_urls')
-        # putting initial processing jobs into queue
-        for start_url in start_urls:
-            self.queue.put(FuncJob(func, (start_url,), {}))
-        # start workers
-        for worker_thread in self.pool:
-            worker_thread.start()
-        self.queue.join()
+        # a restored crawl continues with its pending jobs
+        if not self.checkpoint.start():
+            start_urls = self.config.get('core.start_urls')
+            # putting initial processing jobs into queue
+            for start_url in start_urls:
+                self.schedule(func, start_url)
+        if self.config.get('core.engine') == self.ENGINE_ASYNCIO:
+            self.run_asyncio()
+        else:
+            self.run_threads()
         self.log.info('Finished')
-        self.log.debug('Signaling workers to stop')
-        for _ in range(len(self.pool)):
-            self.queue.put(ExitJob())
         # updating stats
         finish = datetime.datetime.now()
         self.stats.set(self.STAT_FINISH_TIME, finish)
@@ -190,39 +325,237 @@ class Crawlster(object):
         self.stats.set(self.STAT_DURATION, duration)
         self.finalize()
 
+    def run_threads(self):
+        """Runs the queued jobs on the worker threads until none is left"""
+        self.set_worker_count(len(self.pool))
+        # start workers
+        for worker_thread in self.pool:
+            worker_thread.start()
+        stop_autoscaling = threading.Event()
+        if self.autoscaler:
+            supervisor = threading.Thread(target=self.autoscale_loop,
+                                          args=(stop_autoscaling,))
+            supervisor.start()
+        # the queue is closed when it becomes idle, which stops the workers
+        self.queue.join()
+        if self.autoscaler:
+            stop_autoscaling.set()
+            supervisor.join()
+        with self._pool_lock:
+            pool = list(self.pool)
+        for worker_thread in pool:
+            worker_thread.join()
+
+    def autoscale_loop(self, stop_event):
+        """Periodically resizes the worker pool until stop_event is set"""
+        while not stop_event.wait(self.autoscaler.interval):
+            self.autoscale()
+
+    def autoscale(self):
+        """Grows or shrinks the worker pool based on the current load"""
+        # read before taking the pool lock, the queue lock is always
+        # acquired first
+        backlog = self.queue.qsize()
+        new_workers = []
+        with self._pool_lock:
+            current = len(self.pool) - self._retiring_workers
+            desired = self.autoscaler.desired(
+                current, self._busy_workers, backlog, self.http.latency)
+            if desired > current:
+                for _ in range(desired - current):
+                    new_workers.append(threading.Thread(target=self.worker))
+                self.pool.extend(new_workers)
+            elif desired < current:
+                self._retiring_workers += current - desired
+        if desired == current:
+            return
+        self.log.debug('Resizing worker pool from {} to {}'.format(
+            current, desired))
+        for worker_thread in new_workers:
+            worker_thread.start()
+        if desired < current:
+            self.queue.wakeup()
+        self.set_worker_count(desired)
+
+    def should_retire(self):
+        """Returns whether the calling worker must exit to shrink the pool"""
+        with self._pool_lock:
+            if not self._retiring_workers:
+                return False
+            self._retiring_workers -= 1
+            self.pool.remove(threading.current_thread())
+            return True
+
+    def set_worker_count(self, count):
+        """Records the current size of the worker pool"""
+        self.stats.set(self.STAT_WORKERS, count)
+        self.stats.add(self.STAT_WORKERS_HISTORY,
+                       (datetime.datetime.now(), count))
+
+    def run_asyncio(self):
+        """Runs the queued jobs on an event loop until none is left
+
+        Coroutine steps are executed directly on the loop, while regular
+        steps are executed in a thread pool of ``core.workers`` threads.
+        """
+        loop = asyncio.new_event_loop()
+        executor = ThreadPoolExecutor(
+            max_workers=self.config.get('core.workers'))
+        loop.set_default_executor(executor)
+        _local.loop = loop
+        try:
+            loop.run_until_complete(self.dispatch_async())
+        finally:
+            # the async connections are bound to the loop
+            if self.http.aio is not None:
+                loop.run_until_complete(self.http.aio.aclose())
+            _local.loop = None
+            loop.close()
+            executor.shutdown()
+
+    async def dispatch_async(self):
+        """Dispatches the jobs from the queue as asyncio tasks
+
+        At most ``core.concurrency`` jobs are processed at the same time.
+        The jobs scheduled by the steps in flight are dispatched right away.
+        Returns when the queue is empty and no job is in flight anymore.
+        """
+        concurrency = self.config.get('core.concurrency')
+        wakeup = asyncio.Event()
+        waker = LoopWaker(asyncio.get_event_loop(), wakeup)
+        self.queue.add_listener(waker)
+        in_flight = set()
+        try:
+            while True:
+                wakeup.clear()
+                try:
+                    job = self.queue.get_nowait()
+                except queue.Empty:
+                    # the pending jobs may be delayed by the per host limits
+                    delay = self.queue.next_ready()
+                    if not in_flight:
+                        if delay is None:
+                            return
+                        await asyncio.sleep(delay)
+                        continue
+                    # the jobs in flight are the only other source for jobs
+                    waiter = asyncio.ensure_future(wakeup.wait())
+                    done, _ = await asyncio.wait(
+                        in_flight | {waiter}, timeout=delay,
+                        return_when=asyncio.FIRST_COMPLETED)
+                    waiter.cancel()
+                    in_flight -= done
+                    continue
+                self.log.debug('Got job: {}'.format(job))
+                if job.type == JobTypes.EXIT:
+                    self.queue.task_done(job)
+                    continue
+                in_flight.add(asyncio.ensure_future(self.run_job_async(job)))
+                if len(in_flight) >= concurrency:
+                    _, in_flight = await asyncio.wait(
+                        in_flight, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self.queue.remove_listener(waker)
+
+    async def run_job_async(self, job):
+        """Processes a single job on the event loop"""
+        try:
+            if asyncio.iscoroutinefunction(job.func):
+                await self.process_job_async(job)
+            else:
+                loop = asyncio.get_event_loop()
+                await loop.run_in_executor(None, self.process_job, job)
+        finally:
+            self.queue.task_done(job)
+
     def worker(self):
         """Worker body that executes the jobs"""
         work_queue = self.queue
+        interrupt = self.should_retire if self.autoscaler else None
         while True:
-            try:
-                job = work_queue.get_nowait()
-            except queue.Empty:
-                job = None
-            if not job:
-                time.sleep(0.2)
-                continue
+            job = work_queue.get(interrupt=interrupt)
+            if job is None:
+                self.log.debug('No more jobs. Worker is exiting')
+                return
             self.log.debug('Got job: {}'.format(job))
             if job.type == JobTypes.EXIT:
                 self.log.info('Received exit notification. Worker is exiting')
-                work_queue.task_done()
+                work_queue.task_done(job)
                 return
-            self.process_job(job)
-            work_queue.task_done()
+            with self._pool_lock:
+                self._busy_workers += 1
+            try:
+                self.process_job(job)
+            finally:
+                with self._pool_lock:
+                    self._busy_workers -= 1
+                work_queue.task_done(job)
 
     def process_job(self, job):
         """Processes a single job and enqueues the results"""
         self.log.debug('Processing job: {}'.format(job))
+        parent, _local.job = getattr(_local, 'job', None), job
         try:
-            next_item = job.func(*job.args, **job.kwargs)
+            if getattr(job.func, '_crawlster_cpu_bound', False):
+                next_item = self.process_job_in_pool(job)
+            else:
+                next_item = job.func(*job.args, **job.kwargs)
         except Exception as e:
-            self.report_error(e, job)
-            self.stats.add(self.STAT_ERRORS, {
-                'func': job.func.__name__,
-                'args': job.args,
-                'kwargs': job.kwargs,
-                'exception': e
-            })
+            self.job_failed(e, job)
             return
+        finally:
+            _local.job = parent
+        self.process_result(next_item)
+
+    def process_job_in_pool(self, job):
+        """Executes a cpu bound job in the process pool
+
+        Blocks the calling worker until the job is finished, then submits
+        the items and schedules the steps produced by the job.
+        """
+        args, kwargs, segments = parallel.share_responses(job.args,
+                                                          job.kwargs)
+        try:
+            future = self.get_process_pool().submit(
+                parallel.run_step, type(self), self.config.values,
+                job.func.__name__, args, kwargs)
+            items, scheduled, counters = future.result()
+        finally:
+            parallel.release_segments(segments)
+        for key, value in counters.items():
+            self.stats.incr(key, by=value)
+        for item in items:
+            self.submit_item(item)
+        for step_name, step_args, step_kwargs, priority in scheduled:
+            self.schedule(getattr(self, step_name), *step_args,
+                          priority=priority, **step_kwargs)
+
+    def get_process_pool(self):
+        """Returns the process pool, creating it on first use"""
+        with self._process_pool_lock:
+            if not self.process_pool:
+                options = {'max_workers': self.config.get('core.processes')}
+                # the mp_context argument was added in Python 3.7, the older
+                # versions use the default start method of the platform
+                if sys.version_info >= (3, 7):
+                    options['mp_context'] = multiprocessing.get_context(
+                        'spawn')
+                self.process_pool = ProcessPoolExecutor(**options)
+            return self.process_pool
+
+    async def process_job_async(self, job):
+        """Processes a single coroutine job and enqueues the results"""
+        self.log.debug('Processing job: {}'.format(job))
+        _task_jobs[_current_task(_local.loop)] = job
+        try:
+            next_item = await job.func(*job.args, **job.kwargs)
+        except Exception as e:
+            self.job_failed(e, job)
+            return
+        self.process_result(next_item)
+
+    def process_result(self, next_item):
+        """Handles the value returned by a step"""
         if not next_item:
             return
         if isinstance(next_item, dict):
@@ -232,6 +565,16 @@ class Crawlster(object):
             # is a job instance, must be further processes
             self.queue.put(next_item)
 
+    def job_failed(self, e, job):
+        """Reports the failed job and records it in the stats"""
+        self.report_error(e, job)
+        self.stats.add(self.STAT_ERRORS, {
+            'func': job.func.__name__,
+            'args': job.args,
+            'kwargs': job.kwargs,
+            'exception': e
+        })
+
     def report_error(self, e, failed_job):
         """Reports a failed job
 
@@ -250,6 +593,9 @@ class Crawlster(object):
 
     def finalize(self):
         """Performs the finalize action on all item handlers and helpers"""
+        if self.process_pool:
+            self.process_pool.shutdown()
+            self.process_pool = None
         for handler in self.iter_item_handlers():
             handler.finalize()
         for helper in self.iter_helpers():
@@ -269,9 +615,28 @@ class Crawlster(object):
 
     # Workflow methods
 
-    def schedule(self, func, *args, **kwargs):
-        """Schedules the next tep to be executed by workers"""
-        job = FuncJob(func, args, kwargs)
+    def schedule(self, func, *args, priority=None, **kwargs):
+        """Schedules the next step to be executed by workers
+
+        Args:
+            func (callable):
+                The step to be executed
+            priority (float or None):
+                The priority of the job when using the ``'priority'`` queue
+                strategy. Higher values are processed first. If not
+                provided, it is determined by the queue scorer.
+            *args, **kwargs:
+                The arguments for the step
+
+        Note:
+            When ``urls.dedup`` is enabled, the job is dropped if the same
+            step was already scheduled for the same canonical url.
+        """
+        parent = get_current_job()
+        depth = parent.depth + 1 if parent else 0
+        job = FuncJob(func, args, kwargs, priority=priority, depth=depth)
+        if self.urls.dedup and not self.urls.claim_job(job):
+            return
         self.queue.put(job)
 
     def submit_item(self, item):
@@ -289,6 +654,17 @@ class Crawlster(object):
         else:
             self.item_handler.handle(item)
 
+    def job_from_state(self, state):
+        """Rebuilds a job from the result of its to_state() method"""
+        if state['type'] == JobTypes.EXIT:
+            job = ExitJob()
+        else:
+            job = FuncJob(getattr(self, state['step']), state['args'],
+                          state['kwargs'], priority=state['priority'],
+                          depth=state['depth'])
+        job.id = state.get('id')
+        return job
+
     def get_start_step(self):
         for attrname in dir(self):
             func = getattr(self, attrname)
@@ -1,19 +1,182 @@
-import json
+import os
+import queue
+import threading
+import time
 
+from crawlster.helpers import jsonlib
 from .base import BaseItemHandler
 
 
 class JsonLinesHandler(BaseItemHandler):
-    def __init__(self, filename):
+    """Writes the items to a file, one JSON document per line
+
+    By default, the items are written by the worker threads that submit them.
+    In buffered mode, the workers only encode the items and hand the lines
+    to a dedicated writer thread, which writes them in batches, so the
+    workers do not wait for the disk as long as the writer keeps up. When
+    ``max_queue`` lines are already waiting to be written, :py:meth:`handle`
+    blocks until the writer makes room for the line.
+
+    If the writer fails, the handler stops accepting lines: every following
+    call to :py:meth:`handle` raises a RuntimeError caused by the write
+    error, and the lines that were waiting are dropped.
+
+    In both modes, each line is written at once by a single thread, so the
+    lines of different items are never interleaved.
+    """
+    #: Never call fsync
+    FSYNC_NEVER = 'never'
+    #: Call fsync each time the writer thread flushes the file
+    FSYNC_BATCH = 'batch'
+    #: Call fsync once, when the file is closed
+    FSYNC_CLOSE = 'close'
+
+    def __init__(self, filename, buffered=False, batch_size=1000,
+                 flush_interval=1.0, max_queue=10000, fsync=FSYNC_NEVER,
+                 encoder='json'):
+        """Initializes the handler
+
+        Args:
+            filename (str):
+                The file the items are written to. It is overwritten.
+            buffered (bool):
+                Whether the items are written by a writer thread
+            batch_size (int):
+                Buffered mode only. The maximum number of lines written at
+                once.
+            flush_interval (float):
+                Buffered mode only. The maximum number of seconds a line
+                waits before being flushed to the file.
+            max_queue (int):
+                Buffered mode only. The maximum number of lines waiting for
+                the writer thread.
+            fsync (str):
+                When the file is synced to the disk: ``'never'``,
+                ``'batch'`` (each time the writer thread flushes it, in
+                buffered mode) or ``'close'``
+            encoder (str or callable):
+                The JSON backend that encodes the items (``'json'``,
+                ``'orjson'`` or ``'auto'`` for the fastest one installed),
+                or a function that returns the encoded item as bytes or str.
+                Defaults to ``'json'``.
+        """
         super(JsonLinesHandler, self).__init__()
+        if fsync not in (self.FSYNC_NEVER, self.FSYNC_BATCH,
+                         self.FSYNC_CLOSE):
+            raise ValueError('Invalid fsync policy: {}'.format(fsync))
         self.file_name = filename
+        self.buffered = buffered
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.fsync = fsync
+        self.encode = encoder if callable(encoder) else \
+            jsonlib.get_dumper(encoder)
         self.fp = None
+        self._lock = threading.Lock()
+        self._queue = None
+        self._writer = None
+        self._error = None
+        self._reported = False
 
     def initialize(self):
-        self.fp = open(self.file_name, 'w')
+        self.fp = open(self.file_name, 'wb')
+        self._error = None
+        self._reported = False
+        if self.buffered:
+            self._queue = queue.Queue(self.max_queue)
+            self._writer = threading.Thread(target=self.write_batches,
+                                            name='jsonl-writer', daemon=True)
+            self._writer.start()
+
+    def encode_line(self, item):
+        line = self.encode(item)
+        if isinstance(line, str):
+            line = line.encode()
+        return line + b'\n'
 
     def handle(self, item):
-        self.fp.write(json.dumps(item) + '\n')
+        line = self.encode_line(item)
+        if not self.buffered:
+            with self._lock:
+                self.fp.write(line)
+            return
+        if self._error is not None:
+            self._reported = True
+            raise self.writer_failed() from self._error
+        self._queue.put(line)
+
+    def writer_failed(self):
+        """Returns a new error about the failure of the writer thread"""
+        return RuntimeError('Could not write the items to {}: {}'.format(
+            self.file_name, self._error))
+
+    def write_batches(self):
+        """Writes the queued lines until the end marker (None) is received"""
+        last_flush = time.monotonic()
+        dirty = False
+        done = False
+        while not done:
+            timeout = max(last_flush + self.flush_interval - time.monotonic(),
+                          0)
+            batch = []
+            try:
+                line = self._queue.get(timeout=timeout)
+                while line is not None:
+                    batch.append(line)
+                    if len(batch) >= self.batch_size:
+                        break
+                    line = self._queue.get_nowait()
+                else:
+                    done = True
+            except queue.Empty:
+                pass
+            try:
+                if batch:
+                    self.fp.write(b''.join(batch))
+                    dirty = True
+                if dirty and (done or len(batch) >= self.batch_size or
+                              time.monotonic() - last_flush >=
+                              self.flush_interval):
+                    self.flush(self.fsync == self.FSYNC_BATCH)
+                    dirty = False
+            except Exception as e:
+                # reported to the workers, which stop queueing lines
+                self._error = e
+                if not done:
+                    self.drop_lines()
+                return
+            if not dirty:
+                last_flush = time.monotonic()
+
+    def drop_lines(self):
+        """Discards the queued lines until the end marker is received
+
+        Keeps the workers that were blocked on a full queue going.
+        """
+        while self._queue.get() is not None:
+            pass
+
+    def flush(self, sync=False):
+        self.fp.flush()
+        if sync:
+            os.fsync(self.fp.fileno())
 
     def finalize(self):
-        self.fp.close()
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        if self._error is None:
+            self.flush(self.fsync != self.FSYNC_NEVER)
+            self.fp.close()
+            return
+        try:
+            self.fp.close()
+        except OSError:
+            # the buffered lines can not be written either
+            pass
+        if not self._reported:
+            # the workers never heard about it
+            self._reported = True
+            raise self.writer_failed() from self._error
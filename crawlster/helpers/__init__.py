@@ -4,7 +4,10 @@ from .extract import ExtractHelper
 from .http.requests import RequestsHelper
 from .stats import StatsHelper
 from .log import LoggingHelper
+from .queue import QueueHelper
 from .base import BaseHelper
+from .checkpoint import CheckpointHelper
+from .robots import RobotsHelper
 
 __all__ = [
     'RegexHelper',
@@ -13,5 +16,8 @@ __all__ = [
     'RequestsHelper',
     'StatsHelper',
     'LoggingHelper',
-    'BaseHelper'
+    'QueueHelper',
+    'BaseHelper',
+    'CheckpointHelper',
+    'RobotsHelper'
 ]
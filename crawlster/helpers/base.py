@@ -1,6 +1,9 @@
 class BaseHelper(object):
     """Base class for helpers"""
     is_helper = True
+    #: Whether the helper can be used by steps running in worker processes
+    #: (see :py:func:`crawlster.cpu_bound`)
+    process_safe = False
     #: A mapping of name - option definition.
     #: Option definition must be an instance of :py:class:`ConfigOption`
     config_options = {}
@@ -0,0 +1,119 @@
+"""Detection of the character encoding of the documents.
+
+The encoding is determined, in this order, from:
+
+- a byte order mark
+- the ``charset`` parameter of the Content-Type header
+- a ``<meta charset>`` or ``<meta http-equiv="Content-Type">`` tag in the
+  first 1024 bytes of the document
+- sniffing: UTF-8 if the first 64 KiB of the document are valid UTF-8,
+  otherwise the guess of ``charset_normalizer`` when it is installed,
+  otherwise windows-1252
+
+As browsers do, the latin-1 and ascii labels are read as windows-1252, a
+superset of both.
+"""
+import codecs
+import re
+
+try:
+    import charset_normalizer
+except ImportError:
+    charset_normalizer = None
+
+BOMS = (
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+
+#: The number of bytes searched for a <meta> declaration
+META_PRESCAN = 1024
+#: The number of bytes checked for UTF-8 and given to charset_normalizer
+SNIFF_SIZE = 65536
+
+CHARSET_RE = re.compile(r'charset\s*=\s*["\']?([^\s;"\']+)', re.IGNORECASE)
+META_RE = re.compile(
+    rb'<meta\s[^>]*?charset\s*=\s*["\']?\s*([a-zA-Z0-9_:.+-]+)',
+    re.IGNORECASE)
+
+ALIASES = {
+    'iso8859-1': 'windows-1252',
+    'ascii': 'windows-1252',
+    'cp1252': 'windows-1252',
+    'utf-16': 'utf-16-le',
+}
+
+
+def normalize_encoding(label):
+    """Returns the canonical name of an encoding, None if unknown"""
+    if not label:
+        return None
+    try:
+        name = codecs.lookup(label.strip()).name
+    except LookupError:
+        return None
+    return ALIASES.get(name, name)
+
+
+def get_header_encoding(content_type):
+    """Returns the encoding declared by a Content-Type header, if any"""
+    if not content_type:
+        return None
+    match = CHARSET_RE.search(content_type)
+    return normalize_encoding(match.group(1)) if match else None
+
+
+def get_meta_encoding(data):
+    """Returns the encoding declared by a <meta> tag, if any"""
+    match = META_RE.search(data, 0, META_PRESCAN)
+    if match is None:
+        return None
+    encoding = normalize_encoding(match.group(1).decode('ascii'))
+    if encoding and encoding.startswith('utf-16'):
+        # the document could not have been read as ascii otherwise
+        return 'utf-8'
+    return encoding
+
+
+def sniff_encoding(data):
+    """Guesses the encoding of a document that does not declare it"""
+    sample = data[:SNIFF_SIZE]
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        # the sample may end in the middle of a character
+        decoder.decode(sample, final=len(data) <= SNIFF_SIZE)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    if charset_normalizer is not None:
+        best = charset_normalizer.from_bytes(sample).best()
+        if best is not None:
+            return normalize_encoding(best.encoding) or 'windows-1252'
+    return 'windows-1252'
+
+
+def detect_encoding(data, content_type=None):
+    """Returns the encoding of a document
+
+    Args:
+        data (bytes):
+            The document
+        content_type (str or None):
+            The Content-Type header of the response, if any
+    """
+    for bom, encoding in BOMS:
+        if data.startswith(bom):
+            return encoding
+    return get_header_encoding(content_type) or get_meta_encoding(data) or \
+        sniff_encoding(data)
+
+
+def decode(data, encoding):
+    """Decodes a document, replacing the invalid bytes
+
+    The byte order mark, if any, is not part of the text.
+    """
+    if encoding == 'utf-8' and data.startswith(codecs.BOM_UTF8):
+        encoding = 'utf-8-sig'
+    return data.decode(encoding, errors='replace')
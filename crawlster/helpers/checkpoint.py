@@ -0,0 +1,298 @@
+import collections
+import itertools
+import os
+import pickle
+import threading
+import time
+
+from crawlster.config import StringOption, NumberOption, BoolOption
+from crawlster.helpers.base import BaseHelper
+from crawlster.helpers.seen import ScalableBloomFilter
+
+
+class CheckpointHelper(BaseHelper):
+    """Helper that periodically saves the crawl state for resuming it later.
+
+    The state is stored as a journal of changes: the scheduled jobs, the
+    finished jobs, the urls marked as seen and a snapshot of the numeric
+    stats. The workers only append the changes to an in-memory buffer, which
+    is written by a background thread every ``checkpoint.interval`` seconds,
+    so a checkpoint costs only the changes since the previous one. A
+    checkpoint that can not be written is logged and its changes are written
+    with the next one.
+
+    When resuming, the journal is replayed: the jobs that were scheduled but
+    not finished are put back in the queue (instead of the start urls), the
+    seen urls and the stats are restored, then a new compacted journal
+    replaces the old one.
+
+    With the ``bloom`` seen backend (``urls.seen_backend``), the seen urls
+    are not journaled: the filter itself is saved next to the journal, in
+    the ``.seen`` file, and it is loaded back when resuming. Since the whole
+    filter is written each time, it is saved at most every
+    ``checkpoint.seen_interval`` seconds, when it changed, and at the end of
+    the crawl. The urls seen after the last save are not remembered when
+    resuming after a crash, so their pages may be crawled again.
+
+    Configuration options:
+
+    - ``checkpoint.path`` - the journal file. Checkpointing is disabled if
+      not provided.
+    - ``checkpoint.interval`` - the number of seconds between two
+      checkpoints. Defaults to 5.
+    - ``checkpoint.resume`` - whether to resume from the journal if it
+      exists. Defaults to ``False``, in which case the journal is
+      overwritten.
+    - ``checkpoint.seen_interval`` - the minimum number of seconds between
+      two saves of the seen urls filter. Defaults to 60.
+    """
+    name = 'checkpoint'
+    config_options = {
+        'checkpoint.path': StringOption(default=None),
+        'checkpoint.interval': NumberOption(default=5),
+        'checkpoint.resume': BoolOption(default=False),
+        'checkpoint.seen_interval': NumberOption(default=60)
+    }
+
+    JOB = 'job'
+    DONE = 'done'
+    SEEN = 'seen'
+    STATS = 'stats'
+
+    def __init__(self):
+        super(CheckpointHelper, self).__init__()
+        self.path = None
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._fp = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.save_filter = False
+        self._saved_count = None
+        self._saved_at = None
+
+    def initialize(self):
+        self.path = self.config.get('checkpoint.path')
+        if not self.path:
+            return
+        self.save_filter = self.config.get('urls.seen_backend') == 'bloom'
+        self._saved_count = None
+        self._saved_at = None
+        self.crawler.queue.add_listener(self)
+        if self.save_filter:
+            self.crawler.urls.remove_listener(self)
+        else:
+            self.crawler.urls.add_listener(self)
+
+    @property
+    def filter_path(self):
+        """The file the seen urls filter is saved in"""
+        return self.path + '.seen'
+
+    def start(self):
+        """Starts checkpointing, restoring the previous state if requested
+
+        Returns:
+            True if the crawl state was restored, False otherwise.
+        """
+        if not self.path:
+            return False
+        restored = False
+        if self.config.get('checkpoint.resume') and \
+                os.path.exists(self.path):
+            pending, seen, stats = self.load(self.path)
+            if self.save_filter and os.path.exists(self.filter_path):
+                self.crawler.urls.already_seen = ScalableBloomFilter.load(
+                    self.filter_path)
+                seen_count = len(self.crawler.urls.already_seen)
+            else:
+                seen_count = len(seen)
+            self.crawler.log.info(
+                'Resuming from checkpoint: {} pending jobs, {} seen '
+                'urls'.format(len(pending), seen_count))
+            for key, value in stats.items():
+                self.crawler.stats.set(key, value)
+            for url in seen:
+                self.crawler.urls.mark_seen(url)
+            for state in pending:
+                self.crawler.queue.put(self.crawler.job_from_state(state))
+            restored = True
+        # the new journal replaces the old one only after it contains the
+        # restored state
+        tmp_path = self.path + '.tmp'
+        self._fp = open(tmp_path, 'wb')
+        self.checkpoint(final=True)
+        self._fp.close()
+        os.replace(tmp_path, self.path)
+        self._fp = open(self.path, 'ab')
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        return restored
+
+    def run(self):
+        """Body of the background thread that writes the checkpoints"""
+        while not self._stop.wait(self.config.get('checkpoint.interval')):
+            self.safe_checkpoint()
+
+    def safe_checkpoint(self, final=False):
+        """Writes a checkpoint, logging the errors instead of raising them
+
+        The changes that could not be written are kept for the next
+        checkpoint.
+        """
+        try:
+            self.checkpoint(final)
+        except Exception as e:
+            self.crawler.log.error('Could not write the checkpoint: '
+                                   '{}'.format(e))
+
+    def checkpoint(self, final=False):
+        """Writes the changes recorded since the last checkpoint
+
+        Args:
+            final (bool):
+                Whether the seen urls filter must be saved, even if it was
+                saved less than ``checkpoint.seen_interval`` seconds ago
+        """
+        # saved before taking the records, so that the jobs of the urls it
+        # contains are in the journal
+        if self.save_filter:
+            self.checkpoint_filter(final)
+        with self._lock:
+            records, self._buffer = self._buffer, []
+        try:
+            self.write_records(
+                records + [(self.STATS, self.crawler.stats.counters())])
+        except Exception:
+            with self._lock:
+                self._buffer[:0] = records
+            raise
+
+    def write_records(self, records):
+        """Appends the records to the journal as a single checkpoint
+
+        A checkpoint that could not be written completely is removed from
+        the journal, so that the next ones can still be read.
+        """
+        data = self.dump_records(records)
+        position = self._fp.tell()
+        try:
+            self._fp.write(data)
+            self._fp.flush()
+            os.fsync(self._fp.fileno())
+        except Exception:
+            try:
+                self._fp.truncate(position)
+            except OSError:
+                pass
+            raise
+
+    def dump_records(self, records):
+        """Serializes the records, leaving out the ones that can't be
+
+        The jobs whose arguments can not be pickled can not be resumed, so
+        they are only reported.
+        """
+        try:
+            return pickle.dumps(records, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            pass
+        kept = []
+        for record in records:
+            try:
+                pickle.dumps(record, pickle.HIGHEST_PROTOCOL)
+            except Exception as e:
+                self.crawler.log.error(
+                    'Could not checkpoint {}: {}'.format(record[:2], e))
+                continue
+            kept.append(record)
+        return pickle.dumps(kept, pickle.HIGHEST_PROTOCOL)
+
+    def checkpoint_filter(self, force=False):
+        """Saves the seen urls filter if urls were added to it
+
+        Args:
+            force (bool):
+                Whether to save it even if it was saved less than
+                ``checkpoint.seen_interval`` seconds ago
+        """
+        seen = self.crawler.urls.already_seen
+        count = len(seen)
+        if count == self._saved_count:
+            return
+        now = time.monotonic()
+        if not force and self._saved_at is not None and \
+                now - self._saved_at < self.config.get(
+                    'checkpoint.seen_interval'):
+            return
+        tmp_path = self.filter_path + '.tmp'
+        seen.save(tmp_path)
+        os.replace(tmp_path, self.filter_path)
+        self._saved_count = count
+        self._saved_at = now
+
+    def job_added(self, job):
+        """Records a job that was put in the queue"""
+        job.id = next(self._ids)
+        record = (self.JOB, job.id, job.to_state())
+        with self._lock:
+            self._buffer.append(record)
+
+    def job_done(self, job):
+        """Records a job that was processed"""
+        with self._lock:
+            self._buffer.append((self.DONE, job.id))
+
+    def url_seen(self, url):
+        """Records an url that was marked as seen"""
+        with self._lock:
+            self._buffer.append((self.SEEN, url))
+
+    @classmethod
+    def load(cls, path):
+        """Replays a journal
+
+        A partially written checkpoint at the end of the journal is ignored.
+
+        Returns:
+            A tuple of (pending, seen, stats) where pending is the list of the
+            states of the unfinished jobs, in the order they were scheduled,
+            seen is the set of seen urls journaled (empty with the ``bloom``
+            seen backend) and stats are the last saved stats.
+        """
+        pending = collections.OrderedDict()
+        seen = set()
+        stats = {}
+        with open(path, 'rb') as fp:
+            while True:
+                try:
+                    records = pickle.load(fp)
+                except EOFError:
+                    break
+                except (pickle.UnpicklingError, ValueError, AttributeError,
+                        IndexError):
+                    # interrupted while writing the last checkpoint
+                    break
+                for record in records:
+                    if record[0] == cls.JOB:
+                        pending[record[1]] = record[2]
+                    elif record[0] == cls.DONE:
+                        pending.pop(record[1], None)
+                    elif record[0] == cls.SEEN:
+                        seen.add(record[1])
+                    elif record[0] == cls.STATS:
+                        stats = record[1]
+        return list(pending.values()), seen, stats
+
+    def finalize(self):
+        """Writes the last checkpoint and stops the background thread"""
+        if not self._thread:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.safe_checkpoint(final=True)
+        self._fp.close()
+        self._fp = None
@@ -1,33 +1,332 @@
-from bs4 import BeautifulSoup
+import collections
+import copy
+import functools
+import re
+import threading
+
+import soupsieve
+from bs4 import BeautifulSoup, Tag
+from bs4.builder import HTMLTreeBuilder
 
 try:
     import lxml
 except ImportError:
     lxml = None
 
+try:
+    import html5lib
+except ImportError:
+    html5lib = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+from crawlster.config import ChoiceOption, NumberOption
+from crawlster.exceptions import ConfigurationError
+from crawlster.helpers import charset, jsonlib, jsonpath
 from crawlster.helpers.base import BaseHelper
+from crawlster.helpers.links import extract_links, DEFAULT_TAGS
+
+
+class Field(object):
+    """The specification of a field extracted by :py:meth:`Content.item`
+
+    A field is the text or an attribute of the first element (or of all the
+    elements) matching a css selector.
+    """
+    SPEC_RE = re.compile(r'^(?P<selector>.*?)(?:::(?:(?P<text>text)|'
+                         r'attr\((?P<attr>[^)]+)\)))?$', re.DOTALL)
+
+    def __init__(self, selector, attr=None, many=False, default=None):
+        """Initializes the field
+
+        Args:
+            selector (str):
+                The css selector of the elements
+            attr (str or None):
+                The attribute extracted from the elements. If None, their
+                text is extracted.
+            many (bool):
+                Whether the values of all the matching elements are
+                extracted as a list, instead of the value of the first one
+            default:
+                The value of the field when no element matches. Defaults to
+                None, or to an empty list if ``many`` is True.
+        """
+        self.selector = selector.strip()
+        self.attr = attr
+        self.many = many
+        self.default = default
+
+    @classmethod
+    @functools.lru_cache(maxsize=1024)
+    def parse(cls, spec):
+        """Builds a field from a string specification
+
+        ``'h1'`` and ``'h1::text'`` extract the text of the first ``h1``
+        element, ``'a::attr(href)'`` extracts the ``href`` attribute of the
+        first link.
+        """
+        match = cls.SPEC_RE.match(spec)
+        return cls(match.group('selector'), match.group('attr'))
+
+    @classmethod
+    def from_spec(cls, spec):
+        """Builds a field from a specification
+
+        Args:
+            spec (str, list or Field):
+                A string specification (see :py:meth:`parse`), a list with a
+                single string specification for extracting the values of all
+                the matching elements or a :py:class:`Field`
+        """
+        if isinstance(spec, Field):
+            return spec
+        if isinstance(spec, (list, tuple)):
+            if len(spec) != 1:
+                raise ValueError('A list field must contain a single '
+                                 'specification: {!r}'.format(spec))
+            field = cls.parse(spec[0])
+            return cls(field.selector, field.attr, many=True)
+        return cls.parse(spec)
+
+    def get_default(self):
+        """Returns the value of the field when no element matches
+
+        The default of the ``many`` fields is copied, so the values of
+        different items are never shared.
+        """
+        if self.many:
+            return [] if self.default is None else copy.copy(self.default)
+        return self.default
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_selector(selector):
+    """Returns the compiled soupsieve selector"""
+    return soupsieve.compile(selector)
+
+
+class SoupBackend(object):
+    """Parses the documents with BeautifulSoup and one of its tree builders
+
+    The elements are selected with soupsieve, whatever the tree builder.
+    """
+
+    def __init__(self, features, available=True, package=None):
+        """Initializes the backend
+
+        Args:
+            features (str):
+                The name of the BeautifulSoup tree builder
+            available (bool):
+                Whether the packages required by the tree builder are
+                installed
+            package (str or None):
+                The package to install when it is not available
+        """
+        self.features = features
+        self.available = available
+        self.package = package
+
+    def parse(self, data, encoding=None):
+        if isinstance(data, bytes):
+            # the tree builder decodes the document itself
+            return BeautifulSoup(data, self.features, from_encoding=encoding)
+        return BeautifulSoup(data, self.features)
+
+    def css(self, tree, pattern, get_attr=None, get_text=False):
+        items = tree.select(pattern)
+        if get_attr:
+            return [item[get_attr] for item in items if get_attr in item.attrs]
+        elif get_text:
+            return [i.text for i in items]
+        else:
+            return [str(i) for i in items]
+
+    def item(self, tree, fields):
+        """Extracts the fields in a single walk of the tree"""
+        values = {name: [] for name, field in fields.items() if field.many}
+        active = [(name, field, compile_selector(field.selector).match)
+                  for name, field in fields.items()]
+        for node in tree.descendants:
+            if not isinstance(node, Tag):
+                continue
+            for entry in list(active):
+                name, field, match = entry
+                if not match(node):
+                    continue
+                if field.attr:
+                    value = node.get(field.attr)
+                    if value is None:
+                        continue
+                else:
+                    value = node.text
+                if field.many:
+                    values[name].append(value)
+                else:
+                    values[name] = value
+                    active.remove(entry)
+            if not active:
+                break
+        for name, field in fields.items():
+            if field.many and values[name]:
+                continue
+            if field.many or name not in values:
+                values[name] = field.get_default()
+        return values
+
+
+class LexborBackend(object):
+    """Parses the documents with the Lexbor engine of selectolax
+
+    Much faster than the BeautifulSoup based backends. The extracted
+    attributes and texts are the same as theirs, including the attributes
+    that BeautifulSoup splits into lists (like ``class``), but the elements
+    are serialized by Lexbor, e.g. ``<br>`` instead of ``<br/>``.
+    """
+    #: The attributes whose values are lists of tokens, by tag
+    LIST_ATTRIBUTES = HTMLTreeBuilder.DEFAULT_CDATA_LIST_ATTRIBUTES
+
+    def __init__(self):
+        self.available = LexborHTMLParser is not None
+        self.package = 'selectolax'
+
+    def parse(self, data, encoding=None):
+        # Lexbor reads the bytes as UTF-8
+        if isinstance(data, bytes) and encoding != 'utf-8':
+            data = charset.decode(data, encoding or 'utf-8')
+        return LexborHTMLParser(data)
+
+    def css(self, tree, pattern, get_attr=None, get_text=False):
+        items = tree.css(pattern)
+        if get_attr:
+            return [self.get_attr(item, get_attr) for item in items
+                    if get_attr in item.attributes]
+        elif get_text:
+            return [i.text(deep=True) for i in items]
+        else:
+            return [i.html for i in items]
+
+    def item(self, tree, fields):
+        """Extracts the fields with one native query per field"""
+        values = {}
+        for name, field in fields.items():
+            if field.attr:
+                found = self.css(tree, field.selector, get_attr=field.attr)
+            elif field.many:
+                found = self.css(tree, field.selector, get_text=True)
+            else:
+                node = tree.css_first(field.selector)
+                found = [] if node is None else [node.text(deep=True)]
+            if not found:
+                values[name] = field.get_default()
+            elif field.many:
+                values[name] = found
+            else:
+                values[name] = found[0]
+        return values
+
+    def get_attr(self, node, name):
+        value = node.attributes[name]
+        if value is None:
+            return ''
+        if name in self.LIST_ATTRIBUTES['*'] or \
+                name in self.LIST_ATTRIBUTES.get(node.tag, ()):
+            return value.split()
+        return value
+
+
+#: The available parser backends, by name
+PARSERS = {
+    'html.parser': SoupBackend('html.parser'),
+    'lxml': SoupBackend('lxml', lxml is not None, 'lxml'),
+    'html5lib': SoupBackend('html5lib', html5lib is not None, 'html5lib'),
+    'lexbor': LexborBackend()
+}
+
+DEFAULT_PARSER = 'html.parser'
 
 
 class Content(object):
-    """Content wrapper that provides common data extraction methods"""
+    """Content wrapper that provides common data extraction methods
+
+    The document is parsed once, the first time it is needed, and the parsed
+    document is reused by all the extraction methods.
+    """
+
+    def __init__(self, raw_data, parser=None, encoding=None):
+        """Wraps some text or bytes to be processed
+
+        The bytes are not decoded up front: they are given as they are to the
+        parsers that can decode them and are only decoded when the text is
+        needed.
 
-    def __init__(self, raw_data):
-        """Wraps some text or bytes to be processed"""
-        if isinstance(raw_data, bytes):
-            raw_data = raw_data.decode()
+        Args:
+            raw_data (str or bytes):
+                The document
+            parser (str or None):
+                The name of the parser backend (see ``extract.parser``).
+                Defaults to ``html.parser``.
+            encoding (str or None):
+                The encoding of the bytes. If None, it is detected from the
+                document (see :py:mod:`crawlster.helpers.charset`).
+        """
         self._data = raw_data
+        self._encoding = encoding
+        self._text = raw_data if isinstance(raw_data, str) else None
         self._parsed_data = None
+        self._parse_lock = threading.Lock()
+        self.parser = PARSERS[parser or DEFAULT_PARSER]
+
+    def __getstate__(self):
+        # the lock and the parsed document are not picklable, the document
+        # is parsed again when needed
+        state = self.__dict__.copy()
+        del state['_parse_lock']
+        state['_parsed_data'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._parse_lock = threading.Lock()
 
     @property
     def parsed_data(self):
-        """Access the underlying bs4.BeautifulSoup4 instance
+        """Access the underlying parsed document
+
+        A bs4.BeautifulSoup instance, or a selectolax LexborHTMLParser
+        instance for the ``lexbor`` parser.
 
         This property is provided for more advanced usage.
         """
-        if not self._parsed_data:
-            self._parsed_data = BeautifulSoup(self._data, 'html.parser')
+        if self._parsed_data is None:
+            with self._parse_lock:
+                if self._parsed_data is None:
+                    self._parsed_data = self.parser.parse(
+                        self._data, self.encoding)
         return self._parsed_data
 
+    @property
+    def encoding(self):
+        """The encoding of the document, None if it was given as text"""
+        if self._encoding is None and isinstance(self._data, bytes):
+            self._encoding = charset.detect_encoding(self._data)
+        return self._encoding
+
+    @property
+    def text(self):
+        """The document as text, decoded on the first access"""
+        if self._text is None:
+            self._text = charset.decode(self._data, self.encoding)
+        return self._text
+
+    def is_parsed(self):
+        """Returns whether the document was already parsed"""
+        return self._parsed_data is not None
+
     def css(self, pattern, get_attr=None, get_text=False):
         """Extracts data using css selector
 
@@ -54,24 +353,195 @@ class Content(object):
             If get_text is specified, returns a list with the text from the
             matched elements (direct children that are not nested tags).
         """
-        items = self.parsed_data.select(pattern)
-        if get_attr:
-            return [item[get_attr] for item in items if get_attr in item.attrs]
-        elif get_text:
-            return [i.text for i in items]
-        else:
-            return [str(i) for i in items]
+        return self.parser.css(self.parsed_data, pattern, get_attr, get_text)
+
+    def item(self, fields):
+        """Extracts several fields at once
+
+        The fields are extracted in a single walk of the document, without
+        serializing the matching elements::
+
+            content.item({
+                'title': 'h1',
+                'author': '.author::text',
+                'image': 'img.cover::attr(src)',
+                'tags': ['.tags a::text'],
+                'price': Field('.price', default='0')
+            })
+
+        Args:
+            fields (dict):
+                A mapping of field name - specification. See
+                :py:meth:`Field.from_spec` for the supported specifications.
+
+        Returns:
+            A dict with the values of the fields
+        """
+        fields = {name: Field.from_spec(spec) for name, spec in fields.items()}
+        return self.parser.item(self.parsed_data, fields)
 
 
 class ExtractHelper(BaseHelper):
+    """Helper for extracting data from HTML documents
+
+    Configuration options:
+
+    - ``extract.parser`` - the parser backend: ``html.parser`` (default,
+      always available), ``lxml`` (requires ``lxml``), ``html5lib``
+      (requires ``html5lib``) or ``lexbor`` (requires ``selectolax``)
+    - ``extract.cache_size`` - the number of parsed documents kept for the
+      calls made with the same text or bytes. 0 disables the cache.
+      Defaults to 32.
+    - ``extract.json_backend`` - the JSON backend used by
+      :py:meth:`jsonpath`: ``json``, ``orjson``, ``simdjson`` or ``auto``
+      (default) for the fastest one installed
+
+    The parsed documents are reused by the calls made with the same document:
+    a response (see :py:attr:`HttpResponse.extract`) is parsed once and the
+    parsed document is freed along with the response; the other documents
+    are kept in a LRU cache shared by all the threads. The reuses are
+    counted in the ``extract.cache.hits`` stat and the parses in the
+    ``extract.cache.misses`` stat.
+    """
     name = 'extract'
+    process_safe = True
+    config_options = {
+        'extract.parser': ChoiceOption(tuple(PARSERS),
+                                       default=DEFAULT_PARSER),
+        'extract.cache_size': NumberOption(default=32),
+        'extract.json_backend': ChoiceOption(
+            (jsonlib.AUTO, 'json', 'orjson', 'simdjson'),
+            default=jsonlib.AUTO)
+    }
+    STAT_CACHE_HITS = 'extract.cache.hits'
+    STAT_CACHE_MISSES = 'extract.cache.misses'
 
     def __init__(self):
         super(ExtractHelper, self).__init__()
+        self.parser = DEFAULT_PARSER
+        self.cache_size = 32
+        self.json_backend = jsonlib.AUTO
+        self._cache = collections.OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def initialize(self):
+        self.parser = self.config.get('extract.parser')
+        self.cache_size = self.config.get('extract.cache_size')
+        self.json_backend = self.config.get('extract.json_backend')
+        try:
+            jsonlib.get_backend(self.json_backend)
+        except ValueError as e:
+            raise ConfigurationError(str(e))
+        with self._cache_lock:
+            self._cache.clear()
+        backend = PARSERS[self.parser]
+        if not backend.available:
+            raise ConfigurationError(
+                'The {} parser requires the {} package: pip install {}'.format(
+                    self.parser, backend.package, backend.package))
+
+    def content(self, data):
+        """Returns the :py:class:`Content` of a document
+
+        Args:
+            data (str, bytes or HttpResponse):
+                The document. The content of a response is the one of its
+                :py:attr:`HttpResponse.extract` property.
+        """
+        if not isinstance(data, (str, bytes)):
+            content = data.extract
+            self._record_hit(content.is_parsed())
+            return content
+        if not self.cache_size:
+            self._record_hit(False)
+            return Content(data, self.parser)
+        with self._cache_lock:
+            content = self._cache.get(data)
+            hit = content is not None
+            if hit:
+                self._cache.move_to_end(data)
+            else:
+                content = self._cache[data] = Content(data, self.parser)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        self._record_hit(hit)
+        return content
+
+    def _record_hit(self, hit):
+        if self.crawler is not None:
+            self.crawler.stats.incr(
+                self.STAT_CACHE_HITS if hit else self.STAT_CACHE_MISSES)
+
+    def item(self, text, fields):
+        """Extracts several fields at once from a document
+
+        See :py:meth:`Content.item` for more info.
+        """
+        return self.content(text).item(fields)
+
+    def links(self, text, base_url=None, tags=DEFAULT_TAGS, rel=None,
+              exclude_rel=None):
+        """Returns the absolute urls of the links of a document
+
+        The document is scanned without being parsed, which is much faster
+        than extracting the links with :py:meth:`css` and joining them with
+        the url of the document.
+
+        Args:
+            text (str, bytes or HttpResponse):
+                The document
+            base_url (str or None):
+                The url of the document. Defaults to the url of the request
+                when the document is a response.
+
+        See :py:func:`crawlster.helpers.links.extract_links` for the other
+        arguments.
+        """
+        if isinstance(text, bytes):
+            encoding = charset.get_meta_encoding(text) or 'utf-8'
+        elif isinstance(text, str):
+            encoding = 'utf-8'
+        else:
+            if base_url is None:
+                base_url = text.request.url
+            encoding = text.encoding
+            text = text.body
+        return extract_links(text, base_url or '', tags, rel, exclude_rel,
+                             encoding)
+
+    def jsonpath(self, document, path, first=False):
+        """Selects values from a JSON document
+
+        Args:
+            document (bytes, str, dict, list or HttpResponse):
+                The JSON document, or the document already parsed. The
+                declared charset of the responses is taken into account (see
+                :py:meth:`HttpResponse.json_document`).
+            path (str):
+                The path of the values, e.g. ``$.items[*].id``. See
+                :py:mod:`crawlster.helpers.jsonpath` for the syntax.
+            first (bool):
+                If True, only the first value (or None) is returned
+
+        Returns:
+            The list of the selected values
+        """
+        if not isinstance(document, (bytes, str, dict, list)):
+            document = document.json_document()
+        values = jsonpath.find(document, path, self.json_backend)
+        if first:
+            return values[0] if values else None
+        return values
 
     def css(self, text, selector, attr=None, content=None):
         """Extracts data using css selector.
 
+        Args:
+            text (str, bytes or HttpResponse):
+                The document. It is parsed only once for all the calls
+                made with the same document (see :py:meth:`content`).
+
         See :py:meth:``Content.css`` for more info.
         """
-        return Content(text).css(selector, get_attr=attr, get_text=content)
+        return self.content(text).css(
+            selector, get_attr=attr, get_text=content)
@@ -0,0 +1,515 @@
+"""Storage structures for the pending jobs of the :py:class:`QueueHelper`.
+
+A frontier must provide:
+
+- ``push(item)`` to add an item
+- ``pop()`` to remove and return the next item that can be processed. Raises
+  :py:class:`IndexError` if no item is ready
+- ``done(item)`` called when a popped item was processed
+- ``next_ready()`` that returns the number of seconds until an item may
+  become ready, or None if the frontier is waiting for ``push`` or ``done``
+- ``__len__`` that returns the number of pending items
+
+Frontiers are not thread safe, the queue helper serializes the access.
+"""
+import collections
+import heapq
+import itertools
+import math
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import urllib.parse
+
+
+class FifoFrontier(object):
+    """Stores the pending jobs in the order they were added"""
+
+    def __init__(self):
+        self._items = collections.deque()
+
+    def push(self, item):
+        self._items.append(item)
+
+    def pop(self):
+        """Removes and returns the next item. Raises IndexError if empty"""
+        return self._items.popleft()
+
+    def done(self, item):
+        pass
+
+    def next_ready(self):
+        return 0 if self._items else None
+
+    def __len__(self):
+        return len(self._items)
+
+
+class LifoFrontier(FifoFrontier):
+    """Stores the pending jobs as a stack"""
+
+    def pop(self):
+        return self._items.pop()
+
+
+class SpillingFrontier(object):
+    """FIFO or LIFO frontier that keeps a bounded number of jobs in memory
+
+    The jobs over ``max_resident`` are moved to segment files of ``batch``
+    jobs each, in a private temporary directory, and are loaded back in
+    batches when the jobs in memory run out:
+
+    - in FIFO mode the newest jobs are spilled, since they are processed last
+    - in LIFO mode the oldest jobs are spilled, for the same reason
+
+    The jobs are converted with ``dump`` before being written (they must
+    become picklable) and with ``load`` after being read. If the jobs can not
+    be written, :py:meth:`push` raises and the new job is not added, while
+    the others are kept in memory.
+    """
+
+    def __init__(self, lifo, max_resident, batch, dump, load, directory=None):
+        """Initializes the frontier
+
+        Args:
+            lifo (bool):
+                Whether the jobs are processed as a stack
+            max_resident (int):
+                The maximum number of jobs kept in memory
+            batch (int):
+                The number of jobs written in a segment file
+            dump (callable):
+                Converts a job to a picklable object
+            load (callable):
+                Converts the object returned by dump back to a job
+            directory (str or None):
+                Where the temporary directory for the segment files is
+                created. Defaults to the system temporary directory.
+        """
+        self.lifo = lifo
+        self.max_resident = max(max_resident, 1)
+        self.batch = max(min(batch, self.max_resident), 1)
+        self.dump = dump
+        self.load = load
+        self.base_directory = directory
+        self.directory = None
+        self._memory = collections.deque()
+        # FIFO mode only: the newest jobs, waiting to fill a segment
+        self._tail = []
+        self._segments = collections.deque()
+        self._segment_ids = itertools.count()
+        self._spilled = 0
+
+    def push(self, item):
+        # the jobs are spilled before the item is added, so that the item is
+        # not added and no job is lost if they can not be written
+        if self.lifo:
+            if len(self._memory) >= self.max_resident:
+                self._write_segment(
+                    list(itertools.islice(self._memory, self.batch)))
+                for _ in range(self.batch):
+                    self._memory.popleft()
+            self._memory.append(item)
+        elif self._segments or self._tail or \
+                len(self._memory) >= self.max_resident:
+            # the newer jobs must wait behind the spilled ones
+            if len(self._tail) + 1 >= self.batch:
+                self._write_segment(self._tail + [item])
+                self._tail = []
+            else:
+                self._tail.append(item)
+        else:
+            self._memory.append(item)
+
+    def pop(self):
+        if not self._memory:
+            self._refill()
+        if self.lifo:
+            return self._memory.pop()
+        return self._memory.popleft()
+
+    def done(self, item):
+        pass
+
+    def next_ready(self):
+        return 0 if len(self) else None
+
+    def spilled_count(self):
+        """Returns the number of jobs that are not kept in memory"""
+        return self._spilled + len(self._tail)
+
+    def _refill(self):
+        """Loads the next batch of jobs in memory"""
+        if self._segments:
+            path = self._segments.pop() if self.lifo else \
+                self._segments.popleft()
+            with open(path, 'rb') as fp:
+                states = pickle.load(fp)
+            os.remove(path)
+            self._spilled -= len(states)
+            self._memory.extend(self.load(state) for state in states)
+        elif self._tail:
+            self._memory.extend(self._tail)
+            self._tail = []
+
+    def _write_segment(self, items):
+        if not self.directory:
+            self.directory = tempfile.mkdtemp(prefix='crawlster-frontier-',
+                                              dir=self.base_directory)
+        path = os.path.join(self.directory, 'segment-{}.pickle'.format(
+            next(self._segment_ids)))
+        try:
+            with open(path, 'wb') as fp:
+                pickle.dump([self.dump(item) for item in items], fp,
+                            pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+        self._segments.append(path)
+        self._spilled += len(items)
+
+    def close(self):
+        """Removes the segment files"""
+        if self.directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+
+    def __len__(self):
+        return len(self._memory) + len(self._tail) + self._spilled
+
+
+def score_by_depth(item):
+    """Default priority scorer: shallow jobs are processed first"""
+    return -getattr(item, 'depth', 0)
+
+
+class PriorityFrontier(object):
+    """Stores the pending jobs in a heap ordered by their priority
+
+    Higher priorities are processed first, jobs with the same priority are
+    processed in the order they were added. The priority is the ``priority``
+    attribute of the job or, if it is missing or None, the value returned by
+    the scorer for it.
+
+    The number of pending jobs is tracked per priority band (the priority
+    rounded down to an integer).
+    """
+
+    def __init__(self, scorer=None):
+        """Initializes the frontier
+
+        Args:
+            scorer (callable or None):
+                Called with a job, must return its priority. Defaults to
+                :py:func:`score_by_depth`.
+        """
+        self.scorer = scorer or score_by_depth
+        self._heap = []
+        self._counter = itertools.count()
+        self._bands = collections.Counter()
+
+    def push(self, item):
+        priority = getattr(item, 'priority', None)
+        if priority is None:
+            priority = self.scorer(item)
+        heapq.heappush(self._heap, (-priority, next(self._counter), item))
+        self._bands[math.floor(priority)] += 1
+
+    def pop(self):
+        neg_priority, _, item = heapq.heappop(self._heap)
+        band = math.floor(-neg_priority)
+        self._bands[band] -= 1
+        if not self._bands[band]:
+            del self._bands[band]
+        return item
+
+    def done(self, item):
+        pass
+
+    def next_ready(self):
+        return 0 if self._heap else None
+
+    def band_sizes(self):
+        """Returns a mapping of priority band to the number of pending jobs"""
+        return dict(self._bands)
+
+    def __len__(self):
+        return len(self._heap)
+
+
+class HostLane(object):
+    """The pending jobs and the politeness state of a single host"""
+    IDLE = 'idle'
+    READY = 'ready'
+    WAITING = 'waiting'
+    BLOCKED = 'blocked'
+
+    def __init__(self, frontier, concurrency, rate, burst):
+        self.frontier = frontier
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last_refill = time.monotonic()
+        self.active = 0
+        self.state = self.IDLE
+
+    def refill(self, now):
+        """Adds the tokens accumulated since the last refill"""
+        if self.rate:
+            elapsed = now - self.last_refill
+            self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        self.last_refill = now
+
+    def take(self):
+        """Pops the next item and consumes a request slot and a token"""
+        item = self.frontier.pop()
+        self.active += 1
+        if self.rate:
+            self.tokens -= 1
+        return item
+
+    def is_saturated(self):
+        return bool(self.concurrency) and self.active >= self.concurrency
+
+    def ready_at(self, now):
+        """Returns the moment the next token will be available"""
+        if not self.rate or self.tokens >= 1:
+            return now
+        return now + (1 - self.tokens) / self.rate
+
+
+class HostFrontier(object):
+    """Per host frontier that enforces politeness limits.
+
+    Each host has its own frontier of pending jobs. The jobs are handed out
+    in a round robin fashion across the hosts that are ready, so a single
+    host with a lot of pending jobs can not starve the others. A host is not
+    ready when it has ``concurrency`` jobs in progress or when it exceeded
+    its request rate, which is enforced with a token bucket of ``burst``
+    tokens refilled with ``rate`` tokens per second.
+
+    Jobs without an url (see :py:attr:`crawlster.core.FuncJob.url`) are not
+    subject to any limit.
+
+    The state of a host is dropped once it has no pending or in progress job
+    and its token bucket is full again, so only the hosts currently being
+    crawled are kept in memory.
+
+    With an ``overflow`` frontier, at most ``max_resident`` jobs are kept in
+    the frontiers of the hosts, whatever the number of hosts. The other jobs
+    wait in the overflow frontier, which usually spills them to disk, and
+    are moved to the frontier of their host once there is room.
+    """
+
+    def __init__(self, frontier_factory, concurrency=0, rate=0, burst=1,
+                 max_resident=0, overflow=None):
+        """Initializes the frontier
+
+        Args:
+            frontier_factory (callable):
+                Creates the frontier used for the jobs of a single host
+            concurrency (int):
+                The maximum number of jobs in progress per host. 0 means no
+                limit.
+            rate (float):
+                The maximum number of jobs per second per host. 0 means no
+                limit.
+            burst (int):
+                The number of jobs a host can start at once before being
+                limited by the rate
+            max_resident (int):
+                The maximum number of jobs in the frontiers of the hosts.
+                Only used with an overflow frontier.
+            overflow (object or None):
+                The frontier of the jobs over ``max_resident``
+        """
+        self.frontier_factory = frontier_factory
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_resident = max(max_resident, 1)
+        self.overflow = overflow
+        self._lanes = {}
+        self._ready = collections.deque()
+        self._waiting = []
+        self._idle = []
+        self._size = 0
+
+    @staticmethod
+    def get_host(item):
+        """Returns the host the item is about, None if unknown"""
+        url = getattr(item, 'url', None)
+        if not url:
+            return None
+        return urllib.parse.urlsplit(url).netloc.lower() or None
+
+    def get_lane(self, host):
+        lane = self._lanes.get(host)
+        if lane is None:
+            if host is None:
+                lane = HostLane(self.frontier_factory(), 0, 0, 1)
+            else:
+                lane = HostLane(self.frontier_factory(), self.concurrency,
+                                self.rate, self.burst)
+            self._lanes[host] = lane
+        return lane
+
+    def set_host_rate(self, host, rate):
+        """Overrides the request rate of a single host
+
+        The override is kept in the state of the host, so it only applies to
+        a host that has pending or in progress jobs and is dropped along
+        with that state.
+
+        Returns:
+            bool: whether the rate of the host changed
+        """
+        lane = self._lanes.get(host)
+        if lane is None or lane.rate == rate:
+            return False
+        lane.refill(time.monotonic())
+        lane.rate = rate
+        return True
+
+    def push(self, item):
+        if self.overflow is not None and (
+                len(self.overflow) or
+                self.resident_count() >= self.max_resident):
+            # behind the jobs already waiting, if any
+            self.overflow.push(item)
+        else:
+            self._push_lane(item)
+        self._size += 1
+
+    def pop(self):
+        now = time.monotonic()
+        self._drop_idle(now)
+        self._refill()
+        while self._waiting and self._waiting[0][0] <= now:
+            _, host = heapq.heappop(self._waiting)
+            lane = self._lanes[host]
+            lane.state = HostLane.READY
+            self._ready.append(host)
+        if not self._ready:
+            raise IndexError('No host is ready')
+        host = self._ready.popleft()
+        lane = self._lanes[host]
+        lane.refill(now)
+        item = lane.take()
+        self._size -= 1
+        self._place(host, lane, now)
+        return item
+
+    def done(self, item):
+        host = self.get_host(item)
+        lane = self._lanes.get(host)
+        if lane is None:
+            return
+        lane.active -= 1
+        if lane.state == HostLane.BLOCKED or (
+                lane.state == HostLane.IDLE and not lane.active):
+            self._place(host, lane, time.monotonic())
+
+    def band_sizes(self):
+        """Returns the pending jobs per priority band for all the hosts"""
+        bands = collections.Counter()
+        for lane in self._lanes.values():
+            if hasattr(lane.frontier, 'band_sizes'):
+                bands.update(lane.frontier.band_sizes())
+        return dict(bands)
+
+    def resident_count(self):
+        """Returns the number of jobs in the frontiers of the hosts"""
+        overflow = len(self.overflow) if self.overflow is not None else 0
+        return self._size - overflow
+
+    def spilled_count(self):
+        """Returns the number of jobs that are not kept in memory"""
+        spilled = sum(lane.frontier.spilled_count()
+                      for lane in self._lanes.values()
+                      if hasattr(lane.frontier, 'spilled_count'))
+        if hasattr(self.overflow, 'spilled_count'):
+            spilled += self.overflow.spilled_count()
+        return spilled
+
+    def close(self):
+        for lane in self._lanes.values():
+            if hasattr(lane.frontier, 'close'):
+                lane.frontier.close()
+        if hasattr(self.overflow, 'close'):
+            self.overflow.close()
+
+    def next_ready(self):
+        self._refill()
+        if self._ready:
+            return 0
+        if self._waiting:
+            return max(self._waiting[0][0] - time.monotonic(), 0)
+        return None
+
+    def _push_lane(self, item):
+        """Adds a job to the frontier of its host"""
+        self._drop_idle(time.monotonic())
+        host = self.get_host(item)
+        lane = self.get_lane(host)
+        lane.frontier.push(item)
+        if lane.state == HostLane.IDLE:
+            self._place(host, lane, time.monotonic())
+
+    def _refill(self):
+        """Moves the overflow jobs to their host while there is room"""
+        if self.overflow is None:
+            return
+        while len(self.overflow) and \
+                self.resident_count() < self.max_resident:
+            self._push_lane(self.overflow.pop())
+
+    def _place(self, host, lane, now):
+        """Moves the host in the structure matching its current state"""
+        if not lane.frontier:
+            lane.state = HostLane.IDLE
+            if not lane.active:
+                self._release(host, lane, now)
+        elif lane.is_saturated():
+            lane.state = HostLane.BLOCKED
+        else:
+            lane.refill(now)
+            ready_at = lane.ready_at(now)
+            if ready_at > now:
+                lane.state = HostLane.WAITING
+                heapq.heappush(self._waiting, (ready_at, host))
+            else:
+                lane.state = HostLane.READY
+                self._ready.append(host)
+
+    def _release(self, host, lane, now):
+        """Drops the state of an idle host once its token bucket is full
+
+        Until then, the host is kept so that its rate is still enforced if
+        new jobs come in.
+        """
+        lane.refill(now)
+        if lane.rate and lane.tokens < lane.burst:
+            full_at = now + (lane.burst - lane.tokens) / lane.rate
+            heapq.heappush(self._idle, (full_at, host))
+            return
+        del self._lanes[host]
+        if hasattr(lane.frontier, 'close'):
+            lane.frontier.close()
+
+    def _drop_idle(self, now):
+        """Releases the idle hosts whose token bucket is full again"""
+        while self._idle and self._idle[0][0] <= now:
+            _, host = heapq.heappop(self._idle)
+            lane = self._lanes.get(host)
+            # the host may have received new jobs meanwhile
+            if lane is not None and lane.state == HostLane.IDLE and \
+                    not lane.active:
+                self._release(host, lane, now)
+
+    def __len__(self):
+        return self._size
@@ -0,0 +1,126 @@
+"""Transport adapter that sizes the connection pools and counts their usage"""
+import socket
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError, ConnectTimeoutError
+
+try:
+    from urllib3.exceptions import NameResolutionError
+except ImportError:
+    # urllib3 < 2 reports the resolution errors as NewConnectionError
+    NameResolutionError = None
+
+from crawlster.helpers.http.dns import is_ip_address
+
+STAT_CONNECTIONS_NEW = 'http.connections.new'
+STAT_CONNECTIONS_REUSED = 'http.connections.reused'
+
+
+class ConnectionCountingMixin(object):
+    """Connection pool mixin that counts the new and reused connections
+
+    A connection is reused when it is taken from the pool with its socket
+    still open, new connections (including the ones replacing a dropped
+    connection) are not connected yet.
+    """
+    #: The StatsHelper the counts are reported to
+    stats = None
+
+    def _get_conn(self, timeout=None):
+        conn = super(ConnectionCountingMixin, self)._get_conn(timeout)
+        if getattr(conn, 'sock', None) is None:
+            self.stats.incr(STAT_CONNECTIONS_NEW)
+        else:
+            self.stats.incr(STAT_CONNECTIONS_REUSED)
+        return conn
+
+
+class CachedDnsMixin(object):
+    """Connection mixin that resolves the host through a DnsCache
+
+    The resolved addresses are tried in order until a connection succeeds.
+    The original host name is still used for the Host header and for TLS.
+
+    It relies on the ``_dns_host`` attribute of the urllib3 connections
+    (urllib3 1.25 and later), which holds the address that is connected to.
+    """
+    #: The DnsCache used for the lookups
+    dns_cache = None
+
+    def _new_conn(self):
+        host = getattr(self, '_dns_host', None)
+        if host is None or is_ip_address(host):
+            return super(CachedDnsMixin, self)._new_conn()
+        try:
+            addresses = self.dns_cache.resolve(host, self.port)
+        except socket.gaierror as e:
+            if NameResolutionError is None:
+                raise NewConnectionError(
+                    self, 'Failed to resolve {}: {}'.format(host, e)) from e
+            raise NameResolutionError(self.host, self, e) from e
+        error = None
+        try:
+            for address in unique_addresses(addresses):
+                self._dns_host = address
+                try:
+                    return super(CachedDnsMixin, self)._new_conn()
+                except (NewConnectionError, ConnectTimeoutError) as e:
+                    error = e
+        finally:
+            self._dns_host = host
+        raise error
+
+
+def unique_addresses(addresses):
+    """Returns the distinct IP addresses from a getaddrinfo result"""
+    seen = []
+    for _, _, _, _, sockaddr in addresses:
+        if sockaddr[0] not in seen:
+            seen.append(sockaddr[0])
+    return seen
+
+
+class PoolingAdapter(HTTPAdapter):
+    """HTTP adapter whose connection pools report to the crawler stats"""
+
+    def __init__(self, stats, pool_connections, pool_maxsize, dns_cache=None):
+        """Initializes the adapter
+
+        Args:
+            stats (StatsHelper):
+                Where the connection counts are reported
+            pool_connections (int):
+                The number of hosts whose connection pools are kept
+            pool_maxsize (int):
+                The maximum number of idle connections kept per host
+            dns_cache (DnsCache or None):
+                The cache used for resolving the hosts. If not provided, the
+                system resolver is called for each new connection.
+        """
+        self.stats = stats
+        self.dns_cache = dns_cache
+        super(PoolingAdapter, self).__init__(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(PoolingAdapter, self).init_poolmanager(*args, **kwargs)
+        http_attrs = {'stats': self.stats}
+        https_attrs = {'stats': self.stats}
+        if self.dns_cache is not None:
+            dns_attrs = {'dns_cache': self.dns_cache}
+            http_attrs['ConnectionCls'] = type(
+                'CachedDnsHTTPConnection', (CachedDnsMixin, HTTPConnection),
+                dns_attrs)
+            https_attrs['ConnectionCls'] = type(
+                'CachedDnsHTTPSConnection', (CachedDnsMixin, HTTPSConnection),
+                dns_attrs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': type('CountingHTTPConnectionPool',
+                         (ConnectionCountingMixin, HTTPConnectionPool),
+                         http_attrs),
+            'https': type('CountingHTTPSConnectionPool',
+                          (ConnectionCountingMixin, HTTPSConnectionPool),
+                          https_attrs),
+        }
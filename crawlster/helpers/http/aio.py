@@ -0,0 +1,211 @@
+import asyncio
+import functools
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from crawlster.helpers.http import compression, transport
+from crawlster.helpers.http.request import (
+    HttpRequest, GetRequest, PostRequest)
+
+
+def in_event_loop():
+    """Returns whether the calling thread is running an asyncio event loop"""
+    try:
+        if hasattr(asyncio, 'get_running_loop'):
+            asyncio.get_running_loop()
+            return True
+        # asyncio.get_running_loop() was added in Python 3.7
+        return asyncio.get_event_loop().is_running()
+    except RuntimeError:
+        return False
+
+
+class AsyncRequests(object):
+    """Awaitable counterpart of the :py:class:`RequestsHelper` methods.
+
+    Available as ``self.http.aio`` and meant to be used from ``async def``
+    steps when running with the ``asyncio`` engine::
+
+        @start
+        async def step_start(self, url):
+            resp = await self.http.aio.get(url)
+
+    When httpx is installed, the requests are sent from the event loop
+    through an ``httpx.AsyncClient`` of at most ``http.max_in_flight``
+    connections, so the requests in flight don't hold any thread. Like with
+    the ``'httpx'`` transport, the DNS cache of the helper is not used and
+    the ``http.connections.*`` stats are not reported. The lookups and the
+    updates of the HTTP cache still run in a pool of threads.
+
+    Without httpx, the requests are made by :py:meth:`RequestsHelper.open`
+    in a dedicated pool of ``http.max_in_flight`` threads: each request
+    holds a thread until it completes.
+
+    Either way, the event loop keeps dispatching other steps while the
+    request is in flight and all the behaviour of
+    :py:meth:`RequestsHelper.open` (stats, retries, body limits, caching,
+    error handling) is preserved.
+
+    The blocking methods of the helpers must not be called from a coroutine
+    step, as they would stop the event loop: :py:meth:`RequestsHelper.open`
+    raises RuntimeError when called from the event loop thread. The other
+    helper calls that can make requests, like ``urls.can_crawl`` when
+    robots.txt is obeyed, are run in the same threads with :py:meth:`run`::
+
+        allowed = await self.http.aio.run(self.urls.can_crawl, url)
+    """
+
+    def __init__(self, helper, max_in_flight):
+        """Initializes the async interface
+
+        Args:
+            helper (RequestsHelper):
+                The helper that performs the actual requests
+            max_in_flight (int):
+                The maximum number of requests that can be in flight at once
+        """
+        self.helper = helper
+        self.max_in_flight = max_in_flight
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight)
+        #: The httpx transport, created on the event loop it is used from
+        self.transport = None
+
+    async def open(self, http_request):
+        """Opens a given HTTP request without blocking the event loop.
+
+        See :py:meth:`RequestsHelper.open` for more info.
+        """
+        if transport.httpx is None:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(
+                self.executor, self.helper.open, http_request)
+        helper = self.helper
+        cache_key, cached = await self.run_cache(helper.lookup_cache,
+                                                 http_request)
+        if cached and cached.is_fresh():
+            return helper.cache_hit(http_request, cached)
+        headers = http_request.headers
+        if cached:
+            headers = dict(headers, **cached.validators())
+
+        host = urllib.parse.urlsplit(http_request.url).netloc.lower()
+        if not helper.allow_host(http_request, host):
+            return None
+        try:
+            resp, body, truncated = await self.fetch_with_retries(
+                http_request, headers, host)
+            return await self.run_cache(
+                helper.handle_response, http_request, resp, body, truncated,
+                cache_key, cached)
+        except transport.ERRORS + (ValueError,) as e:
+            helper.record_error(e)
+
+    async def fetch_with_retries(self, http_request, headers, host):
+        """Sends a request, retrying it according to the retry policy
+
+        See :py:meth:`RequestsHelper.fetch_with_retries` for more info.
+        """
+        helper = self.helper
+        attempt = 0
+        while True:
+            error = None
+            try:
+                resp, body, truncated = await self.fetch(http_request,
+                                                         headers)
+                if not helper.retry_policy.is_retryable(resp.status_code):
+                    helper.breaker.record_success(host)
+                    return resp, body, truncated
+            except transport.ERRORS as e:
+                resp, error = None, e
+            delay = helper.get_retry_delay(http_request, host, attempt, resp)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return resp, body, truncated
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def fetch(self, http_request, headers):
+        """Sends a request and reads the body of the response
+
+        See :py:meth:`RequestsHelper.fetch` for more info.
+        """
+        helper = self.helper
+        helper.crawler.stats.incr(helper.STAT_REQUESTS)
+        helper.crawler.stats.incr(helper.STAT_UPLOAD,
+                                  by=helper._compute_req_size(http_request))
+        started = time.monotonic()
+        stream = self.get_transport().stream(http_request, headers)
+        async with stream as resp:
+            helper.record_latency(time.monotonic() - started)
+            reader = helper.body_reader(resp.headers)
+            if not reader.done:
+                chunks = resp.aiter_raw(helper.config.get('http.chunk_size'))
+                async for chunk in chunks:
+                    reader.feed(chunk)
+                    if reader.done:
+                        break
+        body, truncated = helper.finish_body(reader, str(resp.url))
+        return resp, body, truncated
+
+    def get_transport(self):
+        """Returns the httpx transport, creating it on the running loop"""
+        if self.transport is None:
+            config = self.helper.config
+            self.transport = transport.AsyncHttpxTransport(
+                self.max_in_flight,
+                {'Accept-Encoding': compression.accept_encoding()},
+                config.get('http.http2_prior_knowledge'),
+                http2=config.get('http.transport') == 'httpx')
+        return self.transport
+
+    async def run_cache(self, func, *args):
+        """Runs a function that uses the HTTP cache in the request threads,
+        or right away if the cache is disabled"""
+        if self.helper.cache is None:
+            return func(*args)
+        return await self.run(func, *args)
+
+    async def run(self, func, *args, **kwargs):
+        """Runs a blocking function in the request threads and returns its
+        result, without blocking the event loop"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs))
+
+    async def get(self, url, query_params=None, headers=None):
+        """Makes a GET request"""
+        return await self.open(
+            GetRequest(url, query_params or {}, headers or {})
+        )
+
+    async def post(self, url, data=None, query_params=None, headers=None):
+        """Makes a POST request"""
+        return await self.open(PostRequest(url, data, query_params, headers))
+
+    async def patch(self, url, data=None, query_params=None, headers=None):
+        """Makes a PATCH request"""
+        return await self.open(
+            HttpRequest(url, 'PATCH', query_params, data, headers))
+
+    async def delete(self, url, data=None, query_params=None, headers=None):
+        """Makes a DELETE request"""
+        return await self.open(
+            HttpRequest(url, 'DELETE', query_params, data, headers))
+
+    async def options(self, url, query_params=None, headers=None):
+        """Makes an OPTIONS request"""
+        return await self.open(
+            HttpRequest(url, 'OPTIONS', query_params, None, headers))
+
+    async def aclose(self):
+        """Closes the connections of the httpx transport, which must be done
+        on the event loop they were opened from"""
+        if self.transport is not None:
+            await self.transport.close()
+            self.transport = None
+
+    def close(self):
+        """Releases the threads used for the in flight requests"""
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,196 @@
+"""On-disk HTTP cache used by the :py:class:`RequestsHelper`.
+
+The responses to ``GET`` requests are stored in a SQLite database along with
+their freshness lifetime, computed from the ``Cache-Control`` and ``Expires``
+headers. Fresh responses are served without touching the network, stale ones
+are revalidated with ``If-None-Match`` / ``If-Modified-Since`` when they
+carry an ``ETag`` or a ``Last-Modified`` header.
+"""
+import email.utils
+import json
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+from requests.structures import CaseInsensitiveDict
+
+
+def parse_cache_control(value):
+    """Parses a Cache-Control header into a dict of directive to value
+
+    Directives without a value are mapped to True.
+    """
+    directives = {}
+    for part in (value or '').split(','):
+        name, _, argument = part.strip().partition('=')
+        if not name:
+            continue
+        directives[name.lower()] = argument.strip('"') if argument else True
+    return directives
+
+
+def parse_http_date(value):
+    """Returns the timestamp of a HTTP date, None if it is invalid"""
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class CacheEntry(object):
+    """A stored response"""
+
+    def __init__(self, status_code, headers, body, expires):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.expires = expires
+
+    def is_fresh(self, now=None):
+        return self.expires > (now or time.time())
+
+    def validators(self):
+        """Returns the headers used for revalidating the entry"""
+        headers = {}
+        if 'ETag' in self.headers:
+            headers['If-None-Match'] = self.headers['ETag']
+        if 'Last-Modified' in self.headers:
+            headers['If-Modified-Since'] = self.headers['Last-Modified']
+        return headers
+
+
+class HttpCache(object):
+    """SQLite backed store of HTTP responses
+
+    The cache is shared by all the workers, the access to the database is
+    serialized with a lock.
+    """
+    CACHEABLE_STATUS = (200, 203, 300, 301, 308, 404, 410)
+
+    def __init__(self, path, default_ttl=0):
+        """Initializes the cache
+
+        Args:
+            path (str):
+                The SQLite database file. Created if it does not exist.
+            default_ttl (float):
+                The freshness lifetime in seconds of the responses without
+                ``Cache-Control: max-age`` or ``Expires`` headers
+        """
+        self.path = path
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT PRIMARY KEY, status_code INTEGER, headers TEXT, '
+                'body BLOB, expires REAL)')
+
+    @staticmethod
+    def get_key(http_request):
+        """Returns the key a request is stored by, None if not cacheable"""
+        if http_request.method != 'GET':
+            return None
+        cache_control = parse_cache_control(
+            http_request.headers.get('Cache-Control'))
+        if 'no-store' in cache_control:
+            return None
+        url = http_request.url
+        if http_request.query_params:
+            query = urllib.parse.urlencode(
+                sorted(http_request.query_params.items()), doseq=True)
+            url = '{}{}{}'.format(url, '&' if '?' in url else '?', query)
+        return url
+
+    def get(self, key):
+        """Returns the stored entry for the key, None if missing"""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT status_code, headers, body, expires FROM responses '
+                'WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        status_code, headers, body, expires = row
+        headers = CaseInsensitiveDict(json.loads(headers))
+        return CacheEntry(status_code, headers, bytes(body), expires)
+
+    def freshness_lifetime(self, headers, now=None):
+        """Computes how long a response can be served without revalidation
+
+        Returns:
+            The number of seconds, or None if the response must not be stored
+        """
+        cache_control = parse_cache_control(headers.get('Cache-Control'))
+        if 'no-store' in cache_control:
+            return None
+        if 'no-cache' in cache_control:
+            return 0
+        age = _to_number(headers.get('Age')) or 0
+        for directive in ('s-maxage', 'max-age'):
+            max_age = _to_number(cache_control.get(directive))
+            if max_age is not None:
+                return max(max_age - age, 0)
+        if 'Expires' in headers:
+            expires = parse_http_date(headers['Expires'])
+            date = parse_http_date(headers.get('Date')) or now or time.time()
+            return max(expires - date, 0) if expires else 0
+        return self.default_ttl
+
+    def store(self, key, status_code, headers, body):
+        """Stores a response if it is allowed to
+
+        Returns:
+            The stored entry, or None if the response was not stored
+        """
+        if status_code not in self.CACHEABLE_STATUS:
+            return None
+        now = time.time()
+        lifetime = self.freshness_lifetime(headers, now)
+        if lifetime is None:
+            return None
+        entry = CacheEntry(status_code, CaseInsensitiveDict(headers), body,
+                           now + lifetime)
+        if not lifetime and not entry.validators():
+            # it could never be served
+            return None
+        self._write(key, entry)
+        return entry
+
+    def refresh(self, key, entry, headers):
+        """Updates an entry after a 304 Not Modified response
+
+        Args:
+            key (str):
+                The key of the entry
+            entry (CacheEntry):
+                The revalidated entry
+            headers (dict):
+                The headers of the 304 response, which replace the stored
+                ones
+        """
+        entry.headers.update(headers)
+        lifetime = self.freshness_lifetime(entry.headers) or 0
+        entry.expires = time.time() + lifetime
+        self._write(key, entry)
+        return entry
+
+    def _write(self, key, entry):
+        headers = json.dumps(list(entry.headers.items()))
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                (key, entry.status_code, headers, entry.body, entry.expires))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def _to_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,98 @@
+"""Content codings supported for the response bodies.
+
+``gzip`` and ``deflate`` are always available, ``br`` requires the ``brotli``
+(or ``brotlicffi``) package and ``zstd`` requires the ``zstandard`` package.
+"""
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def decode_gzip(data):
+    # a gzip body may contain multiple members
+    chunks = []
+    while data:
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        chunks.append(decoder.decompress(data))
+        chunks.append(decoder.flush())
+        data = decoder.unused_data
+    return b''.join(chunks)
+
+
+def decode_deflate(data):
+    try:
+        return zlib.decompress(data)
+    except zlib.error:
+        # some servers send raw deflate data without the zlib wrapper
+        return zlib.decompress(data, -zlib.MAX_WBITS)
+
+
+def decode_zstd(data):
+    decoder = zstandard.ZstdDecompressor().decompressobj()
+    return decoder.decompress(data) + decoder.flush()
+
+
+#: The available decoders, by content coding
+DECODERS = {
+    'gzip': decode_gzip,
+    'x-gzip': decode_gzip,
+    'deflate': decode_deflate,
+}
+if brotli is not None:
+    DECODERS['br'] = brotli.decompress
+if zstandard is not None:
+    DECODERS['zstd'] = decode_zstd
+
+
+def accept_encoding():
+    """Returns the Accept-Encoding header value for the available codings"""
+    codings = ['gzip', 'deflate']
+    if 'br' in DECODERS:
+        codings.append('br')
+    if 'zstd' in DECODERS:
+        codings.append('zstd')
+    return ', '.join(codings)
+
+
+def parse_content_encoding(value):
+    """Returns the list of codings from a Content-Encoding header
+
+    The ``identity`` coding is left out.
+    """
+    return [coding.strip().lower() for coding in (value or '').split(',')
+            if coding.strip() and coding.strip().lower() != 'identity']
+
+
+def decode(data, codings):
+    """Decodes a body encoded with the given codings
+
+    Args:
+        data (bytes):
+            The body, as it was received
+        codings (list of str):
+            The codings, in the order they were applied
+
+    Raises:
+        ValueError: if a coding is not supported or the body is invalid
+    """
+    for coding in reversed(codings):
+        decoder = DECODERS.get(coding)
+        if decoder is None:
+            raise ValueError('Unsupported content coding: {}'.format(coding))
+        try:
+            data = decoder(data)
+        except Exception as e:
+            raise ValueError(
+                'Invalid {} encoded body: {}'.format(coding, e)) from e
+    return data
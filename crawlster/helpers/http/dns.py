@@ -0,0 +1,182 @@
+"""In-process DNS cache used by the connections of the RequestsHelper.
+
+The system resolver only gives the addresses of a host, not the TTL of the
+records, so the successful lookups are kept for a configured number of
+seconds and the failed ones for a (usually shorter) negative TTL. Concurrent
+lookups of the same host wait for a single call to ``getaddrinfo``.
+"""
+import collections
+import ipaddress
+import socket
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+
+def is_ip_address(host):
+    try:
+        ipaddress.ip_address(host.strip('[]'))
+    except ValueError:
+        return False
+    return True
+
+
+class DnsCache(object):
+    """Thread safe cache of the host addresses"""
+    STAT_HITS = 'http.dns.hits'
+    STAT_MISSES = 'http.dns.misses'
+    STAT_LATENCY = 'http.dns.latency'
+    STAT_HIT_RATE = 'http.dns.hit_rate'
+
+    #: The weight of the last lookup in the average latency
+    LATENCY_SMOOTHING = 0.2
+
+    def __init__(self, stats, ttl=300, negative_ttl=30, max_entries=10000,
+                 resolver=socket.getaddrinfo):
+        """Initializes the cache
+
+        Args:
+            stats (StatsHelper):
+                Where the hits, the misses and the lookup latency are
+                reported
+            ttl (float):
+                The number of seconds the addresses of a host are kept
+            negative_ttl (float):
+                The number of seconds a failed lookup is kept
+            max_entries (int):
+                The maximum number of hosts kept, the least recently used
+                ones are evicted first
+            resolver (callable):
+                The function that does the lookups, with the signature of
+                ``socket.getaddrinfo``
+        """
+        self.stats = stats
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.resolver = resolver
+        self.latency = None
+        self._entries = collections.OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        stats.gauge(self.STAT_HIT_RATE, self.hit_rate)
+
+    def hit_rate(self):
+        """Returns the fraction of the lookups served from the cache"""
+        with self._lock:
+            total = self._hits + self._misses
+            return self._hits / total if total else None
+
+    def resolve(self, host, port):
+        """Returns the addresses of a host, as returned by getaddrinfo
+
+        Raises:
+            socket.gaierror: if the host can not be resolved
+        """
+        key = (host, port)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._hits += 1
+                hit = True
+            else:
+                self._misses += 1
+                hit = False
+                event = self._pending.get(key)
+                owner = event is None
+                if owner:
+                    event = self._pending[key] = threading.Event()
+        self.stats.incr(self.STAT_HITS if hit else self.STAT_MISSES)
+        if not hit:
+            if owner:
+                try:
+                    entry = self._lookup(key)
+                finally:
+                    with self._lock:
+                        del self._pending[key]
+                    event.set()
+            else:
+                # another thread is resolving the same host
+                event.wait()
+                with self._lock:
+                    entry = self._entries.get(key)
+                if entry is None:
+                    entry = self._lookup(key)
+        result = entry[1]
+        if isinstance(result, Exception):
+            raise socket.gaierror(*result.args)
+        return result
+
+    def _lookup(self, key):
+        started = time.monotonic()
+        try:
+            result = self.resolver(key[0], key[1], 0, socket.SOCK_STREAM)
+            ttl = self.ttl
+        except socket.gaierror as e:
+            result = e
+            ttl = self.negative_ttl
+        now = time.monotonic()
+        entry = (now + ttl, result)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if self.latency is None:
+                self.latency = now - started
+            else:
+                self.latency += self.LATENCY_SMOOTHING * (
+                    now - started - self.latency)
+            latency = self.latency
+        self.stats.set(self.STAT_LATENCY, latency)
+        return entry
+
+    def is_cached(self, host, port):
+        with self._lock:
+            entry = self._entries.get((host, port))
+            return entry is not None and entry[0] > time.monotonic() or \
+                (host, port) in self._pending
+
+
+class DnsPrefetcher(object):
+    """Queue listener that resolves the hosts of the scheduled jobs
+
+    The lookups run in a small thread pool, so the addresses are usually
+    cached by the time a worker connects to the host.
+    """
+    DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+    def __init__(self, cache, workers=4):
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def job_added(self, job):
+        url = getattr(job, 'url', None)
+        if not url:
+            return
+        parts = urllib.parse.urlsplit(url)
+        try:
+            port = parts.port or self.DEFAULT_PORTS.get(parts.scheme)
+        except ValueError:
+            return
+        host = parts.hostname
+        if not host or not port or is_ip_address(host) or \
+                self.cache.is_cached(host, port):
+            return
+        self.executor.submit(self.prefetch, host, port)
+
+    def prefetch(self, host, port):
+        try:
+            self.cache.resolve(host, port)
+        except socket.gaierror:
+            pass
+
+    def job_done(self, job):
+        pass
+
+    def close(self):
+        self.executor.shutdown(wait=False)
@@ -1,29 +1,312 @@
+import functools
+import threading
+import time
+import urllib.parse
+
 import requests
 import requests.auth
 import requests.exceptions
+import urllib3.exceptions
 
+from crawlster.config import NumberOption, StringOption, BoolOption, \
+    ChoiceOption, ListOption
+from crawlster.exceptions import ConfigurationError
 from crawlster.helpers.base import BaseHelper
+from crawlster.helpers.http.adapter import (
+    PoolingAdapter, STAT_CONNECTIONS_NEW, STAT_CONNECTIONS_REUSED)
+from crawlster.helpers.http.aio import AsyncRequests, in_event_loop
+from crawlster.helpers.http import compression, transport
+from crawlster.helpers.http.cache import HttpCache
+from crawlster.helpers.http.dns import DnsCache, DnsPrefetcher
 from crawlster.helpers.http.request import (
     HttpRequest, GetRequest, PostRequest)
 from crawlster.helpers.http.response import HttpResponse
+from crawlster.helpers.http.retry import RetryPolicy, CircuitBreaker
+
+#: The errors raised for the requests that failed
+TRANSPORT_ERRORS = (requests.exceptions.RequestException,
+                    urllib3.exceptions.HTTPError) + transport.ERRORS
+
+
+class BodyReader(object):
+    """Joins the chunks of a response body as they are received, enforcing
+    a size limit"""
+
+    def __init__(self, limit, truncate, length=None):
+        """Initializes the reader
+
+        Args:
+            limit (int or None):
+                The maximum number of bytes of the body, None for no limit
+            truncate (bool):
+                Whether a larger body is truncated to the limit instead of
+                being dropped
+            length (int or None):
+                The size of the body declared by the response, if any
+        """
+        self.limit = limit
+        self.truncate = truncate
+        self.chunks = []
+        self.size = 0
+        self.truncated = False
+        self.aborted = limit is not None and not truncate and \
+            length is not None and length > limit
+
+    @property
+    def done(self):
+        """Whether the rest of the body is not needed"""
+        return self.aborted or self.truncated
+
+    def feed(self, chunk):
+        """Adds the next chunk of the body"""
+        self.size += len(chunk)
+        if self.limit is None or self.size <= self.limit:
+            self.chunks.append(chunk)
+        elif self.truncate:
+            self.chunks.append(chunk[:len(chunk) - (self.size - self.limit)])
+            self.truncated = True
+        else:
+            self.aborted = True
+            self.chunks = []
 
 
 class RequestsHelper(BaseHelper):
-    """Helper for making HTTP requests using the requests library"""
+    """Helper for making HTTP requests using the requests library
+
+    Configuration options:
+
+    - ``http.max_in_flight`` - the maximum number of requests in flight
+      through the async interface. Defaults to 100.
+    - ``http.cache_path`` - the SQLite database of the HTTP cache. The cache
+      is disabled if not provided.
+    - ``http.cache_default_ttl`` - the number of seconds the cached responses
+      without freshness information are served without revalidation.
+      Defaults to 0.
+    - ``http.pool_maxsize`` - the number of connections kept alive per host.
+      Defaults to the maximum number of threads that can make requests at
+      once.
+    - ``http.pool_connections`` - the number of hosts whose connections are
+      kept alive. Defaults to the same value as ``http.pool_maxsize``.
+    - ``http.session_per_thread`` - whether each thread uses its own session
+      (and its own connections and cookies) instead of sharing one. Defaults
+      to ``False``.
+    - ``http.max_body_size`` - the maximum number of bytes read from a
+      response body. Defaults to None (no limit).
+    - ``http.body_limit_action`` - what happens to a body over the limit:
+      ``'abort'`` (default) drops the response, ``'truncate'`` keeps the
+      first ``http.max_body_size`` bytes and marks the response as
+      truncated.
+    - ``http.chunk_size`` - the size of the chunks the bodies are read in
+      when a limit is set. Defaults to 65536.
+    - ``http.lazy_decode`` - whether the compressed bodies are decompressed
+      only when they are accessed. Defaults to ``True``.
+    - ``http.retries`` - the number of times a request is retried after a
+      connection error or a response with a status from
+      ``http.retry_statuses``. Defaults to 0.
+    - ``http.retry_backoff`` - the delay before the first retry, in seconds.
+      It doubles with each retry. Defaults to 0.5.
+    - ``http.retry_max_delay`` - the maximum delay before a retry, in
+      seconds, including the one requested by ``Retry-After``. Defaults
+      to 30.
+    - ``http.retry_statuses`` - the status codes that are retried. Defaults
+      to 429, 500, 502, 503 and 504.
+    - ``http.breaker_threshold`` - the number of consecutive failures after
+      which the requests to a host are rejected for a while. Defaults to 0
+      (disabled).
+    - ``http.breaker_cooldown`` - the number of seconds the requests to a
+      failing host are rejected for. Defaults to 30.
+    - ``http.transport`` - ``'requests'`` (default) or ``'httpx'``, which
+      multiplexes the requests over shared HTTP/2 connections (see
+      :py:mod:`crawlster.helpers.http.transport`). The ``'httpx'``
+      transport does its own DNS lookups, without the DNS cache, and does
+      not report the ``http.connections.*`` stats.
+    - ``http.http2_prior_knowledge`` - with the ``'httpx'`` transport, use
+      HTTP/2 for plain ``http://`` urls too. Defaults to ``False``.
+    - ``http.dns_ttl`` - the number of seconds the addresses of a host are
+      cached for. 0 disables the DNS cache. Defaults to 300. Ignored by the
+      ``'httpx'`` transport.
+    - ``http.dns_negative_ttl`` - the number of seconds a failed lookup is
+      cached for. Defaults to 30.
+    - ``http.dns_cache_size`` - the maximum number of hosts in the DNS
+      cache. Defaults to 10000.
+    - ``http.dns_prefetch`` - whether the hosts are resolved in the
+      background as soon as jobs are scheduled for them. Defaults to
+      ``False``. Can not be used with the ``'httpx'`` transport.
+    """
     name = 'http'
+    config_options = {
+        'http.max_in_flight': NumberOption(default=100),
+        'http.cache_path': StringOption(default=None),
+        'http.cache_default_ttl': NumberOption(default=0),
+        'http.pool_maxsize': NumberOption(default=None),
+        'http.pool_connections': NumberOption(default=None),
+        'http.session_per_thread': BoolOption(default=False),
+        'http.max_body_size': NumberOption(default=None),
+        'http.body_limit_action': ChoiceOption(('abort', 'truncate'),
+                                               default='abort'),
+        'http.chunk_size': NumberOption(default=65536),
+        'http.lazy_decode': BoolOption(default=True),
+        'http.retries': NumberOption(default=0),
+        'http.retry_backoff': NumberOption(default=0.5),
+        'http.retry_max_delay': NumberOption(default=30),
+        'http.retry_statuses': ListOption(
+            default=lambda: [429, 500, 502, 503, 504]),
+        'http.breaker_threshold': NumberOption(default=0),
+        'http.breaker_cooldown': NumberOption(default=30),
+        'http.transport': ChoiceOption(('requests', 'httpx'),
+                                       default='requests'),
+        'http.http2_prior_knowledge': BoolOption(default=False),
+        'http.dns_ttl': NumberOption(default=300),
+        'http.dns_negative_ttl': NumberOption(default=30),
+        'http.dns_cache_size': NumberOption(default=10000),
+        'http.dns_prefetch': BoolOption(default=False)
+    }
 
+    #: The bytes received, before decompression
     STAT_DOWNLOAD = 'http.download'
+    #: The bytes of the decompressed bodies
+    STAT_DOWNLOAD_DECODED = 'http.download.decoded'
     STAT_UPLOAD = 'http.upload'
     STAT_REQUESTS = 'http.requests'
     STAT_HTTP_ERRORS = 'http.errors'
+    STAT_LATENCY = 'http.latency'
+    STAT_CACHE_HITS = 'http.cache.hits'
+    STAT_CACHE_MISSES = 'http.cache.misses'
+    STAT_CACHE_REVALIDATED = 'http.cache.revalidated'
+    STAT_CACHE_BYTES_SAVED = 'http.cache.bytes_saved'
+    STAT_CONNECTIONS_NEW = STAT_CONNECTIONS_NEW
+    STAT_CONNECTIONS_REUSED = STAT_CONNECTIONS_REUSED
+    STAT_TRUNCATED = 'http.truncated'
+    STAT_RETRIES = 'http.retries'
+    STAT_BREAKER_TRIPS = 'http.breaker.trips'
+    STAT_BREAKER_REJECTED = 'http.breaker.rejected'
+    STAT_ABORTED = 'http.aborted'
+
+    ABORT = 'abort'
+    TRUNCATE = 'truncate'
+
+    #: The weight of the last measurement in the average latency
+    LATENCY_SMOOTHING = 0.2
 
     def __init__(self):
         super(RequestsHelper, self).__init__()
         self.session = None
+        self.aio = None
+        self.cache = None
+        self.session_per_thread = False
+        self.max_body_size = None
+        self.lazy_decode = True
+        self.parser = None
+        self.retry_policy = RetryPolicy(0, 0, 0, [])
+        self.breaker = CircuitBreaker(0, 0)
+        self.transport = None
+        self.dns_cache = None
+        self.dns_prefetcher = None
+        self._local = threading.local()
+        self._sessions = []
+        self._sessions_lock = threading.Lock()
+        #: The moving average of the request latency in seconds
+        self.latency = None
+        self._latency_lock = threading.Lock()
 
     def initialize(self):
         """Initializes the session used for making requests"""
-        self.session = requests.session()
+        self.session_per_thread = self.config.get('http.session_per_thread')
+        self.max_body_size = self.config.get('http.max_body_size')
+        self.lazy_decode = self.config.get('http.lazy_decode')
+        # the responses are parsed as configured for the extract helper
+        extract = getattr(self.crawler, 'extract', None)
+        self.parser = getattr(extract, 'parser', None)
+        self.retry_policy = RetryPolicy(
+            self.config.get('http.retries'),
+            self.config.get('http.retry_backoff'),
+            self.config.get('http.retry_max_delay'),
+            self.config.get('http.retry_statuses'))
+        self.breaker = CircuitBreaker(
+            self.config.get('http.breaker_threshold'),
+            self.config.get('http.breaker_cooldown'))
+        if self.config.get('http.transport') == 'httpx':
+            if self.config.get('http.dns_prefetch'):
+                raise ConfigurationError(
+                    'http.dns_prefetch can not be used with the httpx '
+                    'transport, which does its own DNS lookups')
+            self.transport = transport.HttpxTransport(
+                self.get_pool_size(),
+                {'Accept-Encoding': compression.accept_encoding()},
+                self.config.get('http.http2_prior_knowledge'))
+        elif self.config.get('http.dns_ttl'):
+            self.dns_cache = DnsCache(
+                self.crawler.stats, self.config.get('http.dns_ttl'),
+                self.config.get('http.dns_negative_ttl'),
+                self.config.get('http.dns_cache_size'))
+            if self.config.get('http.dns_prefetch'):
+                self.dns_prefetcher = DnsPrefetcher(self.dns_cache)
+                self.crawler.queue.add_listener(self.dns_prefetcher)
+        if not self.session_per_thread:
+            self.session = self.create_session()
+        self.aio = AsyncRequests(self, self.config.get('http.max_in_flight'))
+        cache_path = self.config.get('http.cache_path')
+        if cache_path:
+            self.cache = HttpCache(cache_path,
+                                   self.config.get('http.cache_default_ttl'))
+
+    def finalize(self):
+        """Releases the resources used by the async interface and the cache"""
+        if self.aio:
+            self.aio.close()
+        if self.cache:
+            self.cache.close()
+            self.cache = None
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+        if self.dns_prefetcher:
+            self.crawler.queue.remove_listener(self.dns_prefetcher)
+            self.dns_prefetcher.close()
+            self.dns_prefetcher = None
+        with self._sessions_lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
+
+    def get_pool_size(self):
+        """Returns the number of connections kept alive per host
+
+        By default, it is the maximum number of threads that can make
+        requests at the same time, so no connection is discarded after use.
+        """
+        size = self.config.get('http.pool_maxsize')
+        if size:
+            return size
+        if self.config.get('core.engine') == 'asyncio':
+            return self.config.get('http.max_in_flight')
+        if self.config.get('core.autoscale'):
+            return self.config.get('core.max_workers')
+        return self.config.get('core.workers')
+
+    def create_session(self):
+        """Creates a session whose connection pools are sized by the config"""
+        pool_maxsize = self.get_pool_size()
+        pool_connections = self.config.get('http.pool_connections') or \
+            pool_maxsize
+        adapter = PoolingAdapter(self.crawler.stats, pool_connections,
+                                 pool_maxsize, self.dns_cache)
+        session = requests.session()
+        session.headers['Accept-Encoding'] = compression.accept_encoding()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        with self._sessions_lock:
+            self._sessions.append(session)
+        return session
+
+    def get_session(self):
+        """Returns the session used by the current thread"""
+        if not self.session_per_thread:
+            return self.session
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self.create_session()
+        return session
 
     def open(self, http_request: HttpRequest):
         """Opens a given HTTP request.
@@ -35,26 +318,304 @@ class RequestsHelper(BaseHelper):
 
         Returns:
             crawlster.helpers.http.response.HttpResponse
+
+        Raises:
+            RuntimeError: if called from a running event loop, which it would
+                block. Coroutine steps use :py:attr:`aio` instead.
+        """
+        if in_event_loop():
+            raise RuntimeError(
+                'Blocking request to {} made from the event loop, use '
+                'self.http.aio instead'.format(http_request.url))
+        cache_key, cached = self.lookup_cache(http_request)
+        if cached and cached.is_fresh():
+            return self.cache_hit(http_request, cached)
+        headers = http_request.headers
+        if cached:
+            headers = dict(headers, **cached.validators())
+
+        host = urllib.parse.urlsplit(http_request.url).netloc.lower()
+        if not self.allow_host(http_request, host):
+            return None
+        try:
+            resp, body, truncated = self.fetch_with_retries(
+                http_request, headers, host)
+            return self.handle_response(http_request, resp, body, truncated,
+                                        cache_key, cached)
+        except TRANSPORT_ERRORS + (ValueError,) as e:
+            self.record_error(e)
+
+    def lookup_cache(self, http_request):
+        """Looks up the cached response of a request
+
+        Returns:
+            A tuple of (cache key, cache entry). Both are None if the request
+            is not cacheable, the entry is None if it was not cached yet.
+        """
+        cache_key = self.cache.get_key(http_request) if self.cache else None
+        cached = self.cache.get(cache_key) if cache_key else None
+        return cache_key, cached
+
+    def allow_host(self, http_request, host):
+        """Returns whether a request can be sent to its host, which is not
+        the case while the circuit of the host is open"""
+        if self.breaker.allow(host):
+            return True
+        self.crawler.stats.incr(self.STAT_BREAKER_REJECTED)
+        self.crawler.log.warning(
+            'Skipped {}: too many failures for {}'.format(
+                http_request.url, host))
+        return False
+
+    def handle_response(self, http_request, resp, body, truncated, cache_key,
+                        cached):
+        """Builds the response for a request that was sent, serving the
+        cached entry if it was revalidated and caching the new response
+
+        Args:
+            http_request (HttpRequest):
+                The request that was sent
+            resp:
+                The response of the transport, whose body was read
+            body (bytes or None):
+                The body read by :py:meth:`read_body`
+            truncated (bool):
+                Whether the body was truncated
+            cache_key (str or None):
+                The cache key of the request
+            cached (CacheEntry or None):
+                The cache entry that was revalidated
+
+        Returns:
+            crawlster.helpers.http.response.HttpResponse or None if the
+            download was aborted
+        """
+        if cached and resp.status_code == 304:
+            self.crawler.stats.incr(self.STAT_CACHE_REVALIDATED)
+            cached = self.cache.refresh(cache_key, cached, {
+                key: value for key, value in resp.headers.items()
+                if key.lower() != 'content-length'})
+            return self.cache_hit(http_request, cached)
+        if body is None:
+            return None
+        http_resp = self.make_response(http_request, resp.status_code,
+                                       resp.headers, body, truncated)
+        self.crawler.stats.incr(self.STAT_DOWNLOAD,
+                                by=self._compute_resp_size(http_resp))
+        if cache_key and not truncated:
+            self.crawler.stats.incr(self.STAT_CACHE_MISSES)
+            self.cache.store(cache_key, resp.status_code, resp.headers,
+                             http_resp.wire_body)
+        return http_resp
+
+    def record_error(self, error):
+        """Records a request that failed"""
+        self.crawler.stats.add(self.STAT_HTTP_ERRORS, error)
+        self.crawler.log.error(str(error))
+
+    def fetch_with_retries(self, http_request, headers, host):
+        """Sends a request, retrying it according to the retry policy
+
+        The connection errors and the responses with a status code from
+        ``http.retry_statuses`` are retried, as long as the circuit of the
+        host is not open. The last response is returned even if its status
+        code is retryable.
+
+        Returns:
+            A tuple of (response, body, truncated), see :py:meth:`fetch`
+
+        Raises:
+            The error of the last attempt, if it failed
+        """
+        attempt = 0
+        while True:
+            error = None
+            try:
+                resp, body, truncated = self.fetch(http_request, headers)
+                if not self.retry_policy.is_retryable(resp.status_code):
+                    self.breaker.record_success(host)
+                    return resp, body, truncated
+            except TRANSPORT_ERRORS as e:
+                resp, error = None, e
+            delay = self.get_retry_delay(http_request, host, attempt, resp)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return resp, body, truncated
+            time.sleep(delay)
+            attempt += 1
+
+    def get_retry_delay(self, http_request, host, attempt, resp):
+        """Records a failed attempt and returns the delay before the next one
+
+        Args:
+            http_request (HttpRequest):
+                The request that failed
+            host (str):
+                The host of the request
+            attempt (int):
+                The number of the attempt that failed, starting at 0
+            resp:
+                The response with a retryable status, or None if the request
+                failed
+
+        Returns:
+            The number of seconds to wait before retrying, or None if the
+            request is not retried
+        """
+        if self.breaker.record_failure(host):
+            self.crawler.stats.incr(self.STAT_BREAKER_TRIPS)
+            self.crawler.log.warning(
+                'Too many failures for {}, pausing its requests for {} '
+                'seconds'.format(host, self.breaker.cooldown))
+        if attempt >= self.retry_policy.retries or \
+                self.breaker.get_state(host) == CircuitBreaker.OPEN:
+            return None
+        retry_after = resp.headers.get('Retry-After') \
+            if resp is not None else None
+        delay = self.retry_policy.get_delay(attempt, retry_after)
+        self.crawler.stats.incr(self.STAT_RETRIES)
+        self.crawler.log.debug('Retrying {} in {:.2f} seconds'.format(
+            http_request.url, delay))
+        return delay
+
+    def fetch(self, http_request, headers):
+        """Sends a request and reads the body of the response
+
+        Returns:
+            A tuple of (response, body, truncated), see :py:meth:`read_body`
         """
         self.crawler.stats.incr(self.STAT_REQUESTS)
+        self.crawler.stats.incr(self.STAT_UPLOAD,
+                                by=self._compute_req_size(http_request))
+        started = time.monotonic()
+        if self.transport is not None:
+            with self.transport.stream(http_request, headers) as resp:
+                self.record_latency(time.monotonic() - started)
+                chunks = resp.iter_raw(self.config.get('http.chunk_size'))
+                body, truncated = self.read_chunks(chunks, resp.headers,
+                                                   str(resp.url))
+            return resp, body, truncated
+        resp = self.get_session().request(
+            http_request.method, http_request.url,
+            http_request.query_params,
+            http_request.data, headers, stream=True
+        )
+        self.record_latency(time.monotonic() - started)
+        body, truncated = self.read_body(resp)
+        return resp, body, truncated
 
+    def make_response(self, http_request, status_code, headers, body,
+                      truncated=False):
+        """Builds a response from a body that is not decompressed yet
+
+        The decompressed size is recorded when the body is decompressed,
+        which happens when it is first accessed if ``http.lazy_decode`` is
+        enabled.
+        """
+        content_encoding = headers.get('Content-Encoding')
+        if not compression.parse_content_encoding(content_encoding):
+            self.crawler.stats.incr(self.STAT_DOWNLOAD_DECODED,
+                                    by=len(body))
+            return HttpResponse(http_request, status_code, headers, body,
+                                truncated=truncated, parser=self.parser)
+        http_resp = HttpResponse(
+            http_request, status_code, headers, body, truncated=truncated,
+            content_encoding=content_encoding, parser=self.parser,
+            on_decode=functools.partial(self.crawler.stats.incr,
+                                        self.STAT_DOWNLOAD_DECODED))
+        if not self.lazy_decode:
+            # decompresses the body now
+            http_resp.body
+        return http_resp
+
+    def read_body(self, resp):
+        """Reads the body of a response as it was sent, without decompressing
+        it, enforcing http.max_body_size on the received bytes
+
+        Returns:
+            A tuple of (body, truncated). The body is None if the download
+            was aborted because the body is too large.
+        """
+        try:
+            if self.max_body_size is None:
+                return resp.raw.read(decode_content=False), False
+            chunks = resp.raw.stream(self.config.get('http.chunk_size'),
+                                     decode_content=False)
+            return self.read_chunks(chunks, resp.headers, resp.url)
+        finally:
+            resp.close()
+
+    def read_chunks(self, chunks, headers, url):
+        """Joins the chunks of a body, enforcing http.max_body_size
+
+        Args:
+            chunks (iterable of bytes):
+                The body, as it is received
+            headers (dict):
+                The headers of the response
+            url (str):
+                The url of the response
+
+        Returns:
+            A tuple of (body, truncated), see :py:meth:`read_body`
+        """
+        reader = self.body_reader(headers)
+        if not reader.done:
+            for chunk in chunks:
+                reader.feed(chunk)
+                if reader.done:
+                    break
+        return self.finish_body(reader, url)
+
+    def body_reader(self, headers):
+        """Returns the reader that enforces http.max_body_size on the body of
+        a response with the given headers"""
         try:
-            resp = self.session.request(
-                http_request.method, http_request.url,
-                http_request.query_params,
-                http_request.data, http_request.headers
-            )
-            http_resp = HttpResponse(
-                http_request, resp.status_code, resp.headers, resp.content
-            )
-            self.crawler.stats.incr(self.STAT_DOWNLOAD,
-                                    by=self._compute_resp_size(http_resp))
-            self.crawler.stats.incr(self.STAT_UPLOAD,
-                                    by=self._compute_req_size(http_request))
-            return http_resp
-        except requests.exceptions.RequestException as e:
-            self.crawler.stats.add(self.STAT_HTTP_ERRORS, e)
-            self.crawler.log.error(str(e))
+            length = int(headers.get('Content-Length'))
+        except (TypeError, ValueError):
+            length = None
+        truncate = self.config.get('http.body_limit_action') == self.TRUNCATE
+        return BodyReader(self.max_body_size, truncate, length)
+
+    def finish_body(self, reader, url):
+        """Returns the (body, truncated) tuple of a body that was read, see
+        :py:meth:`read_body`"""
+        if reader.aborted:
+            return self._abort_body(url, reader.limit)
+        if reader.truncated:
+            self.crawler.stats.incr(self.STAT_TRUNCATED)
+            self.crawler.log.warning('Truncated the body of {} to {} '
+                                     'bytes'.format(url, reader.limit))
+        return b''.join(reader.chunks), reader.truncated
+
+    def _abort_body(self, url, limit):
+        self.crawler.stats.incr(self.STAT_ABORTED)
+        self.crawler.log.warning(
+            'Aborted the download of {}: the body is larger than {} '
+            'bytes'.format(url, limit))
+        return None, False
+
+    def cache_hit(self, http_request, entry):
+        """Builds the response for a request served from the cache"""
+        self.crawler.stats.incr(self.STAT_CACHE_HITS)
+        self.crawler.stats.incr(self.STAT_CACHE_BYTES_SAVED,
+                                by=len(entry.body))
+        return HttpResponse(
+            http_request, entry.status_code, entry.headers, entry.body,
+            content_encoding=entry.headers.get('Content-Encoding'),
+            parser=self.parser)
+
+    def record_latency(self, seconds):
+        """Updates the moving average of the request latency"""
+        with self._latency_lock:
+            if self.latency is None:
+                self.latency = seconds
+            else:
+                self.latency += self.LATENCY_SMOOTHING * (
+                    seconds - self.latency)
+            latency = self.latency
+        self.crawler.stats.set(self.STAT_LATENCY, latency)
 
     def get(self, url, query_params=None, headers=None):
         """Makes a GET request"""
@@ -82,7 +643,7 @@ class RequestsHelper(BaseHelper):
             HttpRequest(url, 'OPTIONS', query_params, None, headers))
 
     def _compute_resp_size(self, response):
-        return len(response.body)
+        return response.wire_size
 
     def _compute_req_size(self, request):
         return len(request.data or '')
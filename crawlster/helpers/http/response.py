@@ -1,10 +1,23 @@
+from crawlster.helpers import charset, jsonlib
 from crawlster.helpers.extract import Content
+from crawlster.helpers.http import compression
+
+
+def to_bytes(body):
+    """Returns the body as bytes, encoding it if it is a str"""
+    if isinstance(body, str):
+        body = body.encode()
+    if not isinstance(body, bytes):
+        raise TypeError(
+            'body must be in bytes, not {}'.format(type(body).__name__))
+    return body
 
 
 class HttpResponse(object):
     """Class representing a http response"""
 
-    def __init__(self, request, status_code, headers, body):
+    def __init__(self, request, status_code, headers, body, truncated=False,
+                 content_encoding=None, on_decode=None, parser=None):
         """Initializes the http response object
 
         Args:
@@ -16,30 +29,152 @@ class HttpResponse(object):
                 The response headers
             body (bytes or None):
                 The body of the response, if any
+            truncated (bool):
+                Whether the body was cut because it exceeded
+                ``http.max_body_size``
+            content_encoding (str or None):
+                The Content-Encoding of the body, if it was not decoded yet.
+                The body is then decoded the first time it is accessed.
+            on_decode (callable or None):
+                Called with the size of the decoded body after decoding it.
+                It is not kept when the response is pickled.
+            parser (str or None):
+                The parser backend used by :py:attr:`extract`
         """
         self.request = request
         self.status_code = status_code
         self.headers = headers
-        if isinstance(body, str):
-            body = body.encode()
-        if not isinstance(body, bytes):
-            raise TypeError(
-                'body must be in bytes, not {}'.format(type(body).__name__))
-        self.body = body
+        body = to_bytes(body)
+        self.wire_body = body
+        self.truncated = truncated
+        self.codings = compression.parse_content_encoding(content_encoding)
+        self.on_decode = on_decode
+        self.parser = parser
+        self._content = None
+        self._encoding = None
+        self._text = None
+        self._body = None if self.codings else body
+
+    def __getstate__(self):
+        # the callback usually belongs to a helper of the crawler, the
+        # responses decoded after being unpickled are not reported
+        state = self.__dict__.copy()
+        state['on_decode'] = None
+        return state
+
+    @property
+    def body(self):
+        """The decoded body of the response
+
+        Compressed bodies are decompressed on the first access. Raises
+        ValueError if the content coding is not supported or the body is
+        invalid.
+        """
+        if self._body is None:
+            self._body = compression.decode(self.wire_body, self.codings)
+            if self.on_decode:
+                self.on_decode(len(self._body))
+        return self._body
+
+    @body.setter
+    def body(self, body):
+        """Replaces the body with already decoded bytes
+
+        The cached text and parsed document are reset.
+        """
+        body = to_bytes(body)
+        self.wire_body = body
+        self.codings = []
+        self._body = body
+        self._content = None
+        self._encoding = None
+        self._text = None
+
+    def is_decoded(self):
+        """Returns whether the body was already decompressed"""
+        return self._body is not None
+
+    @property
+    def wire_size(self):
+        """The size of the body as it was received"""
+        return len(self.wire_body)
+
+    @property
+    def encoding(self):
+        """The character encoding of the body
+
+        Taken from the Content-Type header, from a ``<meta>`` tag or guessed
+        from the body (see :py:mod:`crawlster.helpers.charset`).
+        """
+        if self._encoding is None:
+            self._encoding = charset.detect_encoding(self.body,
+                                                     self.content_type)
+        return self._encoding
+
+    @property
+    def text(self):
+        """The body decoded with its :py:attr:`encoding`
+
+        Decoded on the first access. The invalid bytes are replaced with
+        U+FFFD.
+        """
+        if self._text is None:
+            self._text = charset.decode(self.body, self.encoding)
+        return self._text
 
     @property
     def body_str(self):
-        """Returns the decoded content of the request, if possible.
+        """Returns the decoded content of the request.
+
+        Same as :py:attr:`text`.
+        """
+        return self.text
+
+    def json(self, backend=jsonlib.AUTO):
+        """Parses the body as JSON
 
-        May raise UnicodeDecodeError if the body does not represent a valid
-        unicode encoded sequence.
+        See :py:meth:`json_document` for what is parsed.
+
+        Args:
+            backend (str):
+                The JSON backend (``json``, ``orjson`` or ``simdjson``).
+                Defaults to the fastest one installed.
+
+        Raises:
+            ValueError: if the body is not valid JSON
         """
-        return self.body.decode()
+        return jsonlib.loads(self.json_document(), backend)
+
+    def json_document(self):
+        """Returns the body as it must be given to the JSON parsers
+
+        The body is given as bytes, without being decoded first, when it
+        declares no encoding or UTF-8. Otherwise its :py:attr:`text` is
+        given.
+        """
+        declared = charset.get_header_encoding(self.content_type)
+        if declared not in (None, 'utf-8'):
+            return self.text
+        return self.body
 
     @property
     def body_bytes(self):
         return self.body
 
+    @property
+    def body_view(self):
+        """Returns a memoryview of the body, for reading it without copies"""
+        return memoryview(self.body)
+
+    def iter_chunks(self, size=65536):
+        """Iterates over the body in memoryview chunks of at most size bytes
+
+        The chunks share the memory of the body, no data is copied.
+        """
+        view = self.body_view
+        for start in range(0, len(view), size):
+            yield view[start:start + size]
+
     @property
     def server(self):
         """Returns the server header if available"""
@@ -55,4 +190,12 @@ class HttpResponse(object):
 
     @property
     def extract(self):
-        return Content(self.body_str)
+        """The body as a :py:class:`Content`
+
+        The body is parsed once, the first time it is needed, and the parsed
+        document is kept as long as the response. The parsers that can
+        decode the body are given the bytes, without decoding them first.
+        """
+        if self._content is None:
+            self._content = Content(self.body, self.parser, self.encoding)
+        return self._content
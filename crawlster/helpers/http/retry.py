@@ -0,0 +1,150 @@
+"""Retry policy and per host circuit breaker used by the RequestsHelper"""
+import random
+import threading
+import time
+
+from crawlster.helpers.http.cache import parse_http_date
+
+
+class RetryPolicy(object):
+    """Decides if and when a failed request is retried
+
+    The delay before the retry number ``n`` (starting from 0) is
+    ``backoff * 2 ** n`` seconds, capped at ``max_delay``, of which a random
+    fraction of at most ``jitter`` is removed, so the workers that failed at
+    the same time do not retry at the same time. A ``Retry-After`` header
+    takes precedence over the computed delay.
+    """
+
+    def __init__(self, retries, backoff, max_delay, statuses, jitter=0.5):
+        """Initializes the policy
+
+        Args:
+            retries (int):
+                The maximum number of retries of a request
+            backoff (float):
+                The delay before the first retry, in seconds
+            max_delay (float):
+                The maximum delay before a retry, in seconds
+            statuses (list of int):
+                The response status codes that are retried
+            jitter (float):
+                The maximum fraction of the delay that is randomly removed
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.statuses = frozenset(statuses)
+        self.jitter = jitter
+
+    def is_retryable(self, status_code):
+        return status_code in self.statuses
+
+    def get_delay(self, attempt, retry_after=None):
+        """Returns the number of seconds to wait before a retry
+
+        Args:
+            attempt (int):
+                The number of retries already made
+            retry_after (str or None):
+                The Retry-After header of the failed response, if any
+        """
+        delay = self.parse_retry_after(retry_after)
+        if delay is None:
+            delay = self.backoff * 2 ** attempt
+            delay *= 1 - random.uniform(0, self.jitter)
+        return min(delay, self.max_delay)
+
+    @staticmethod
+    def parse_retry_after(value):
+        """Returns the number of seconds from a Retry-After header"""
+        if not value:
+            return None
+        try:
+            return max(float(value), 0)
+        except ValueError:
+            pass
+        moment = parse_http_date(value)
+        if moment is None:
+            return None
+        return max(moment - time.time(), 0)
+
+
+class CircuitBreaker(object):
+    """Per host circuit breaker
+
+    After ``threshold`` consecutive failures, the requests to the host are
+    rejected without being sent for ``cooldown`` seconds. Then a single trial
+    request is let through: if it succeeds the host is available again,
+    otherwise the requests are rejected for another cool-down period.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, threshold, cooldown):
+        """Initializes the breaker
+
+        Args:
+            threshold (int):
+                The number of consecutive failures that open the circuit.
+                0 disables the breaker.
+            cooldown (float):
+                The number of seconds the requests are rejected for
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = {}
+        self._opened = {}
+        self._trials = set()
+        self._lock = threading.Lock()
+
+    def get_state(self, host):
+        with self._lock:
+            return self._get_state(host, time.monotonic())
+
+    def _get_state(self, host, now):
+        opened = self._opened.get(host)
+        if opened is None:
+            return self.CLOSED
+        if host in self._trials or now - opened < self.cooldown:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow(self, host):
+        """Returns whether a request to the host can be sent"""
+        if not self.threshold:
+            return True
+        with self._lock:
+            state = self._get_state(host, time.monotonic())
+            if state == self.HALF_OPEN:
+                self._trials.add(host)
+                return True
+            return state == self.CLOSED
+
+    def record_success(self, host):
+        if not self.threshold:
+            return
+        with self._lock:
+            self._failures.pop(host, None)
+            self._opened.pop(host, None)
+            self._trials.discard(host)
+
+    def record_failure(self, host):
+        """Records a failed request
+
+        Returns:
+            True if the failure opened the circuit
+        """
+        if not self.threshold:
+            return False
+        with self._lock:
+            failures = self._failures.get(host, 0) + 1
+            self._failures[host] = failures
+            if host in self._trials:
+                # the trial request failed
+                self._trials.discard(host)
+            elif host in self._opened or failures < self.threshold:
+                return False
+            self._opened[host] = time.monotonic()
+            return True
@@ -0,0 +1,96 @@
+"""HTTP/2 transport for the :py:class:`RequestsHelper`, based on httpx.
+
+The requests of all the workers go through a single ``httpx.Client``, which
+multiplexes the concurrent requests to the same host over a shared HTTP/2
+connection instead of opening one connection per request in flight. The
+requests of the async interface (``self.http.aio``) go through an
+``httpx.AsyncClient`` whenever httpx is installed.
+
+httpx manages its own connections and DNS lookups, so with this transport
+the DNS cache of the helper is not used (``http.dns_ttl`` is ignored and
+``http.dns_prefetch`` raises a ConfigurationError) and the
+``http.connections.*`` stats are not reported.
+
+Requires the ``httpx`` package with HTTP/2 support::
+
+    pip install httpx[http2]
+"""
+from crawlster.exceptions import ConfigurationError
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+#: The errors raised by the transport for failed requests
+if httpx is not None:
+    ERRORS = (httpx.HTTPError, httpx.InvalidURL)
+else:
+    ERRORS = ()
+
+
+class HttpxTransport(object):
+    """Sends the requests through a shared HTTP/2 capable httpx client"""
+
+    #: The name of the httpx client class
+    client_class = 'Client'
+
+    def __init__(self, max_connections, headers=None, prior_knowledge=False,
+                 http2=True):
+        """Initializes the transport
+
+        Args:
+            max_connections (int):
+                The maximum number of connections kept alive
+            headers (dict or None):
+                The headers sent with all the requests
+            prior_knowledge (bool):
+                Whether the servers are known to support HTTP/2, in which
+                case plain ``http://`` urls are also requested over HTTP/2
+                (without the HTTP/1.1 upgrade)
+            http2 (bool):
+                Whether HTTP/2 is used at all, which requires the h2 package
+        """
+        if httpx is None:
+            raise ConfigurationError(
+                'The httpx transport requires the httpx package: '
+                'pip install httpx[http2]')
+        limits = httpx.Limits(max_connections=max_connections,
+                              max_keepalive_connections=max_connections)
+        try:
+            self.client = getattr(httpx, self.client_class)(
+                http1=not (http2 and prior_knowledge), http2=http2,
+                limits=limits, headers=headers, follow_redirects=True)
+        except ImportError:
+            raise ConfigurationError(
+                'HTTP/2 support requires the h2 package: '
+                'pip install httpx[http2]')
+
+    def stream(self, http_request, headers):
+        """Sends a request
+
+        Returns:
+            A context manager that returns the ``httpx.Response`` whose body
+            was not read yet (an async one for the async transport)
+        """
+        data = http_request.data
+        content = None
+        if isinstance(data, (str, bytes)):
+            content, data = data, None
+        return self.client.stream(
+            http_request.method, http_request.url,
+            params=http_request.query_params or None, content=content,
+            data=data, headers=headers)
+
+    def close(self):
+        self.client.close()
+
+
+class AsyncHttpxTransport(HttpxTransport):
+    """Sends the requests of the async interface through an
+    ``httpx.AsyncClient``, on the event loop the transport was created on"""
+
+    client_class = 'AsyncClient'
+
+    async def close(self):
+        await self.client.aclose()
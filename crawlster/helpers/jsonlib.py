@@ -0,0 +1,124 @@
+"""JSON backends.
+
+The fastest installed backend is used by default: ``orjson``, then
+``simdjson`` (the ``pysimdjson`` package), then the standard library. The
+``simdjson`` backend can not encode documents.
+
+The ``simdjson`` backend can also parse a document lazily (see
+:py:func:`parse_lazy`), so that only the values actually read are converted
+to Python objects.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+
+def loads_json(data):
+    if isinstance(data, bytes):
+        # json.loads() only reads bytes on Python 3.6+, JSON documents are
+        # UTF-8, sometimes with a BOM
+        data = data.decode('utf-8-sig')
+    return json.loads(data)
+
+
+def loads_simdjson(data):
+    if isinstance(data, str):
+        data = data.encode()
+    # the parsers can not be shared between threads, they are cheap to create
+    return simdjson.Parser().parse(data, True)
+
+
+#: The available backends, by name
+LOADERS = {'json': loads_json}
+if simdjson is not None:
+    LOADERS['simdjson'] = loads_simdjson
+if orjson is not None:
+    LOADERS['orjson'] = orjson.loads
+
+#: The backends, from the fastest to the slowest
+PREFERENCE = ('orjson', 'simdjson', 'json')
+
+AUTO = 'auto'
+
+
+def get_backend(name=AUTO):
+    """Returns the name of a backend, resolving ``auto`` to the fastest one
+
+    Raises:
+        ValueError: if the backend is not installed
+    """
+    if name == AUTO:
+        return next(name for name in PREFERENCE if name in LOADERS)
+    if name not in LOADERS:
+        raise ValueError('The {} JSON backend is not installed'.format(name))
+    return name
+
+
+def loads(data, backend=AUTO):
+    """Parses a JSON document
+
+    Args:
+        data (bytes or str):
+            The document. The bytes are parsed without being decoded first.
+        backend (str):
+            The backend name or ``auto`` for the fastest one
+
+    Raises:
+        ValueError: if the document is not valid JSON
+    """
+    return LOADERS[get_backend(backend)](data)
+
+
+def dumps_json(obj):
+    return json.dumps(obj).encode()
+
+
+def dumps_orjson(obj):
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+
+#: The available encoders, by name. They return UTF-8 encoded bytes.
+DUMPERS = {'json': dumps_json}
+if orjson is not None:
+    DUMPERS['orjson'] = dumps_orjson
+
+
+def get_dumper(name=AUTO):
+    """Returns the encoder function of a backend
+
+    ``auto`` is ``orjson`` when it is installed, ``json`` otherwise. Note that
+    the backends do not format the documents the same way (e.g. ``orjson``
+    does not put spaces after the separators).
+
+    Raises:
+        ValueError: if the backend is not installed or can not encode
+    """
+    if name == AUTO:
+        name = 'orjson' if 'orjson' in DUMPERS else 'json'
+    if name not in DUMPERS:
+        raise ValueError('The {} JSON encoder is not available'.format(name))
+    return DUMPERS[name]
+
+
+def parse_lazy(data):
+    """Parses a JSON document without converting it to Python objects
+
+    Only for the ``simdjson`` backend. The objects and the arrays of the
+    document are returned as ``simdjson.Object`` and ``simdjson.Array``
+    proxies, which are only valid as long as the returned parser exists.
+
+    Returns:
+        A tuple of (parser, document)
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    parser = simdjson.Parser()
+    return parser, parser.parse(data)
@@ -0,0 +1,177 @@
+"""A subset of JSONPath for selecting values from JSON documents.
+
+Supported syntax:
+
+- ``$`` - the root of the document
+- ``.name`` or ``['name']`` - a member of an object
+- ``[0]``, ``[-1]`` - an element of an array
+- ``.*`` or ``[*]`` - all the members of an object or elements of an array
+- ``..name`` - the ``name`` members found at any depth
+
+Example: ``$.data.items[*].id``.
+
+With the ``simdjson`` backend, the document is not converted to Python
+objects: the path is followed on the parsed document and only the selected
+values are converted. The paths without wildcards are resolved with a single
+JSON pointer lookup.
+"""
+import functools
+import re
+
+from crawlster.helpers import jsonlib
+
+TOKEN_RE = re.compile(
+    r'\.\.(?P<descend>[^.\[\]]+)'
+    r'|\.(?P<name>[^.\[\]]+)'
+    r'|\[\s*(?:(?P<index>-?\d+)|(?P<star>\*)|'
+    r'\'(?P<single>[^\']*)\'|"(?P<double>[^"]*)")\s*\]')
+
+KEY = 'key'
+INDEX = 'index'
+WILDCARD = 'wildcard'
+DESCEND = 'descend'
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_path(path):
+    """Compiles a path to a tuple of (kind, argument) steps
+
+    Raises:
+        ValueError: if the path is not valid
+    """
+    path = path.strip()
+    if not path.startswith('$'):
+        raise ValueError('A JSON path must start with $: {}'.format(path))
+    steps = []
+    pos = 1
+    while pos < len(path):
+        match = TOKEN_RE.match(path, pos)
+        if match is None:
+            raise ValueError('Invalid JSON path {} at position {}'.format(
+                path, pos))
+        pos = match.end()
+        if match.group('descend') is not None:
+            steps.append((DESCEND, match.group('descend')))
+        elif match.group('name') == '*' or match.group('star'):
+            steps.append((WILDCARD, None))
+        elif match.group('index') is not None:
+            steps.append((INDEX, int(match.group('index'))))
+        else:
+            name = match.group('name')
+            if name is None:
+                name = match.group('single')
+            if name is None:
+                name = match.group('double')
+            steps.append((KEY, name))
+    return tuple(steps)
+
+
+def get_types():
+    """Returns the object types and the array types of the backends"""
+    objects, arrays = (dict,), (list,)
+    if jsonlib.simdjson is not None:
+        objects += (jsonlib.simdjson.Object,)
+        arrays += (jsonlib.simdjson.Array,)
+    return objects, arrays
+
+
+OBJECT_TYPES, ARRAY_TYPES = get_types()
+
+
+def children(node):
+    if isinstance(node, OBJECT_TYPES):
+        return [node[key] for key in node.keys()]
+    if isinstance(node, ARRAY_TYPES):
+        return list(node)
+    return []
+
+
+def descend(node, name, found):
+    """Appends the name members at any depth under node to found"""
+    if isinstance(node, OBJECT_TYPES):
+        for key in node.keys():
+            value = node[key]
+            if key == name:
+                found.append(value)
+            descend(value, name, found)
+    elif isinstance(node, ARRAY_TYPES):
+        for value in node:
+            descend(value, name, found)
+
+
+def select(document, steps):
+    """Returns the values selected by the compiled path in a document"""
+    nodes = [document]
+    for kind, arg in steps:
+        selected = []
+        for node in nodes:
+            if kind == KEY:
+                if isinstance(node, OBJECT_TYPES) and arg in node:
+                    selected.append(node[arg])
+            elif kind == INDEX:
+                if isinstance(node, ARRAY_TYPES) and \
+                        -len(node) <= arg < len(node):
+                    selected.append(node[arg])
+            elif kind == WILDCARD:
+                selected.extend(children(node))
+            else:
+                descend(node, arg, selected)
+        nodes = selected
+    return nodes
+
+
+def to_pointer(steps):
+    """Returns the JSON pointer of a path, None if it can not be one"""
+    parts = []
+    for kind, arg in steps:
+        if kind == KEY:
+            parts.append(arg.replace('~', '~0').replace('/', '~1'))
+        elif kind == INDEX and arg >= 0:
+            parts.append(str(arg))
+        else:
+            return None
+    return '/' + '/'.join(parts) if parts else ''
+
+
+def to_python(value):
+    """Converts the simdjson proxies to Python objects"""
+    if jsonlib.simdjson is not None:
+        if isinstance(value, jsonlib.simdjson.Object):
+            return value.as_dict()
+        if isinstance(value, jsonlib.simdjson.Array):
+            return value.as_list()
+    return value
+
+
+def find(document, path, backend=jsonlib.AUTO):
+    """Returns the list of values selected by a path
+
+    Args:
+        document (bytes, str, dict or list):
+            The JSON document, or the document already parsed
+        path (str):
+            The path of the values, e.g. ``$.items[*].id``
+        backend (str):
+            The JSON backend used for parsing the document. ``auto``
+            prefers ``simdjson``, which converts only the selected values.
+
+    Raises:
+        ValueError: if the path or the document is not valid
+    """
+    steps = compile_path(path)
+    if not isinstance(document, (bytes, str)):
+        return select(document, steps)
+    if backend == jsonlib.AUTO and jsonlib.simdjson is not None:
+        backend = 'simdjson'
+    if jsonlib.get_backend(backend) != 'simdjson':
+        return select(jsonlib.loads(document, backend), steps)
+    parser, root = jsonlib.parse_lazy(document)
+    pointer = to_pointer(steps)
+    if pointer is not None:
+        try:
+            values = [root.at_pointer(pointer)] if pointer else [root]
+        except (KeyError, IndexError, TypeError, ValueError):
+            values = []
+    else:
+        values = select(root, steps)
+    return [to_python(value) for value in values]
@@ -0,0 +1,158 @@
+"""Link extraction from raw HTML, without building a document tree.
+
+The document is scanned with a few regular expressions that only look at the
+start tags, the comments and the content of the raw text elements (like
+``<script>``), which is skipped. The attributes are only parsed for the tags
+that can contain links.
+"""
+import html
+import re
+import urllib.parse
+
+#: The attribute holding the url, by tag
+LINK_ATTRS = {
+    'a': 'href',
+    'area': 'href',
+    'link': 'href',
+    'base': 'href',
+    'img': 'src',
+    'iframe': 'src',
+    'frame': 'src',
+    'script': 'src',
+    'source': 'src',
+    'embed': 'src'
+}
+
+DEFAULT_TAGS = ('a', 'area')
+
+#: The elements whose content is not markup
+RAW_TEXT = (b'script', b'style', b'textarea', b'title')
+
+TOKEN_RE = re.compile(
+    rb'<!--.*?(?:-->|\Z)'
+    rb'|<([a-zA-Z][a-zA-Z0-9-]*)((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>',
+    re.DOTALL)
+ATTR_RE = re.compile(
+    rb'([^\s"\'>/=]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+)))?')
+RAW_TEXT_END_RE = {
+    tag: re.compile(rb'</' + tag + rb'[\s/>]', re.IGNORECASE)
+    for tag in RAW_TEXT
+}
+
+
+def parse_attrs(data):
+    """Returns the attributes of a start tag, as a dict of bytes
+
+    The names are lowercased and, as in browsers, only the first occurrence
+    of an attribute is kept.
+    """
+    attrs = {}
+    for name, double, single, bare in ATTR_RE.findall(data):
+        name = name.lower()
+        if name not in attrs:
+            attrs[name] = double or single or bare
+    return attrs
+
+
+def decode_value(value, encoding):
+    value = value.decode(encoding, errors='replace')
+    if '&' in value:
+        value = html.unescape(value)
+    # browsers ignore the leading and trailing whitespace of urls
+    return value.strip(' \t\n\r\f')
+
+
+def extract_links(data, base_url, tags=DEFAULT_TAGS, rel=None,
+                  exclude_rel=None, encoding='utf-8'):
+    """Returns the absolute urls of the links of a HTML document
+
+    Args:
+        data (bytes or str):
+            The document
+        base_url (str):
+            The url of the document. The links are relative to the first
+            ``<base href>`` of the document, if any, or to this url.
+        tags (iterable of str):
+            The tags the links are extracted from (see :py:data:`LINK_ATTRS`
+            for the supported ones)
+        rel (iterable of str or None):
+            If provided, only the links having one of these ``rel`` values
+            are extracted
+        exclude_rel (iterable of str or None):
+            The links having one of these ``rel`` values (e.g.
+            ``nofollow``) are not extracted
+        encoding (str):
+            The encoding of the urls
+
+    Returns:
+        A list of urls, in the document order
+    """
+    if isinstance(data, str):
+        data = data.encode(encoding, errors='replace')
+    wanted = {tag.lower().encode(): LINK_ATTRS[tag.lower()].encode()
+              for tag in tags}
+    rel = {value.lower() for value in rel} if rel else None
+    exclude_rel = {value.lower() for value in exclude_rel or ()}
+    base = None
+    links = []
+    pos = 0
+    search = TOKEN_RE.search
+    while True:
+        match = search(data, pos)
+        if match is None:
+            break
+        pos = match.end()
+        tag = match.group(1)
+        if tag is None:
+            # a comment
+            continue
+        tag = tag.lower()
+        if tag in wanted or (tag == b'base' and base is None):
+            attrs = parse_attrs(match.group(2))
+            if tag == b'base' and base is None and b'href' in attrs:
+                base = decode_value(attrs[b'href'], encoding)
+            if tag in wanted:
+                value = attrs.get(wanted[tag])
+                if value is not None and is_rel_allowed(
+                        attrs.get(b'rel'), rel, exclude_rel):
+                    links.append(decode_value(value, encoding))
+        if tag in RAW_TEXT:
+            end = RAW_TEXT_END_RE[tag].search(data, pos)
+            pos = end.start() if end else len(data)
+    if base is not None:
+        base_url = urllib.parse.urljoin(base_url, base)
+    join = make_joiner(base_url)
+    return [join(link) for link in links]
+
+
+def make_joiner(base_url):
+    """Returns a function that makes the links relative to base_url absolute
+
+    Equivalent to ``urllib.parse.urljoin(base_url, link)``, but the absolute
+    links and the links relative to the root, which are the most common
+    ones, are joined without parsing the urls.
+    """
+    parts = urllib.parse.urlsplit(base_url)
+    origin = '{}://{}'.format(parts.scheme, parts.netloc) \
+        if parts.scheme in ('http', 'https') and parts.netloc else None
+
+    def join(link):
+        if '/.' not in link and '\\' not in link:
+            if link.startswith(('http://', 'https://')) and \
+                    link.count('/') > 2:
+                return link
+            if origin and link.startswith('/') and \
+                    not link.startswith('//'):
+                return origin + link
+        return urllib.parse.urljoin(base_url, link)
+    return join
+
+
+def is_rel_allowed(value, rel, exclude_rel):
+    if rel is None and not exclude_rel:
+        return True
+    values = set(value.decode('ascii', errors='replace').lower().split()) \
+        if value else set()
+    if values & exclude_rel:
+        return False
+    return rel is None or bool(values & rel)
@@ -19,6 +19,7 @@ class LoggingHelper(BaseHelper):
 
     """
     name = 'log'
+    process_safe = True
     valid_log_levels = ('debug', 'info', 'warning', 'error', 'critical')
     config_options = {
         'log.level': ChoiceOption(valid_log_levels, default='info')
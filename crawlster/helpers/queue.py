@@ -1,47 +1,336 @@
-from queue import Queue, LifoQueue
+import queue
+import threading
+import time
 
+from crawlster.config import NumberOption, StringOption
+from crawlster.exceptions import ConfigurationError, OptionNotDefinedError
 from crawlster.helpers.base import BaseHelper
+from crawlster.helpers.frontier import FifoFrontier, LifoFrontier, \
+    HostFrontier, PriorityFrontier, SpillingFrontier
 
 
 class QueueHelper(BaseHelper):
     """Helper for managing the task queue.
 
-    It is required for a crawler to function
+    It is required for a crawler to function.
+
+    Besides storing the pending jobs, the helper keeps track of the jobs that
+    are still being processed in order to detect when the crawl is finished:
+    once every job that was put in the queue is marked as done, the queue is
+    closed and all the consumers blocked in :py:meth:`get` are woken up.
+
+    Configuration options:
+
+    - ``queue.host_concurrency`` - the maximum number of jobs in progress for
+      the same host. Defaults to 0 (no limit).
+    - ``queue.host_rate`` - the maximum number of jobs started per second for
+      the same host. Defaults to 0 (no limit).
+    - ``queue.host_burst`` - the number of jobs that can be started at once
+      for a host before ``queue.host_rate`` applies. Defaults to 1.
+
+    - ``queue.max_resident`` - the maximum number of pending jobs kept in
+      memory by the ``'fifo'`` and ``'lifo'`` strategies. The other jobs are
+      spilled to disk. Defaults to 0 (no limit).
+    - ``queue.spill_batch`` - the number of jobs written to or read from the
+      disk at once. Defaults to 10000.
+    - ``queue.spill_dir`` - where the spilled jobs are stored. Defaults to
+      the system temporary directory.
+
+    When a per host limit is set, the jobs are stored per host and handed out
+    in a round robin fashion across the hosts that are ready (see
+    :py:class:`crawlster.helpers.frontier.HostFrontier`), the strategy
+    ordering the jobs of each host. The jobs are stored per host from the
+    start when ``robots.enabled`` is set as well, so the ``Crawl-delay`` of
+    the sites can be enforced (see :py:meth:`set_host_rate`).
+
+    In this case, the ``queue.max_resident`` limit applies to the jobs of all
+    the hosts together. The jobs over it wait on disk, in the order of the
+    strategy, until there is room for them in the queue of their host. Up to
+    ``queue.spill_batch`` more jobs can be kept in memory while they wait to
+    be written.
     """
+    name = 'queue'
+    config_options = {
+        'queue.host_concurrency': NumberOption(default=0),
+        'queue.host_rate': NumberOption(default=0),
+        'queue.host_burst': NumberOption(default=1),
+        'queue.max_resident': NumberOption(default=0),
+        'queue.spill_batch': NumberOption(default=10000),
+        'queue.spill_dir': StringOption(default=None)
+    }
+    STAT_BANDS = 'queue.bands'
+    STAT_RESIDENT = 'queue.resident'
+    STAT_SPILLED = 'queue.spilled'
 
-    def __init__(self, strategy='fifo'):
+    strategies = {
+        'fifo': FifoFrontier,
+        'lifo': LifoFrontier,
+        'priority': PriorityFrontier
+    }
+
+    def __init__(self, strategy='fifo', scorer=None):
         """Initializes the queue based on the given strategy
 
         Args:
             strategy (str):
-                One of 'fifo' or 'lifo'. If ``'fifo'``, a queue will be used.
-                If ``'lifo'``, a stack will be used.
+                One of 'fifo', 'lifo' or 'priority'. If ``'fifo'``, a queue
+                will be used. If ``'lifo'``, a stack will be used. If
+                ``'priority'``, a heap will be used and the jobs with the
+                highest priority are processed first.
+            scorer (callable or None):
+                Only for the ``'priority'`` strategy. Called with the jobs
+                scheduled without an explicit priority, must return their
+                priority. By default, the jobs closer to the start urls
+                have a higher priority.
         """
         super(QueueHelper, self).__init__()
-        if strategy == 'fifo':
-            self.queue = Queue()
-        elif strategy == 'lifo':
-            self.queue = LifoQueue()
+        if strategy not in self.strategies:
+            raise ValueError('Invalid queue strategy: {}'.format(strategy))
+        if scorer and strategy != 'priority':
+            raise ValueError('A scorer can be used only with the priority '
+                             'strategy')
+        self.strategy = strategy
+        self.scorer = scorer
+        self.max_resident = 0
+        self.frontier = self.make_frontier()
+        self.listeners = []
+        self._cond = threading.Condition()
+        self._unfinished = 0
+        self._closed = False
+
+    def make_frontier(self):
+        """Creates an empty in memory frontier for the configured strategy"""
+        if self.strategy == 'priority':
+            return PriorityFrontier(self.scorer)
+        return self.strategies[self.strategy]()
+
+    def make_spilling_frontier(self, max_resident):
+        """Creates an empty frontier that spills the jobs to disk
+
+        Args:
+            max_resident (int):
+                The maximum number of jobs kept in memory
+        """
+        return SpillingFrontier(
+            self.strategy == 'lifo', max_resident,
+            self.config.get('queue.spill_batch'),
+            lambda job: job.to_state(), self.crawler.job_from_state,
+            self.config.get('queue.spill_dir'))
+
+    def initialize(self):
+        """Sets up the frontier based on the configuration"""
+        if self.strategy == 'priority':
+            self.crawler.stats.gauge(self.STAT_BANDS, self.band_sizes)
+        self.max_resident = self.config.get('queue.max_resident')
+        if self.max_resident:
+            if self.strategy == 'priority':
+                raise ConfigurationError(
+                    'queue.max_resident is not supported by the priority '
+                    'strategy')
+            self.crawler.stats.gauge(self.STAT_RESIDENT,
+                                     lambda: self.spill_counts()[0])
+            self.crawler.stats.gauge(self.STAT_SPILLED,
+                                     lambda: self.spill_counts()[1])
+        concurrency = self.config.get('queue.host_concurrency')
+        rate = self.config.get('queue.host_rate')
+        try:
+            robots = self.config.get('robots.enabled')
+        except OptionNotDefinedError:
+            # the crawler has no robots helper
+            robots = False
+        with self._cond:
+            if concurrency or rate or robots:
+                overflow = None
+                if self.max_resident:
+                    # shared by all the hosts, so the limit does not grow
+                    # with their number
+                    overflow = self.make_spilling_frontier(
+                        self.config.get('queue.spill_batch'))
+                self.frontier = HostFrontier(
+                    self.make_frontier, concurrency, rate,
+                    self.config.get('queue.host_burst'), self.max_resident,
+                    overflow)
+            elif self.max_resident:
+                self.frontier = self.make_spilling_frontier(
+                    self.max_resident)
+
+    def set_host_rate(self, host, rate):
+        """Overrides the maximum number of jobs started per second for a host
+
+        Requires the jobs to be stored per host, i.e. one of the per host
+        limits or ``robots.enabled`` to be set. The override only applies
+        while the host has pending or in progress jobs: it is forgotten,
+        like the rest of the state of the host, once the host is idle.
+
+        Args:
+            host (str):
+                The host, with the port if it is not the default one
+            rate (float):
+                The maximum number of jobs per second. 0 means no limit.
+
+        Raises:
+            ConfigurationError: if the jobs are not stored per host
+        """
+        with self._cond:
+            if not isinstance(self.frontier, HostFrontier):
+                raise ConfigurationError(
+                    'The rate of a host can be set only when the jobs are '
+                    'stored per host')
+            if self.frontier.set_host_rate(host.lower(), rate):
+                self._cond.notify_all()
+
+    def finalize(self):
+        """Removes the spilled jobs, if any"""
+        with self._cond:
+            if hasattr(self.frontier, 'close'):
+                self.frontier.close()
+
+    def spill_counts(self):
+        """Returns the number of pending jobs in memory and on disk"""
+        with self._cond:
+            spilled = 0
+            if hasattr(self.frontier, 'spilled_count'):
+                spilled = self.frontier.spilled_count()
+            return len(self.frontier) - spilled, spilled
+
+    def band_sizes(self):
+        """Returns the number of pending jobs per priority band"""
+        with self._cond:
+            return self.frontier.band_sizes()
+
+    def add_listener(self, listener):
+        """Registers an object to be notified about the queue activity
+
+        The listener must provide the ``job_added(item)`` and
+        ``job_done(item)`` methods. They are called from the thread that
+        puts the item or marks it as done.
+        """
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """Unregisters an object registered with add_listener"""
+        if listener in self.listeners:
+            self.listeners.remove(listener)
 
     def put(self, item):
-        """Puts an item to the queue"""
-        self.queue.put(item)
+        """Puts an item to the queue and wakes up a waiting consumer"""
+        for listener in self.listeners:
+            listener.job_added(item)
+        with self._cond:
+            self.frontier.push(item)
+            self._unfinished += 1
+            self._closed = False
+            self._cond.notify()
+
+    def get(self, timeout=None, interrupt=None):
+        """Returns the next item from the queue.
+
+        Blocks until an item is available or until the queue is closed.
+
+        Args:
+            timeout (float or None):
+                The maximum number of seconds to wait for an item. If the
+                timeout expires, :py:class:`queue.Empty` is raised.
+            interrupt (callable or None):
+                If provided, it is called with no arguments while there is
+                no item available. When it returns True, the wait is
+                abandoned. It is called with the internal lock held.
+
+        Returns:
+            The next item or None if the queue was closed (all the jobs are
+            done) or the wait was interrupted.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                try:
+                    return self.frontier.pop()
+                except IndexError:
+                    pass
+                if self._closed or (interrupt and interrupt()):
+                    return None
+                wait = self.frontier.next_ready()
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise queue.Empty()
+                    wait = remaining if wait is None else min(wait,
+                                                              remaining)
+                self._cond.wait(wait)
 
-    def get(self):
-        """Returns the next item from the queue. Blocks if none is available"""
-        return self.queue.get()
+    def wakeup(self):
+        """Wakes up all the waiting consumers.
+
+        Used for making them re-evaluate their interrupt conditions.
+        """
+        with self._cond:
+            self._cond.notify_all()
 
     def get_nowait(self):
         """Returns the next item from queue.
 
-        Raises queue.EmptyQueue if no items are available
+        Raises queue.Empty if no items are available
         """
-        return self.queue.get_nowait()
+        with self._cond:
+            try:
+                return self.frontier.pop()
+            except IndexError:
+                raise queue.Empty()
+
+    def next_ready(self):
+        """Returns the number of seconds until a pending item may be ready
+
+        Returns None if there are no pending items or if they are waiting
+        for other items to be done.
+        """
+        with self._cond:
+            return self.frontier.next_ready()
 
     def join(self):
-        """Waits until all jobs are processed"""
-        self.queue.join()
+        """Waits until all jobs are processed, then closes the queue"""
+        with self._cond:
+            self._cond.wait_for(lambda: not self._unfinished)
+            self._close_locked()
+
+    def task_done(self, item=None):
+        """Marks a task as being done.
+
+        When the last unfinished task is done, the queue is closed.
+
+        Args:
+            item:
+                The item that was processed. Must be provided for releasing
+                the per host limits and for notifying the listeners.
+        """
+        if item is not None:
+            for listener in self.listeners:
+                listener.job_done(item)
+        with self._cond:
+            if self._unfinished <= 0:
+                raise ValueError('task_done() called too many times')
+            self._unfinished -= 1
+            if item is not None:
+                self.frontier.done(item)
+            if not self._unfinished:
+                self._close_locked()
+            else:
+                self._cond.notify()
+
+    def _close_locked(self):
+        """Closes the queue and wakes up all the waiting consumers.
+
+        Must be called with the internal lock held.
+        """
+        self._closed = True
+        self._cond.notify_all()
+
+    def is_closed(self):
+        """Returns whether the queue was closed"""
+        with self._cond:
+            return self._closed
 
-    def task_done(self):
-        """Marks a task as being done"""
-        self.queue.task_done()
+    def qsize(self):
+        """Returns the number of pending items"""
+        with self._cond:
+            return len(self.frontier)
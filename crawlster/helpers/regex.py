@@ -14,6 +14,7 @@ class RegexHelper(BaseHelper):
         prone methods to parse HTML.
     """
     name = 'regex'
+    process_safe = True
 
     def __init__(self):
         super(RegexHelper, self).__init__()
@@ -0,0 +1,291 @@
+"""Support for the robots exclusion protocol (robots.txt).
+
+The rules are matched as described by RFC 9309: the group of the most
+specific user agent is used (falling back to the ``*`` group), the longest
+matching rule wins and ``Allow`` wins over ``Disallow`` when two matching
+rules have the same length. ``*`` matches any sequence of characters and a
+trailing ``$`` anchors the rule at the end of the path.
+"""
+import collections
+import re
+import threading
+import time
+import urllib.parse
+
+from crawlster.config import BoolOption, NumberOption, StringOption
+from crawlster.helpers.base import BaseHelper
+
+
+def compile_rule(pattern):
+    """Returns a function that tells whether a path matches a rule pattern
+
+    The patterns without wildcards are matched as plain prefixes.
+    """
+    if '*' not in pattern and not pattern.endswith('$'):
+        return lambda path: path.startswith(pattern)
+    anchored = pattern.endswith('$')
+    if anchored:
+        pattern = pattern[:-1]
+    regex = '.*'.join(re.escape(part) for part in pattern.split('*'))
+    if anchored:
+        regex += '$'
+    return re.compile(regex, re.DOTALL).match
+
+
+class RobotsRules(object):
+    """The rules of a robots.txt file that apply to a user agent"""
+
+    def __init__(self, rules=(), crawl_delay=None):
+        """Initializes the rules
+
+        Args:
+            rules (list of tuple):
+                (allow, pattern) tuples, where allow is a bool
+            crawl_delay (float or None):
+                The number of seconds between two requests asked by the site
+        """
+        # longest patterns first, allow first for equal lengths
+        ordered = sorted(set(rules), key=lambda r: (-len(r[1]), not r[0]))
+        self.rules = [(allow, compile_rule(pattern))
+                      for allow, pattern in ordered]
+        self.crawl_delay = crawl_delay
+
+    @classmethod
+    def parse(cls, text, user_agent='*'):
+        """Parses a robots.txt file
+
+        Args:
+            text (str):
+                The content of the file
+            user_agent (str):
+                The product token of the crawler, e.g. ``mybot``
+
+        Returns:
+            The :py:class:`RobotsRules` of the user agent
+        """
+        groups = []
+        agents = None
+        for line in text.splitlines():
+            line = line.split('#', 1)[0].strip()
+            if ':' not in line:
+                continue
+            key, value = line.split(':', 1)
+            key = key.strip().lower()
+            value = value.strip()
+            if key == 'user-agent':
+                if agents is None:
+                    agents = []
+                    groups.append((agents, [], []))
+                agents.append(value.lower())
+                continue
+            if not groups:
+                continue
+            # any other line ends the list of user agents of the group
+            agents = None
+            if key in ('allow', 'disallow') and value:
+                groups[-1][1].append((key == 'allow', normalize_path(value)))
+            elif key == 'crawl-delay':
+                try:
+                    groups[-1][2].append(float(value))
+                except ValueError:
+                    pass
+        token = user_agent.lower().split('/', 1)[0]
+        best = 0
+        selected = []
+        for group in groups:
+            for agent in group[0]:
+                if agent == '*':
+                    length = 0.5
+                elif agent == token:
+                    length = len(agent) + 1
+                else:
+                    continue
+                if length > best:
+                    best, selected = length, [group]
+                elif length == best:
+                    selected.append(group)
+                break
+        rules = []
+        delays = []
+        for group in selected:
+            rules.extend(group[1])
+            delays.extend(group[2])
+        return cls(rules, max(delays) if delays else None)
+
+    def allowed(self, path):
+        """Returns whether the path (with the query string) can be crawled"""
+        if path == '/robots.txt':
+            return True
+        for allow, match in self.rules:
+            if match(path):
+                return allow
+        return True
+
+
+def normalize_path(path):
+    """Returns the percent encoded form of a path, as sent in requests"""
+    return urllib.parse.quote(path, safe="/?=&;:@$*%!,'()+~")
+
+
+#: Rules that allow everything
+ALLOW_ALL = RobotsRules()
+
+
+class RobotsHelper(BaseHelper):
+    """Helper that checks the urls against the robots.txt of their site
+
+    It is used by :py:meth:`crawlster.helpers.UrlsHelper.can_crawl` when
+    enabled. The robots.txt of a site is fetched with the http helper the
+    first time a url of the site is checked. The threads that check urls of
+    the same site in the meantime wait for that fetch instead of making
+    their own. The parsed rules are kept for ``robots.ttl`` seconds, for at
+    most ``robots.cache_size`` sites.
+
+    A ``Crawl-delay`` is enforced by limiting the rate the jobs of the site
+    are handed out by the queue (see :py:meth:`QueueHelper.set_host_rate`),
+    so the workers are free to process the jobs of other sites meanwhile.
+    The rate is set again each time the rules of the site are checked,
+    since the queue only keeps it while the site has jobs.
+
+    A missing robots.txt (4xx status) allows everything. So does a robots.txt
+    that can not be fetched (network error or 5xx status), but then the rules
+    are fetched again after ``robots.error_ttl`` seconds.
+
+    Configuration options:
+
+    - ``robots.enabled`` - whether robots.txt is obeyed. Defaults to False
+    - ``robots.user_agent`` - the user agent the rules are selected for.
+      Defaults to ``*``
+    - ``robots.cache_size`` - the maximum number of sites whose rules are
+      kept. Defaults to 10000
+    - ``robots.ttl`` - the number of seconds the rules are kept. Defaults to
+      one day
+    - ``robots.error_ttl`` - the number of seconds a failed fetch is kept.
+      Defaults to 600
+    - ``robots.max_crawl_delay`` - the maximum ``Crawl-delay`` that is obeyed,
+      in seconds. Defaults to 30
+    - ``robots.max_size`` - the maximum number of bytes parsed from a
+      robots.txt file. Defaults to 500 KiB
+    """
+    name = 'robots'
+    config_options = {
+        'robots.enabled': BoolOption(default=False),
+        'robots.user_agent': StringOption(default='*'),
+        'robots.cache_size': NumberOption(default=10000),
+        'robots.ttl': NumberOption(default=86400),
+        'robots.error_ttl': NumberOption(default=600),
+        'robots.max_crawl_delay': NumberOption(default=30),
+        'robots.max_size': NumberOption(default=512000)
+    }
+    STAT_FETCHED = 'robots.fetched'
+    STAT_ERRORS = 'robots.errors'
+    STAT_FORBIDDEN = 'robots.forbidden'
+
+    def __init__(self):
+        super(RobotsHelper, self).__init__()
+        self.enabled = False
+        self.user_agent = '*'
+        self.cache_size = 10000
+        self.ttl = 86400
+        self.error_ttl = 600
+        self._entries = collections.OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def initialize(self):
+        self.enabled = self.config.get('robots.enabled')
+        self.user_agent = self.config.get('robots.user_agent')
+        self.cache_size = self.config.get('robots.cache_size')
+        self.ttl = self.config.get('robots.ttl')
+        self.error_ttl = self.config.get('robots.error_ttl')
+        with self._lock:
+            self._entries.clear()
+
+    def allowed(self, url):
+        """Returns whether the url can be crawled according to robots.txt
+
+        Always True if the helper is not enabled or for urls that are not
+        http or https.
+        """
+        if not self.enabled:
+            return True
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.netloc:
+            return True
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        origin = '{}://{}'.format(parts.scheme, parts.netloc.lower())
+        rules = self.get_rules(origin)
+        if rules.crawl_delay:
+            # the queue forgets the rate of the hosts that are idle
+            self.apply_crawl_delay(origin, rules.crawl_delay)
+        if rules.allowed(normalize_path(path)):
+            return True
+        self.crawler.stats.incr(self.STAT_FORBIDDEN)
+        return False
+
+    def get_rules(self, origin):
+        """Returns the rules of a site, fetching them if needed
+
+        Args:
+            origin (str):
+                The scheme and the host of the site, e.g.
+                ``https://example.com``
+        """
+        with self._lock:
+            entry = self._entries.get(origin)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(origin)
+                return entry[1]
+            event = self._pending.get(origin)
+            owner = event is None
+            if owner:
+                event = self._pending[origin] = threading.Event()
+        if not owner:
+            # another thread is fetching the same robots.txt
+            event.wait()
+            with self._lock:
+                entry = self._entries.get(origin)
+            return entry[1] if entry is not None else ALLOW_ALL
+        try:
+            rules, ttl = self.fetch(origin)
+            with self._lock:
+                self._entries[origin] = (time.monotonic() + ttl, rules)
+                self._entries.move_to_end(origin)
+                while len(self._entries) > self.cache_size:
+                    self._entries.popitem(last=False)
+        finally:
+            with self._lock:
+                del self._pending[origin]
+            event.set()
+        return rules
+
+    def fetch(self, origin):
+        """Fetches and parses the robots.txt of a site
+
+        Returns:
+            A tuple of (rules, ttl)
+        """
+        resp = self.crawler.http.get(origin + '/robots.txt')
+        if resp is None or resp.status_code >= 500:
+            self.crawler.stats.incr(self.STAT_ERRORS)
+            return ALLOW_ALL, self.error_ttl
+        self.crawler.stats.incr(self.STAT_FETCHED)
+        if resp.status_code >= 400:
+            return ALLOW_ALL, self.ttl
+        body = resp.body[:self.config.get('robots.max_size')]
+        text = body.decode('utf-8', errors='replace')
+        return RobotsRules.parse(text, self.user_agent), self.ttl
+
+    def apply_crawl_delay(self, origin, delay):
+        """Limits the rate of the jobs of a site to match its Crawl-delay"""
+        delay = min(delay, self.config.get('robots.max_crawl_delay'))
+        if delay <= 0:
+            return
+        rate = 1 / delay
+        host_rate = self.config.get('queue.host_rate')
+        if host_rate:
+            rate = min(rate, host_rate)
+        netloc = urllib.parse.urlsplit(origin).netloc
+        self.crawler.queue.set_host_rate(netloc, rate)
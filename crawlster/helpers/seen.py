@@ -0,0 +1,199 @@
+"""Thread safe sets used for remembering the urls that were already seen.
+
+Two backends are provided:
+
+- :py:class:`ExactSeenSet` which stores the full urls
+- :py:class:`ScalableBloomFilter` which stores only a few bits per url, at
+  the cost of a configurable rate of false positives (urls that are reported
+  as seen although they were not)
+"""
+import hashlib
+import math
+import struct
+import threading
+
+
+class ExactSeenSet(object):
+    """Seen set backed by a regular set"""
+
+    def __init__(self):
+        self._items = set()
+        self._lock = threading.Lock()
+
+    def add(self, item):
+        """Adds an item. Returns True if it was not present before"""
+        with self._lock:
+            if item in self._items:
+                return False
+            self._items.add(item)
+            return True
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+
+class BloomFilter(object):
+    """A fixed size Bloom filter
+
+    The filter is sized for ``capacity`` items with a ``error_rate`` false
+    positive probability. The bit positions of an item are derived from a
+    single 128 bit MD5 digest by double hashing.
+    """
+
+    def __init__(self, capacity, error_rate, count=0):
+        """Initializes the filter
+
+        Args:
+            capacity (int):
+                The number of items the filter is sized for
+            error_rate (float):
+                The false positive probability when the filter is full
+            count (int):
+                The number of items already in the filter, used when
+                loading a saved filter
+        """
+        if not 0 < error_rate < 1:
+            raise ValueError('The error rate must be between 0 and 1')
+        self.capacity = max(int(capacity), 1)
+        self.error_rate = error_rate
+        size = math.ceil(-self.capacity * math.log(error_rate) /
+                         math.log(2) ** 2)
+        self.num_bits = size + (-size % 8)
+        self.num_hashes = max(
+            round(self.num_bits / self.capacity * math.log(2)), 1)
+        self.bits = bytearray(self.num_bits // 8)
+        self.count = count
+
+    def _positions(self, item):
+        # available in all the supported Python versions, unlike BLAKE2
+        digest = hashlib.md5(item.encode('utf-8')).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.num_hashes):
+            yield (first + i * second) % self.num_bits
+
+    def add(self, item):
+        """Adds an item. Returns True if it was not present before"""
+        new = False
+        bits = self.bits
+        for position in self._positions(item):
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                new = True
+        if new:
+            self.count += 1
+        return new
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(item))
+
+    def is_full(self):
+        return self.count >= self.capacity
+
+
+class ScalableBloomFilter(object):
+    """A Bloom filter that grows with the number of items
+
+    When the current filter is full, a new one with ``growth`` times the
+    capacity and ``tightening`` times the error rate is added, so the overall
+    false positive probability stays under ``error_rate`` no matter how many
+    items are added.
+    """
+    MAGIC = b'CRSB'
+    HEADER = struct.Struct('<4sQdQdI')
+    FILTER_HEADER = struct.Struct('<QdQ')
+
+    def __init__(self, capacity=1000000, error_rate=0.001, growth=2,
+                 tightening=0.5):
+        """Initializes the filter
+
+        Args:
+            capacity (int):
+                The capacity of the first filter
+            error_rate (float):
+                The maximum false positive probability
+            growth (int):
+                The capacity multiplier of each new filter
+            tightening (float):
+                The error rate multiplier of each new filter
+        """
+        self.capacity = int(capacity)
+        self.error_rate = error_rate
+        self.growth = int(growth)
+        self.tightening = tightening
+        self.filters = []
+        self._lock = threading.Lock()
+
+    def add(self, item):
+        """Adds an item. Returns True if it was not present before"""
+        with self._lock:
+            if item in self:
+                return False
+            if not self.filters or self.filters[-1].is_full():
+                self.filters.append(self._next_filter())
+            return self.filters[-1].add(item)
+
+    def _next_filter(self):
+        index = len(self.filters)
+        capacity = self.capacity * self.growth ** index
+        # the sum of the error rates of all the filters is a geometric
+        # series that converges to error_rate
+        error_rate = self.error_rate * (1 - self.tightening) * \
+            self.tightening ** index
+        return BloomFilter(capacity, error_rate)
+
+    def __contains__(self, item):
+        return any(item in bloom for bloom in reversed(self.filters))
+
+    def __len__(self):
+        return sum(bloom.count for bloom in self.filters)
+
+    def size_in_bytes(self):
+        """Returns the size of the bit arrays"""
+        return sum(len(bloom.bits) for bloom in self.filters)
+
+    def save(self, path):
+        """Saves the filter as a compact bit array
+
+        The bit arrays are copied first, so the filter is only locked for
+        the copy and not while the file is written.
+        """
+        with self._lock:
+            header = self.HEADER.pack(
+                self.MAGIC, self.capacity, self.error_rate, self.growth,
+                self.tightening, len(self.filters))
+            filters = [(self.FILTER_HEADER.pack(bloom.capacity,
+                                                bloom.error_rate,
+                                                bloom.count),
+                        bytes(bloom.bits))
+                       for bloom in self.filters]
+        with open(path, 'wb') as fp:
+            fp.write(header)
+            for filter_header, bits in filters:
+                fp.write(filter_header)
+                fp.write(bits)
+
+    @classmethod
+    def load(cls, path):
+        """Loads a filter saved with :py:meth:`save`"""
+        with open(path, 'rb') as fp:
+            magic, capacity, error_rate, growth, tightening, num_filters = \
+                cls.HEADER.unpack(fp.read(cls.HEADER.size))
+            if magic != cls.MAGIC:
+                raise ValueError('Not a saved bloom filter: {}'.format(path))
+            instance = cls(capacity, error_rate, growth, tightening)
+            for _ in range(num_filters):
+                bloom_capacity, bloom_error, count = \
+                    cls.FILTER_HEADER.unpack(fp.read(cls.FILTER_HEADER.size))
+                bloom = BloomFilter(bloom_capacity, bloom_error, count=count)
+                if fp.readinto(bloom.bits) != len(bloom.bits):
+                    raise ValueError(
+                        'Truncated bloom filter: {}'.format(path))
+                instance.filters.append(bloom)
+        return instance
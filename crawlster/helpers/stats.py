@@ -5,11 +5,18 @@ from crawlster.helpers.base import BaseHelper
 
 
 class StatsHelper(BaseHelper):
-    """Helper that tracks different statistics through the crawler"""
+    """Helper that tracks different statistics through the crawler
+
+    In the worker processes of the cpu_bound steps, the counters increased
+    by a step are added to the counters of the main process when the step
+    finishes. The other stats are kept in the worker process.
+    """
+    process_safe = True
 
     def __init__(self):
         super(StatsHelper, self).__init__()
         self._stats = {}
+        self._gauges = {}
         self._lock = threading.Lock()
 
     def initialize(self):
@@ -20,10 +27,25 @@ class StatsHelper(BaseHelper):
         with self._lock:
             self._stats[key] = value
 
+    def gauge(self, key, func):
+        """Registers a stat whose value is computed by func when read
+
+        Args:
+            key (str):
+                The stat name
+            func (callable):
+                Called with no arguments, returns the current value
+        """
+        with self._lock:
+            self._gauges[key] = func
+
     def get(self, key):
         """Returns the specified stat"""
         with self._lock:
-            return copy.deepcopy(self._stats[key])
+            gauge = self._gauges.get(key)
+            if not gauge:
+                return copy.deepcopy(self._stats[key])
+        return gauge()
 
     def add(self, key, item):
         """Adds an item to the specified stat collection"""
@@ -41,8 +63,18 @@ class StatsHelper(BaseHelper):
         """Decreases the stat value by the specified amount"""
         self.incr(key, by=-1)
 
+    def counters(self):
+        """Returns the numeric stats, except for the gauges"""
+        with self._lock:
+            return {key: value for key, value in self._stats.items()
+                    if isinstance(value, (int, float))
+                    and key not in self._gauges}
+
     def dump(self):
         """Dumps all the stats as a dict where key is the stat name"""
         with self._lock:
             copy_dict = copy.deepcopy(self._stats)
+            gauges = dict(self._gauges)
+        for key, gauge in gauges.items():
+            copy_dict[key] = gauge()
         return copy_dict
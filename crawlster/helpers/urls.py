@@ -1,26 +1,98 @@
+import fnmatch
+import os
 import urllib.parse
 
-from crawlster.config import ListOption
+from crawlster.config import ListOption, ChoiceOption, NumberOption, \
+    StringOption, BoolOption
+from crawlster.exceptions import ConfigurationError, OptionNotDefinedError
 from crawlster.helpers.base import BaseHelper
+from crawlster.helpers.seen import ExactSeenSet, ScalableBloomFilter
 
 
 class UrlsHelper(BaseHelper):
-    """Helper that provides shortcuts to various url operations"""
+    """Helper that provides shortcuts to various url operations
+
+    Configuration options:
+
+    - ``urls.allowed_domains`` - if not empty, only the urls from these
+      domains can be crawled
+    - ``urls.forbidden_domains`` - the urls from these domains can not be
+      crawled
+    - ``urls.seen_backend`` - how the seen urls are stored: ``'exact'``
+      (default) stores the full urls, ``'bloom'`` stores them in a scalable
+      Bloom filter that uses a few bits per url but may report urls as seen
+      although they were not
+    - ``urls.seen_error_rate`` - the maximum false positive rate of the
+      ``'bloom'`` backend. Defaults to 0.001
+    - ``urls.seen_capacity`` - the number of urls the ``'bloom'`` backend is
+      initially sized for. It grows as needed. Defaults to 1000000
+    - ``urls.seen_path`` - only for the ``'bloom'`` backend. The file the
+      filter is loaded from on start, if it exists, and saved to on finish.
+    - ``urls.dedup`` - whether the scheduled jobs are deduplicated by their
+      canonical url (see :py:meth:`claim_job`). Defaults to ``False``
+    - ``urls.tracking_params`` - the query parameters removed by
+      :py:meth:`canonicalize`. Shell style wildcards are supported.
+    """
     name = 'urls'
+
+    STAT_DUPLICATES = 'urls.duplicates'
+    DEFAULT_PORTS = {'http': 80, 'https': 443}
+    TRACKING_PARAMS = ('utm_*', 'fbclid', 'gclid', 'dclid', 'msclkid',
+                       'mc_cid', 'mc_eid', '_ga', 'yclid')
     config_options = {
         'urls.allowed_domains': ListOption(default=lambda: []),
-        'urls.forbidden_domains': ListOption(default=lambda: [])
+        'urls.forbidden_domains': ListOption(default=lambda: []),
+        'urls.seen_backend': ChoiceOption(('exact', 'bloom'),
+                                          default='exact'),
+        'urls.seen_error_rate': NumberOption(default=0.001),
+        'urls.seen_capacity': NumberOption(default=1000000),
+        'urls.seen_path': StringOption(default=None),
+        'urls.dedup': BoolOption(default=False),
+        'urls.tracking_params': ListOption(
+            default=lambda: list(UrlsHelper.TRACKING_PARAMS))
     }
 
     def __init__(self):
         super(UrlsHelper, self).__init__()
-        self.already_seen = set()
+        self.already_seen = ExactSeenSet()
         self.forbidden_domains = []
         self.allowed_domains = []
+        self.listeners = []
+        self.seen_path = None
+        self.dedup = False
+        self.tracking_params = list(self.TRACKING_PARAMS)
+        self.check_robots = False
 
     def initialize(self):
         self.allowed_domains = self.config.get('urls.allowed_domains')
         self.forbidden_domains = self.config.get('urls.forbidden_domains')
+        self.dedup = self.config.get('urls.dedup')
+        self.tracking_params = self.config.get('urls.tracking_params')
+        self.already_seen = self.make_seen_set()
+        try:
+            self.check_robots = self.config.get('robots.enabled')
+        except OptionNotDefinedError:
+            # the crawler has no robots helper
+            self.check_robots = False
+
+    def make_seen_set(self):
+        """Creates the set of seen urls based on the configuration"""
+        backend = self.config.get('urls.seen_backend')
+        self.seen_path = self.config.get('urls.seen_path')
+        if backend == 'exact':
+            if self.seen_path:
+                raise ConfigurationError(
+                    'urls.seen_path requires the bloom backend')
+            return ExactSeenSet()
+        if self.seen_path and os.path.exists(self.seen_path):
+            return ScalableBloomFilter.load(self.seen_path)
+        return ScalableBloomFilter(self.config.get('urls.seen_capacity'),
+                                   self.config.get('urls.seen_error_rate'))
+
+    def finalize(self):
+        """Saves the seen urls filter, if configured"""
+        if self.seen_path:
+            self.already_seen.save(self.seen_path)
 
     def join(self, base, *parts):
         """Joins multiple url parts with the base.
@@ -34,9 +106,103 @@ class UrlsHelper(BaseHelper):
             res = urllib.parse.urljoin(res, part)
         return res
 
+    def add_listener(self, listener):
+        """Registers an object to be notified about the urls marked as seen
+
+        The listener must provide the ``url_seen(url)`` method.
+        """
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """Unregisters an object registered with add_listener"""
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
     def mark_seen(self, url):
-        """Marks an url as seen"""
-        self.already_seen.add(url)
+        """Marks an url as seen
+
+        Returns:
+            True if the url was not seen before
+        """
+        new = self.already_seen.add(url)
+        if new:
+            for listener in self.listeners:
+                listener.url_seen(url)
+        return new
+
+    def canonicalize(self, url):
+        """Returns the canonical form of an url
+
+        The scheme and the host are lowercased, the default port, the
+        fragment and the tracking query parameters are removed and the
+        remaining query parameters are sorted. The parameters are kept as
+        they are written in the url, without decoding or encoding them.
+        """
+        parts = urllib.parse.urlsplit(url)
+        scheme = parts.scheme.lower()
+        netloc = parts.hostname or ''
+        if ':' in netloc:
+            # IPv6 address
+            netloc = '[{}]'.format(netloc)
+        try:
+            port = parts.port
+        except ValueError:
+            port = None
+        if port and port != self.DEFAULT_PORTS.get(scheme):
+            netloc = '{}:{}'.format(netloc, port)
+        if parts.username is not None:
+            userinfo = parts.netloc.rpartition('@')[0]
+            netloc = '{}@{}'.format(userinfo, netloc)
+        path = parts.path
+        if not path and scheme in self.DEFAULT_PORTS:
+            path = '/'
+        query = []
+        for param in parts.query.split('&'):
+            if not param:
+                continue
+            name = param.partition('=')[0]
+            if not self.is_tracking_param(urllib.parse.unquote_plus(name)):
+                query.append((name, param))
+        query.sort()
+        return urllib.parse.urlunsplit(
+            (scheme, netloc, path, '&'.join(param for _, param in query),
+             ''))
+
+    def is_tracking_param(self, name):
+        """Returns whether a query parameter is a tracking parameter"""
+        name = name.lower()
+        return any(fnmatch.fnmatchcase(name, pattern)
+                   for pattern in self.tracking_params)
+
+    def fingerprint(self, step_name, url):
+        """Returns the key a step scheduled for an url is remembered by"""
+        return '{} {}'.format(step_name, url)
+
+    def claim_job(self, job):
+        """Remembers a job as scheduled, by its canonical url
+
+        The fingerprint of the job (its step and its canonical url) is
+        marked as seen, so it is also saved by the checkpoints and by the
+        ``bloom`` backend. The job keeps its url: the canonical url is only
+        used for recognizing the duplicates.
+
+        Args:
+            job (crawlster.core.FuncJob):
+                The job about to be scheduled
+
+        Returns:
+            False if the same step was already scheduled for the url, in which
+            case the job must be dropped.
+        """
+        url = job.url
+        if url is None:
+            return True
+        canonical = self.canonicalize(url)
+        if self.mark_seen(self.fingerprint(job.func.__name__, canonical)):
+            return True
+        self.crawler.stats.incr(self.STAT_DUPLICATES)
+        return False
 
     def seen(self, url):
         """Returns whether the url was previously marked as seen or not"""
@@ -64,6 +230,17 @@ class UrlsHelper(BaseHelper):
         return urllib.parse.urlencode(data)
 
     def can_crawl(self, url, unique=False):
+        """Returns whether an url can be crawled
+
+        The url must belong to an allowed domain and, when the robots helper
+        is enabled, it must be allowed by the robots.txt of its site.
+
+        Args:
+            url (str):
+                The url to check
+            unique (bool):
+                If True, the urls already seen can not be crawled
+        """
         if unique:
             if self.seen(url):
                 return False
@@ -72,6 +249,8 @@ class UrlsHelper(BaseHelper):
             return False
         if self.allowed_domains and hostname not in self.allowed_domains:
             return False
+        if self.check_robots and not self.crawler.robots.allowed(url):
+            return False
         return True
 
     def has_extension(self, url, extensions):
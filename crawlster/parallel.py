@@ -0,0 +1,206 @@
+"""Support for running CPU bound steps in a pool of processes.
+
+Steps decorated with :py:func:`crawlster.cpu_bound` are executed in worker
+processes instead of worker threads, so that parsing does not compete for the
+GIL with the rest of the crawl.
+
+The step runs on a lightweight copy of the crawler that is built once per
+process: only the helpers that declare themselves ``process_safe``
+(``extract``, ``regex``, ``log`` and ``stats``) are initialized, the other
+ones are replaced with :py:class:`UnavailableHelper` placeholders. The
+``urls`` helper is one of them, since a copy of its seen urls in a worker
+process would never be merged back.
+The calls to ``self.schedule()`` and ``self.submit_item()`` and the counters
+increased by the step are collected and replayed by the parent process, so
+the results flow into the main queue, item handlers and stats.
+
+The bodies of the :py:class:`HttpResponse` arguments are handed over through
+shared memory instead of being pickled along with the call. The parent copies
+the body into shared memory as it was received, without decompressing it.
+The worker process decompresses it straight from shared memory, or copies it
+out when it is not compressed, since the parsers need it as bytes.
+"""
+from crawlster.config import Configuration
+from crawlster.helpers.http import compression
+from crawlster.helpers.http.response import HttpResponse
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+#: The crawler copies built in the current worker process, by crawler class
+_process_crawlers = {}
+
+
+class UnavailableHelper(object):
+    """Stands for a helper that can not be used in the worker processes
+
+    Using it raises RuntimeError, instead of silently using a helper that
+    was not initialized.
+    """
+    is_helper = False
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attr):
+        raise RuntimeError(
+            'The {} helper can not be used by cpu_bound steps'.format(
+                self.name))
+
+
+class SharedResponse(object):
+    """Picklable placeholder for a response whose body is in shared memory"""
+
+    def __init__(self, response, segment, size, codings):
+        """Initializes the placeholder
+
+        Args:
+            response (HttpResponse):
+                The response whose body was copied to the segment
+            segment (SharedMemory):
+                The shared memory holding the body
+            size (int):
+                The size of the body in the segment
+            codings (list of str):
+                The content codings of the body in the segment, if it was not
+                decompressed yet
+        """
+        self.request = response.request
+        self.status_code = response.status_code
+        self.headers = dict(response.headers)
+        self.segment_name = segment.name
+        self.size = size
+        self.codings = codings
+        self.truncated = response.truncated
+        self.parser = response.parser
+
+    def restore(self):
+        """Rebuilds the response from the body in shared memory
+
+        A compressed body is decompressed directly from shared memory. If it
+        can not be decompressed, it is copied out as is and the error is
+        raised when the body is accessed, as for any other response.
+        """
+        segment = shared_memory.SharedMemory(self.segment_name)
+        content_encoding = None
+        view = segment.buf[:self.size]
+        try:
+            body = None
+            if self.codings:
+                try:
+                    body = compression.decode(view, self.codings)
+                except ValueError:
+                    content_encoding = ', '.join(self.codings)
+            if body is None:
+                body = bytes(view)
+        finally:
+            view.release()
+            # the parent process owns the segment and unlinks it
+            segment.close()
+        return HttpResponse(self.request, self.status_code, self.headers,
+                            body, truncated=self.truncated,
+                            content_encoding=content_encoding,
+                            parser=self.parser)
+
+
+def share_responses(args, kwargs):
+    """Moves the bodies of the responses from the arguments to shared memory
+
+    Returns:
+        A tuple of (args, kwargs, segments) where the responses are replaced
+        by :py:class:`SharedResponse` placeholders. The segments must be
+        released with :py:func:`release_segments` after the call finishes.
+    """
+    segments = []
+
+    def share(value):
+        if shared_memory is None or not isinstance(value, HttpResponse):
+            return value
+        # the decompression is left to the worker process
+        if value.is_decoded():
+            data, codings = value.body, []
+        else:
+            data, codings = value.wire_body, value.codings
+        if not data:
+            return value
+        segment = shared_memory.SharedMemory(create=True, size=len(data))
+        segment.buf[:len(data)] = data
+        segments.append(segment)
+        return SharedResponse(value, segment, len(data), codings)
+
+    args = tuple(share(arg) for arg in args)
+    kwargs = {key: share(value) for key, value in kwargs.items()}
+    return args, kwargs, segments
+
+
+def release_segments(segments):
+    """Frees the shared memory segments created by share_responses"""
+    for segment in segments:
+        segment.close()
+        segment.unlink()
+
+
+def restore_responses(args, kwargs):
+    """Replaces the SharedResponse placeholders with HttpResponse objects"""
+
+    def restore(value):
+        if isinstance(value, SharedResponse):
+            return value.restore()
+        return value
+
+    args = tuple(restore(arg) for arg in args)
+    kwargs = {key: restore(value) for key, value in kwargs.items()}
+    return args, kwargs
+
+
+def get_process_crawler(crawler_cls, config_values):
+    """Returns the crawler copy used by the current worker process"""
+    crawler = _process_crawlers.get(crawler_cls)
+    if crawler is None:
+        crawler = crawler_cls.__new__(crawler_cls)
+        crawler.config = Configuration(config_values)
+        crawler.populate_config()
+        for name in dir(crawler):
+            helper = getattr(crawler, name)
+            if not getattr(helper, crawler.HELPER_FLAG, False):
+                continue
+            if helper.process_safe:
+                crawler.inject_config_and_crawler(helper)
+            else:
+                setattr(crawler, name, UnavailableHelper(name))
+        _process_crawlers[crawler_cls] = crawler
+    return crawler
+
+
+def run_step(crawler_cls, config_values, step_name, args, kwargs):
+    """Runs a step in the current worker process
+
+    Returns:
+        A tuple of (items, scheduled, counters) where items is the list of
+        submitted items, scheduled is a list of (step_name, args, kwargs,
+        priority) tuples for the scheduled steps and counters maps the stats
+        counters to the amount the step increased them by.
+    """
+    crawler = get_process_crawler(crawler_cls, config_values)
+    before = crawler.stats.counters()
+    items = []
+    scheduled = []
+
+    def schedule(func, *step_args, priority=None, **step_kwargs):
+        scheduled.append((func.__name__, step_args, step_kwargs, priority))
+
+    crawler.submit_item = items.append
+    crawler.schedule = schedule
+    args, kwargs = restore_responses(args, kwargs)
+    result = getattr(crawler, step_name)(*args, **kwargs)
+    if isinstance(result, dict):
+        items.append(result)
+    elif result is not None and hasattr(result, 'func'):
+        scheduled.append((result.func.__name__, result.args, result.kwargs,
+                          result.priority))
+    counters = {key: value - before.get(key, 0)
+                for key, value in crawler.stats.counters().items()
+                if value != before.get(key, 0)}
+    return items, scheduled, counters
@@ -24,19 +24,14 @@ class PythonOrgCrawler(Crawlster):
         data = self.http.get(url)
         if not data:
             return
-        self.urls.mark_seen(url)
-        hrefs = self.extract.css(data.body, 'a', attr='href')
-        full_links = self.urls.multi_join(url, hrefs)
-        for link in full_links:
-            if '#' in link:
-                continue
+        for link in self.extract.links(data):
+            # duplicate links are dropped because of urls.dedup
             self.schedule(self.process_page, link)
 
     def process_page(self, url):
         if not self.urls.can_crawl(url):
             return
         resp = self.http.get(url)
-        self.urls.mark_seen(url)
         if not self.looks_like_module_page(resp.body):
             return
         module_name = self.extract.css(resp.body,
@@ -54,6 +49,7 @@ if __name__ == '__main__':
     crawler = PythonOrgCrawler(Configuration({
         "core.start_urls": ["https://docs.python.org/3/library/index.html"],
         "pool.workers": 3,
+        "urls.dedup": True,
     }))
     crawler.start()
     pprint.pprint(crawler.stats.dump())
@@ -25,7 +25,16 @@ setup(
     install_requires=requirements('base.txt'),
     extras_require={
         'advanced': [
-            'lxml'
+            'lxml',
+            'html5lib',
+            'selectolax'
+        ],
+        'http2': [
+            'httpx[http2]'
+        ],
+        'json': [
+            'orjson',
+            'pysimdjson'
         ]
     },
 
@@ -0,0 +1,50 @@
+import collections
+import types
+
+import pytest
+
+from crawlster.config import Configuration
+from crawlster.helpers.stats import StatsHelper
+
+
+class RecordingLog(object):
+    """Stands for the logging helper, keeps the messages by level"""
+
+    def __init__(self):
+        self.messages = collections.defaultdict(list)
+
+    def debug(self, message):
+        self.messages['debug'].append(message)
+
+    def info(self, message):
+        self.messages['info'].append(message)
+
+    def warning(self, message):
+        self.messages['warning'].append(message)
+
+    def error(self, message):
+        self.messages['error'].append(message)
+
+
+@pytest.fixture
+def init_helper():
+    """Returns a function that initializes a helper outside of a crawler
+
+    The function takes the helper, its option values and the helpers of the
+    fake crawler, besides the ``stats`` and ``log`` ones it always has. The
+    options of all the helpers are registered.
+    """
+
+    def init(helper, options=None, **crawler_helpers):
+        helper.config = Configuration(dict(options or {}))
+        helper.config.register_options(helper.config_options)
+        for other in crawler_helpers.values():
+            helper.config.register_options(
+                getattr(other, 'config_options', {}))
+        crawler_helpers.setdefault('stats', StatsHelper())
+        crawler_helpers.setdefault('log', RecordingLog())
+        helper.crawler = types.SimpleNamespace(**crawler_helpers)
+        helper.initialize()
+        return helper
+
+    return init
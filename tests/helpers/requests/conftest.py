@@ -0,0 +1,17 @@
+import pytest
+
+from crawlster.helpers.http.requests import RequestsHelper
+
+
+@pytest.fixture
+def make_helper(init_helper):
+    """Returns a function that creates an initialized RequestsHelper
+
+    The function takes the option values as keyword arguments. The stats
+    and the logged messages are available through ``helper.crawler``.
+    """
+
+    def make(**options):
+        return init_helper(RequestsHelper(), options)
+
+    return make
@@ -0,0 +1,91 @@
+"""Local HTTP server used by the tests of the http helper"""
+import contextlib
+import http.server
+import socketserver
+import threading
+
+
+class QuietHandler(http.server.BaseHTTPRequestHandler):
+    """Request handler that does not log and can reply in one call"""
+    protocol_version = 'HTTP/1.1'
+
+    def reply(self, status, headers, body):
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn,
+                          http.server.HTTPServer):
+    """HTTP server handling each connection in a thread
+
+    Same as the one of the standard library, which needs Python 3.7.
+    """
+    daemon_threads = True
+
+
+@contextlib.contextmanager
+def serve(handler_cls):
+    """Runs a server in a background thread, yields its base url"""
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler_cls)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield 'http://127.0.0.1:{}'.format(httpd.server_address[1])
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+class H2Handler(socketserver.BaseRequestHandler):
+    """Minimal HTTP/2 server (with prior knowledge) that echoes the path
+
+    The number of accepted connections is kept in ``connections``.
+    """
+    connections = 0
+
+    def handle(self):
+        import h2.config
+        import h2.connection
+        import h2.events
+
+        type(self).connections += 1
+        conn = h2.connection.H2Connection(
+            config=h2.config.H2Configuration(client_side=False))
+        conn.initiate_connection()
+        self.request.sendall(conn.data_to_send())
+        while True:
+            data = self.request.recv(65535)
+            if not data:
+                break
+            for event in conn.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    path = dict(event.headers)[b':path']
+                    conn.send_headers(event.stream_id, [
+                        (':status', '200'),
+                        ('content-length', str(len(path)))])
+                    conn.send_data(event.stream_id, path, end_stream=True)
+                elif isinstance(event, h2.events.ConnectionTerminated):
+                    return
+            self.request.sendall(conn.data_to_send())
+
+
+@contextlib.contextmanager
+def serve_h2():
+    """Runs a HTTP/2 server in a background thread, yields its base url"""
+    H2Handler.connections = 0
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), H2Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield 'http://127.0.0.1:{}'.format(server.server_address[1])
+    finally:
+        server.shutdown()
+        server.server_close()
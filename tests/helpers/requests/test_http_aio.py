@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+import pytest
+
+from crawlster.helpers import RequestsHelper
+from crawlster.helpers.http import transport
+from crawlster.helpers.http.aio import in_event_loop
+from tests.helpers.requests.server import QuietHandler, serve
+
+needs_httpx = pytest.mark.skipif(transport.httpx is None,
+                                 reason='httpx is not installed')
+
+
+class SlowHandler(QuietHandler):
+    """Replies after a while, failing the first request of /flaky"""
+    delay = 0.3
+    hits = 0
+
+    def do_GET(self):
+        if self.path == '/flaky':
+            type(self).hits += 1
+            if self.hits == 1:
+                self.reply(503, {'Retry-After': '0'}, b'fail')
+                return
+        time.sleep(self.delay)
+        self.reply(200, {}, self.path.encode() * 10)
+
+
+def run_async(helper, *coroutines):
+    """Runs the coroutines on a new event loop, returns their results"""
+    async def gather():
+        return await asyncio.gather(*coroutines)
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(gather())
+    finally:
+        loop.run_until_complete(helper.aio.aclose())
+        loop.close()
+        helper.finalize()
+
+
+@needs_httpx
+def test_async_requests_without_threads(make_helper, monkeypatch):
+    """The requests in flight are sent from the event loop"""
+    helper = make_helper(**{'http.max_in_flight': 8})
+
+    def blocking_open(http_request):
+        raise AssertionError('blocking request')
+
+    monkeypatch.setattr(helper, 'open', blocking_open)
+    with serve(SlowHandler) as url:
+        started = time.monotonic()
+        resps = run_async(helper, *(helper.aio.get('{}/{}'.format(url, i))
+                                    for i in range(8)))
+        elapsed = time.monotonic() - started
+    assert [resp.body for resp in resps] == \
+        ['/{}'.format(i).encode() * 10 for i in range(8)]
+    assert elapsed < 8 * SlowHandler.delay
+    assert not helper.aio.executor._threads
+    assert helper.crawler.stats.get(RequestsHelper.STAT_REQUESTS) == 8
+    assert helper.crawler.stats.get(RequestsHelper.STAT_DOWNLOAD) == 8 * 20
+
+
+@needs_httpx
+def test_async_requests_retries_and_body_limit(make_helper):
+    """The retries and the body limit apply to the async requests"""
+    SlowHandler.hits = 0
+    helper = make_helper(**{'http.retries': 1, 'http.retry_backoff': 0,
+                            'http.max_body_size': 12,
+                            'http.body_limit_action': 'truncate',
+                            'http.chunk_size': 4})
+    with serve(SlowHandler) as url:
+        resp, = run_async(helper, helper.aio.get(url + '/flaky'))
+    assert resp.status_code == 200
+    assert resp.body == b'/flaky/flaky'
+    assert resp.truncated
+    assert helper.crawler.stats.get(RequestsHelper.STAT_RETRIES) == 1
+    assert helper.crawler.stats.get(RequestsHelper.STAT_TRUNCATED) == 1
+
+
+@needs_httpx
+def test_async_requests_errors(make_helper):
+    """Connection errors are recorded without being raised"""
+    helper = make_helper()
+    with serve(SlowHandler) as url:
+        pass
+    resp, = run_async(helper, helper.aio.get(url))
+    assert resp is None
+    assert helper.crawler.stats.get(RequestsHelper.STAT_HTTP_ERRORS)
+
+
+def test_in_event_loop():
+    async def check():
+        return in_event_loop()
+
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.run_until_complete(check())
+    finally:
+        loop.close()
+    assert not in_event_loop()
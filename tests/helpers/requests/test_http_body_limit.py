@@ -0,0 +1,59 @@
+import pytest
+
+from crawlster.helpers import RequestsHelper
+from tests.helpers.requests.server import QuietHandler, serve
+
+BODY = b'x' * 1000
+
+
+class BigHandler(QuietHandler):
+    def do_GET(self):
+        if self.path == '/chunked':
+            self.send_response(200)
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for start in range(0, len(BODY), 100):
+                self.wfile.write(b'64\r\n' + BODY[start:start + 100] +
+                                 b'\r\n')
+            self.wfile.write(b'0\r\n\r\n')
+        else:
+            self.reply(200, {}, BODY)
+
+
+@pytest.fixture(scope='module')
+def server():
+    with serve(BigHandler) as url:
+        yield url
+
+
+@pytest.mark.parametrize('path', ['/', '/chunked'])
+def test_body_limit_abort(server, path, make_helper):
+    helper = make_helper(**{'http.max_body_size': 500,
+                            'http.chunk_size': 128})
+    assert helper.get(server + path) is None
+    assert helper.crawler.stats.get(RequestsHelper.STAT_ABORTED) == 1
+    [warning] = helper.crawler.log.messages['warning']
+    assert warning.startswith('Aborted the download of ' + server + path)
+    helper.finalize()
+
+
+@pytest.mark.parametrize('path', ['/', '/chunked'])
+def test_body_limit_truncate(server, path, make_helper):
+    helper = make_helper(**{'http.max_body_size': 500,
+                            'http.chunk_size': 128,
+                            'http.body_limit_action': 'truncate'})
+    resp = helper.get(server + path)
+    assert resp.body == BODY[:500]
+    assert resp.truncated
+    assert helper.crawler.stats.get(RequestsHelper.STAT_TRUNCATED) == 1
+    assert helper.crawler.log.messages['warning'] == [
+        'Truncated the body of {} to 500 bytes'.format(server + path)]
+    helper.finalize()
+
+
+def test_body_under_limit(server, make_helper):
+    helper = make_helper(**{'http.max_body_size': 1000})
+    resp = helper.get(server + '/chunked')
+    assert resp.body == BODY
+    assert not resp.truncated
+    helper.finalize()
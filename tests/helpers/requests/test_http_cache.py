@@ -0,0 +1,82 @@
+import pytest
+
+from crawlster.helpers import RequestsHelper
+from crawlster.helpers.http.cache import HttpCache
+from tests.helpers.requests.server import QuietHandler, serve
+
+
+class CachingHandler(QuietHandler):
+    """Serves a page with an ETag and a page that can not be stored"""
+    hits = []
+
+    def do_GET(self):
+        self.hits.append((self.path, self.headers.get('If-None-Match')))
+        if self.path == '/fresh':
+            self.reply(200, {'Cache-Control': 'max-age=60'}, b'fresh')
+        elif self.path == '/no-store':
+            self.reply(200, {'Cache-Control': 'no-store'}, b'no store')
+        elif self.headers.get('If-None-Match') == '"v1"':
+            self.reply(304, {'ETag': '"v1"'}, b'')
+        else:
+            self.reply(200, {'ETag': '"v1"', 'Cache-Control': 'no-cache'},
+                       b'revalidated')
+
+
+@pytest.fixture
+def server():
+    CachingHandler.hits = []
+    with serve(CachingHandler) as url:
+        yield url
+
+
+def test_http_cache_serves_fresh_responses(server, tmpdir, make_helper):
+    helper = make_helper(**{'http.cache_path': str(tmpdir.join('cache.db'))})
+    first = helper.get(server + '/fresh')
+    second = helper.get(server + '/fresh')
+    helper.finalize()
+    assert first.body == second.body == b'fresh'
+    assert second.headers['cache-control'] == 'max-age=60'
+    assert len(CachingHandler.hits) == 1
+    stats = helper.crawler.stats
+    assert stats.get(RequestsHelper.STAT_CACHE_HITS) == 1
+    assert stats.get(RequestsHelper.STAT_CACHE_MISSES) == 1
+    assert stats.get(RequestsHelper.STAT_CACHE_BYTES_SAVED) == 5
+
+
+def test_http_cache_revalidates(server, tmpdir, make_helper):
+    path = str(tmpdir.join('cache.db'))
+    helper = make_helper(**{'http.cache_path': path})
+    helper.get(server + '/etag')
+    helper.finalize()
+    # a new run reuses the cache on disk
+    helper = make_helper(**{'http.cache_path': path})
+    resp = helper.get(server + '/etag')
+    helper.finalize()
+    assert resp.status_code == 200
+    assert resp.body == b'revalidated'
+    assert CachingHandler.hits == [('/etag', None), ('/etag', '"v1"')]
+    assert helper.crawler.stats.get(RequestsHelper.STAT_CACHE_REVALIDATED) \
+        == 1
+
+
+def test_http_cache_no_store(server, tmpdir, make_helper):
+    helper = make_helper(**{'http.cache_path': str(tmpdir.join('cache.db'))})
+    helper.get(server + '/no-store')
+    helper.get(server + '/no-store')
+    helper.finalize()
+    assert len(CachingHandler.hits) == 2
+
+
+@pytest.mark.parametrize('headers, expected', [
+    ({'Cache-Control': 'public, max-age=100', 'Age': '40'}, 60),
+    ({'Cache-Control': 's-maxage=10, max-age=100'}, 10),
+    ({'Cache-Control': 'no-cache'}, 0),
+    ({'Cache-Control': 'no-store'}, None),
+    ({'Date': 'Mon, 01 Jan 2018 00:00:00 GMT',
+      'Expires': 'Mon, 01 Jan 2018 00:01:00 GMT'}, 60),
+    ({}, 5),
+])
+def test_http_cache_freshness_lifetime(tmpdir, headers, expected):
+    cache = HttpCache(str(tmpdir.join('cache.db')), default_ttl=5)
+    assert cache.freshness_lifetime(headers) == expected
+    cache.close()
@@ -0,0 +1,51 @@
+import gzip
+import zlib
+
+import pytest
+
+from crawlster.helpers import RequestsHelper
+from crawlster.helpers.http import compression
+from tests.helpers.requests.server import QuietHandler, serve
+
+BODY = b'<p>compressible</p>' * 100
+
+
+class GzipHandler(QuietHandler):
+    accept_encoding = []
+
+    def do_GET(self):
+        self.accept_encoding.append(self.headers.get('Accept-Encoding'))
+        self.reply(200, {'Content-Encoding': 'gzip'}, gzip.compress(BODY))
+
+
+@pytest.mark.parametrize('lazy', [True, False])
+def test_wire_and_decoded_bytes(lazy, make_helper):
+    helper = make_helper(**{'http.lazy_decode': lazy})
+    with serve(GzipHandler) as url:
+        resp = helper.get(url)
+    helper.finalize()
+    stats = helper.crawler.stats
+    assert GzipHandler.accept_encoding[-1] == compression.accept_encoding()
+    assert stats.get(RequestsHelper.STAT_DOWNLOAD) == resp.wire_size
+    assert resp.wire_size < len(BODY)
+    decoded = stats.dump().get(RequestsHelper.STAT_DOWNLOAD_DECODED)
+    assert decoded == (None if lazy else len(BODY))
+    assert resp.body == BODY
+    assert stats.get(RequestsHelper.STAT_DOWNLOAD_DECODED) == len(BODY)
+
+
+@pytest.mark.parametrize('codings, data', [
+    (['gzip'], gzip.compress(BODY[:50]) + gzip.compress(BODY[50:])),
+    (['deflate'], zlib.compress(BODY)),
+    (['deflate'], zlib.compress(BODY)[2:-4]),
+    (['deflate', 'gzip'], gzip.compress(zlib.compress(BODY))),
+])
+def test_decode(codings, data):
+    assert compression.decode(data, codings) == BODY
+
+
+def test_decode_unsupported():
+    with pytest.raises(ValueError):
+        compression.decode(BODY, ['compress'])
+    with pytest.raises(ValueError):
+        compression.decode(BODY, ['gzip'])
@@ -0,0 +1,122 @@
+import collections
+import socket
+import threading
+import time
+import types
+
+import pytest
+from urllib3.connection import HTTPConnection
+from urllib3.exceptions import NewConnectionError
+
+from crawlster.exceptions import ConfigurationError
+from crawlster.helpers import StatsHelper
+from crawlster.helpers.http import adapter
+from crawlster.helpers.http.dns import DnsCache, DnsPrefetcher
+from tests.helpers.requests.server import QuietHandler, serve
+
+ADDRESSES = [(socket.AF_INET, socket.SOCK_STREAM, 6, '',
+              ('127.0.0.1', 80))]
+
+
+class FakeResolver(object):
+    def __init__(self, delay=0):
+        self.calls = collections.Counter()
+        self.delay = delay
+
+    def __call__(self, host, port, family, type):
+        self.calls[host] += 1
+        time.sleep(self.delay)
+        if host == 'missing.test':
+            raise socket.gaierror(socket.EAI_NONAME, 'Name not known')
+        return ADDRESSES
+
+
+def test_dns_cache_ttl():
+    resolver = FakeResolver()
+    cache = DnsCache(StatsHelper(), ttl=0.05, resolver=resolver)
+    assert cache.resolve('a.test', 80) == ADDRESSES
+    assert cache.resolve('a.test', 80) == ADDRESSES
+    assert resolver.calls['a.test'] == 1
+    assert cache.hit_rate() == 0.5
+    time.sleep(0.06)
+    cache.resolve('a.test', 80)
+    assert resolver.calls['a.test'] == 2
+
+
+def test_dns_cache_negative():
+    resolver = FakeResolver()
+    cache = DnsCache(StatsHelper(), negative_ttl=60, resolver=resolver)
+    for _ in range(2):
+        with pytest.raises(socket.gaierror):
+            cache.resolve('missing.test', 80)
+    assert resolver.calls['missing.test'] == 1
+
+
+def test_dns_cache_coalesces_lookups():
+    resolver = FakeResolver(delay=0.05)
+    cache = DnsCache(StatsHelper(), resolver=resolver)
+    threads = [threading.Thread(target=cache.resolve, args=('a.test', 80))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert resolver.calls['a.test'] == 1
+
+
+def test_dns_cache_eviction():
+    resolver = FakeResolver()
+    cache = DnsCache(StatsHelper(), max_entries=2, resolver=resolver)
+    for host in ('a.test', 'b.test', 'a.test', 'c.test', 'a.test', 'b.test'):
+        cache.resolve(host, 80)
+    assert resolver.calls == {'a.test': 1, 'b.test': 2, 'c.test': 1}
+
+
+def test_dns_prefetch():
+    resolver = FakeResolver()
+    cache = DnsCache(StatsHelper(), resolver=resolver)
+    prefetcher = DnsPrefetcher(cache)
+    job = types.SimpleNamespace(url='https://a.test/page')
+    prefetcher.job_added(job)
+    prefetcher.job_added(types.SimpleNamespace(url='http://127.0.0.1/'))
+    prefetcher.executor.shutdown(wait=True)
+    assert cache.is_cached('a.test', 443)
+    assert resolver.calls == {'a.test': 1}
+
+
+class OkHandler(QuietHandler):
+    def do_GET(self):
+        self.reply(200, {}, b'ok')
+
+
+def test_connections_use_dns_cache(make_helper):
+    helper = make_helper()
+    with serve(OkHandler) as url:
+        url = url.replace('127.0.0.1', 'localhost')
+        assert helper.get(url).body == b'ok'
+    helper.finalize()
+    assert helper.crawler.stats.get(DnsCache.STAT_MISSES) == 1
+    assert helper.dns_cache.is_cached('localhost', int(url.split(':')[-1]))
+
+
+class FailingCache(object):
+    def resolve(self, host, port):
+        raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+
+
+@pytest.mark.parametrize('name_resolution_error', [True, False])
+def test_resolution_errors(monkeypatch, name_resolution_error):
+    """The errors of urllib3 < 2, without NameResolutionError, are raised"""
+    if not name_resolution_error:
+        monkeypatch.setattr(adapter, 'NameResolutionError', None)
+    connection_cls = type('Connection', (adapter.CachedDnsMixin,
+                                         HTTPConnection),
+                          {'dns_cache': FailingCache()})
+    with pytest.raises(NewConnectionError) as error:
+        connection_cls('missing.test', 80)._new_conn()
+    assert 'missing.test' in str(error.value)
+
+
+def test_dns_prefetch_refused_with_httpx(make_helper):
+    with pytest.raises(ConfigurationError):
+        make_helper(**{'http.transport': 'httpx', 'http.dns_prefetch': True})
@@ -0,0 +1,45 @@
+import threading
+
+from crawlster.helpers import RequestsHelper
+from tests.helpers.requests.server import QuietHandler, serve
+
+
+class OkHandler(QuietHandler):
+    def do_GET(self):
+        self.reply(200, {}, b'ok')
+
+
+def test_pool_size_defaults_to_workers(make_helper):
+    helper = make_helper(**{'core.workers': 32})
+    adapter = helper.get_session().get_adapter('http://localhost')
+    assert adapter._pool_maxsize == 32
+    assert adapter._pool_connections == 32
+    helper.finalize()
+
+
+def test_connections_are_reused(make_helper):
+    helper = make_helper()
+    with serve(OkHandler) as url:
+        for _ in range(5):
+            assert helper.get(url).body == b'ok'
+    helper.finalize()
+    stats = helper.crawler.stats
+    assert stats.get(RequestsHelper.STAT_CONNECTIONS_NEW) == 1
+    assert stats.get(RequestsHelper.STAT_CONNECTIONS_REUSED) == 4
+
+
+def test_session_per_thread(make_helper):
+    helper = make_helper(**{'http.session_per_thread': True})
+    sessions = []
+
+    def work():
+        sessions.append(helper.get_session())
+        sessions.append(helper.get_session())
+
+    threads = [threading.Thread(target=work) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(map(id, sessions))) == 3
+    helper.finalize()
@@ -1,7 +1,12 @@
+import functools
+import gzip
+import pickle
+
 import pytest
 
 from crawlster.helpers.http.request import HttpRequest
 from crawlster.helpers.http.response import HttpResponse
+from crawlster.helpers.stats import StatsHelper
 
 
 @pytest.fixture
@@ -27,3 +32,44 @@ def test_http_response_init(request, status_code, headers, body, expected):
     resp = HttpResponse(request, status_code, headers, body)
     for k, v in expected.items():
         assert getattr(resp, k) == v
+
+
+def test_http_response_chunks():
+    resp = HttpResponse(HttpRequest('http://localhost'), 200, {}, b'abcdefg')
+    chunks = list(resp.iter_chunks(3))
+    assert [bytes(chunk) for chunk in chunks] == [b'abc', b'def', b'g']
+    assert all(chunk.obj is resp.body for chunk in chunks)
+    assert resp.body_view.tobytes() == b'abcdefg'
+
+
+def test_http_response_text_encoding():
+    body = '<p>Café</p>'.encode('cp1252')
+    resp = HttpResponse(HttpRequest('http://localhost'), 200,
+                        {'Content-Type': 'text/html; charset=windows-1252'},
+                        body)
+    assert resp.encoding == 'windows-1252'
+    assert resp.body_str == resp.text == '<p>Café</p>'
+    assert resp.extract.css('p', get_text=True) == ['Café']
+
+
+def test_http_response_body_setter():
+    resp = HttpResponse(HttpRequest('http://localhost'), 200, {},
+                        gzip.compress(b'<p>old</p>'), content_encoding='gzip')
+    assert resp.extract.css('p', get_text=True) == ['old']
+    resp.body = '<p>new</p>'
+    assert resp.body == resp.wire_body == b'<p>new</p>'
+    assert resp.text == '<p>new</p>'
+    assert resp.extract.css('p', get_text=True) == ['new']
+    with pytest.raises(TypeError):
+        resp.body = None
+
+
+def test_http_response_pickle_drops_decode_callback():
+    stats = StatsHelper()
+    resp = HttpResponse(HttpRequest('http://localhost'), 200, {},
+                        gzip.compress(b'<p>x</p>'), content_encoding='gzip',
+                        on_decode=functools.partial(stats.incr, 'decoded'))
+    restored = pickle.loads(pickle.dumps(resp))
+    assert restored.on_decode is None
+    assert restored.body == b'<p>x</p>'
+    assert resp.on_decode is not None
@@ -0,0 +1,96 @@
+import time
+
+import pytest
+
+from crawlster.helpers import RequestsHelper
+from crawlster.helpers.http.retry import RetryPolicy, CircuitBreaker
+from tests.helpers.requests.server import QuietHandler, serve
+
+
+class FlakyHandler(QuietHandler):
+    """Fails the first requests of each path with the status in the path"""
+    failures = 2
+    hits = {}
+
+    def do_GET(self):
+        hits = self.hits[self.path] = self.hits.get(self.path, 0) + 1
+        if hits <= self.failures:
+            self.reply(int(self.path.strip('/')), {'Retry-After': '0'},
+                       b'fail')
+        else:
+            self.reply(200, {}, b'ok')
+
+
+@pytest.fixture
+def server():
+    FlakyHandler.hits = {}
+    with serve(FlakyHandler) as url:
+        yield url
+
+
+def test_retries_until_success(server, make_helper):
+    helper = make_helper(**{'http.retries': 3, 'http.retry_backoff': 0.01})
+    resp = helper.get(server + '/503')
+    helper.finalize()
+    assert resp.body == b'ok'
+    assert helper.crawler.stats.get(RequestsHelper.STAT_RETRIES) == 2
+    assert helper.crawler.stats.get(RequestsHelper.STAT_REQUESTS) == 3
+
+
+def test_retries_exhausted(server, make_helper):
+    helper = make_helper(**{'http.retries': 1, 'http.retry_backoff': 0.01})
+    resp = helper.get(server + '/429')
+    helper.finalize()
+    assert resp.status_code == 429
+    assert FlakyHandler.hits['/429'] == 2
+
+
+def test_not_retryable_status(server, make_helper):
+    helper = make_helper(**{'http.retries': 3})
+    assert helper.get(server + '/404').status_code == 404
+    helper.finalize()
+    assert FlakyHandler.hits['/404'] == 1
+
+
+def test_breaker_rejects_failing_host(server, make_helper):
+    helper = make_helper(**{'http.breaker_threshold': 2,
+                            'http.breaker_cooldown': 60})
+    helper.get(server + '/500')
+    helper.get(server + '/500')
+    assert helper.get(server + '/500') is None
+    helper.finalize()
+    stats = helper.crawler.stats
+    assert FlakyHandler.hits['/500'] == 2
+    assert stats.get(RequestsHelper.STAT_BREAKER_TRIPS) == 1
+    assert stats.get(RequestsHelper.STAT_BREAKER_REJECTED) == 1
+    assert helper.crawler.log.messages['warning'][-1].startswith(
+        'Skipped {}/500: too many failures'.format(server))
+
+
+def test_breaker_half_open():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.05)
+    assert breaker.record_failure('a.com')
+    assert not breaker.allow('a.com')
+    assert breaker.allow('b.com')
+    time.sleep(0.06)
+    assert breaker.allow('a.com')
+    # a single trial request is let through
+    assert not breaker.allow('a.com')
+    assert breaker.record_failure('a.com')
+    assert not breaker.allow('a.com')
+    time.sleep(0.06)
+    assert breaker.allow('a.com')
+    breaker.record_success('a.com')
+    assert breaker.get_state('a.com') == CircuitBreaker.CLOSED
+
+
+def test_retry_delay():
+    policy = RetryPolicy(5, backoff=1, max_delay=5, statuses=[503],
+                         jitter=0.5)
+    for attempt, base in enumerate([1, 2, 4]):
+        assert base / 2 <= policy.get_delay(attempt) <= base
+    assert policy.get_delay(10) == 5
+    assert policy.get_delay(0, retry_after='3') == 3
+    assert policy.get_delay(0, retry_after='120') == 5
+    assert policy.get_delay(0, retry_after='Wed, 21 Oct 2015 07:28:00 GMT') \
+        == 0
@@ -0,0 +1,33 @@
+import threading
+
+import pytest
+
+from tests.helpers.requests.server import H2Handler, serve_h2
+
+httpx = pytest.importorskip('httpx')
+pytest.importorskip('h2')
+
+
+def test_httpx_transport_multiplexes_requests(make_helper):
+    """Concurrent requests to a host share a single HTTP/2 connection"""
+    helper = make_helper(**{'http.transport': 'httpx',
+                            'http.http2_prior_knowledge': True,
+                            'core.workers': 8})
+    bodies = []
+
+    with serve_h2() as url:
+        def work(index):
+            bodies.append(helper.get('{}/{}'.format(url, index)).body)
+
+        threads = [threading.Thread(target=work, args=(index,))
+                   for index in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        helper.finalize()
+    assert sorted(bodies) == sorted('/{}'.format(i).encode()
+                                    for i in range(8))
+    assert H2Handler.connections == 1
+    # httpx does its own lookups
+    assert helper.dns_cache is None
@@ -0,0 +1,51 @@
+import codecs
+
+import pytest
+
+from crawlster.helpers import charset
+from crawlster.helpers.extract import Content, PARSERS
+
+TEXT = '<p>Café crème</p>'
+
+
+@pytest.mark.parametrize('data, content_type, expected', [
+    (codecs.BOM_UTF8 + TEXT.encode(), 'text/html; charset=latin-1', 'utf-8'),
+    (codecs.BOM_UTF16_LE + TEXT.encode('utf-16-le'), None, 'utf-16-le'),
+    (TEXT.encode('cp1252'), 'text/html; charset="ISO-8859-1"',
+     'windows-1252'),
+    ('<p>Привет</p>'.encode('koi8-r'), 'text/html;charset=koi8-r', 'koi8-r'),
+    (b'<meta charset="shift_jis">' + TEXT.encode('cp1252'), None,
+     'shift_jis'),
+    (b'<meta http-equiv="Content-Type" content="text/html; '
+     b'charset=iso-8859-2">', 'text/html', 'iso8859-2'),
+    (b'<meta charset="utf-16">', None, 'utf-8'),
+    (TEXT.encode(), 'text/html; charset=unknown', 'utf-8'),
+])
+def test_detect_encoding(data, content_type, expected):
+    assert charset.detect_encoding(data, content_type) == expected
+
+
+def test_sniff_encoding_without_declaration():
+    assert charset.sniff_encoding(TEXT.encode()) == 'utf-8'
+    assert charset.sniff_encoding(b'\xff\xfe\xfd\x80') is not None
+
+
+def test_sniff_encoding_checks_a_prefix(monkeypatch):
+    """Only the first bytes are checked, even if they end mid-character"""
+    monkeypatch.setattr(charset, 'SNIFF_SIZE', 8)
+    data = '<p>Cafe\u00e9</p>'.encode()
+    # the first 8 bytes end in the middle of the \u00e9
+    assert charset.sniff_encoding(data + b'\xff') == 'utf-8'
+    # unless the document ends there
+    assert charset.sniff_encoding(data[:8]) != 'utf-8'
+
+
+@pytest.mark.parametrize('parser', sorted(PARSERS))
+def test_content_decodes_declared_encoding(parser):
+    if not PARSERS[parser].available:
+        pytest.skip('{} parser not installed'.format(parser))
+    data = '<meta charset="windows-1252"><p>Café crème</p>'.encode('cp1252')
+    content = Content(data, parser)
+    assert content.encoding == 'windows-1252'
+    assert content.css('p', get_text=True) == ['Café crème']
+    assert content.text.endswith(TEXT)
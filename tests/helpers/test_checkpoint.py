@@ -0,0 +1,186 @@
+import pickle
+import threading
+
+import pytest
+
+from crawlster.config import Configuration
+from crawlster.core import Crawlster, start
+from crawlster.handlers.base import BaseItemHandler
+from crawlster.helpers import StatsHelper, UrlsHelper, QueueHelper
+from crawlster.helpers.checkpoint import CheckpointHelper
+from crawlster.helpers.seen import ScalableBloomFilter
+
+
+class ListHandler(BaseItemHandler):
+    def __init__(self):
+        super(ListHandler, self).__init__()
+        self.items = []
+
+    def handle(self, item):
+        self.items.append(item)
+
+
+class ResumableCrawler(Crawlster):
+    stats = StatsHelper()
+    urls = UrlsHelper()
+    queue = QueueHelper()
+
+    @start
+    def step_start(self, url):
+        self.urls.mark_seen(url)
+        for index in range(3):
+            self.schedule(self.step_child, url, index)
+
+    def step_child(self, url, index):
+        self.stats.incr('children')
+        return {'url': url, 'index': index}
+
+
+def make_crawler(path, resume, **options):
+    ResumableCrawler.item_handler = ListHandler()
+    opts = {
+        'core.start_urls': ['http://localhost/'],
+        'core.workers': 1,
+        'log.level': 'warning',
+        'checkpoint.path': path,
+        'checkpoint.resume': resume
+    }
+    opts.update(options)
+    return ResumableCrawler(Configuration(opts))
+
+
+def child_state(job_id, index):
+    return {'type': 'func', 'id': job_id, 'step': 'step_child',
+            'args': ('http://localhost/', index), 'kwargs': {},
+            'priority': None, 'depth': 1}
+
+
+def test_checkpoint_journal(tmp_path):
+    """A finished crawl leaves no pending jobs in the journal"""
+    path = str(tmp_path / 'crawl.journal')
+    crawler = make_crawler(path, False)
+    crawler.start()
+    pending, seen, stats = CheckpointHelper.load(path)
+    assert pending == []
+    assert seen == {'http://localhost/'}
+    assert stats['children'] == 3
+
+
+def test_checkpoint_resume(tmp_path):
+    """Only the unfinished jobs are processed when resuming"""
+    path = str(tmp_path / 'crawl.journal')
+    with open(path, 'wb') as fp:
+        pickle.dump([('job', 0, child_state(0, 0)),
+                     ('job', 1, child_state(1, 1)),
+                     ('seen', 'http://localhost/'),
+                     ('done', 0),
+                     ('stats', {'children': 1})], fp)
+        # an interrupted checkpoint
+        fp.write(pickle.dumps([('done', 1)])[:-3])
+    crawler = make_crawler(path, True)
+    crawler.start()
+    assert crawler.item_handler.items == [
+        {'url': 'http://localhost/', 'index': 1}]
+    assert crawler.urls.seen('http://localhost/')
+    assert crawler.stats.get('children') == 2
+    pending, seen, stats = CheckpointHelper.load(path)
+    assert pending == []
+    assert stats['children'] == 2
+
+
+@pytest.mark.parametrize('tail', [
+    pickle.dumps([('done', 1)])[:-3],
+    # a cut inside a string or a global name
+    pickle.dumps([('seen', 'http://localhost/page')])[:12],
+    b'\x80\x04\x95\x05\x00\x00\x00\x00\x00\x00\x00c'
+])
+def test_checkpoint_truncated_tail(tmp_path, tail):
+    path = str(tmp_path / 'crawl.journal')
+    with open(path, 'wb') as fp:
+        pickle.dump([('job', 0, child_state(0, 0))], fp)
+        fp.write(tail)
+    pending, _, _ = CheckpointHelper.load(path)
+    assert pending == [child_state(0, 0)]
+
+
+def test_checkpoint_bloom_filter(tmp_path):
+    """The bloom filter is saved instead of journaling the seen urls"""
+    path = str(tmp_path / 'crawl.journal')
+    options = {'urls.seen_backend': 'bloom', 'urls.seen_capacity': 1000}
+    crawler = make_crawler(path, False, **options)
+    crawler.start()
+    assert CheckpointHelper.load(path)[1] == set()
+    assert 'http://localhost/' in ScalableBloomFilter.load(path + '.seen')
+
+    # resumed with a pending job
+    with open(path, 'ab') as fp:
+        pickle.dump([('job', 7, child_state(7, 5))], fp)
+    crawler = make_crawler(path, True, **options)
+    crawler.start()
+    assert crawler.item_handler.items == [
+        {'url': 'http://localhost/', 'index': 5}]
+    assert crawler.urls.seen('http://localhost/')
+    assert isinstance(crawler.urls.already_seen, ScalableBloomFilter)
+
+
+class StateJob(object):
+    def __init__(self, state):
+        self.state = state
+
+    def to_state(self):
+        return self.state
+
+
+class FailingJournal(object):
+    """Journal file whose next write fails after writing a few bytes"""
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.fail = True
+
+    def write(self, data):
+        if self.fail:
+            self.fail = False
+            self.fp.write(data[:5])
+            raise OSError('No space left on device')
+        return self.fp.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.fp, name)
+
+
+def test_checkpoint_failures_keep_the_records(tmp_path, init_helper):
+    """A failed checkpoint is written again, unpicklable jobs are skipped"""
+    path = str(tmp_path / 'crawl.journal')
+    helper = init_helper(CheckpointHelper(), {'checkpoint.path': path},
+                         queue=QueueHelper(), urls=UrlsHelper())
+    helper._fp = FailingJournal(open(path, 'ab'))
+    helper.job_added(StateJob(child_state(0, 0)))
+    helper.job_added(StateJob({'lock': threading.Lock()}))
+    helper.safe_checkpoint()
+    assert 'Could not write the checkpoint' in \
+        helper.crawler.log.messages['error'][-1]
+    assert CheckpointHelper.load(path)[0] == []
+    helper.safe_checkpoint()
+    helper._fp.close()
+    assert CheckpointHelper.load(path)[0] == [child_state(0, 0)]
+    assert 'Could not checkpoint' in helper.crawler.log.messages['error'][0]
+
+
+def test_checkpoint_bloom_filter_save_interval(tmp_path, init_helper):
+    """The whole filter is not rewritten at each checkpoint"""
+    path = str(tmp_path / 'crawl.journal')
+    options = {'checkpoint.path': path, 'urls.seen_backend': 'bloom',
+               'urls.seen_capacity': 1000}
+    urls = init_helper(UrlsHelper(), options)
+    helper = init_helper(CheckpointHelper(), options, queue=QueueHelper(),
+                         urls=urls)
+    urls.mark_seen('http://localhost/1')
+    helper.checkpoint_filter()
+    urls.mark_seen('http://localhost/2')
+    helper.checkpoint_filter()
+    saved = ScalableBloomFilter.load(path + '.seen')
+    assert 'http://localhost/1' in saved
+    assert 'http://localhost/2' not in saved
+    helper.checkpoint_filter(force=True)
+    assert 'http://localhost/2' in ScalableBloomFilter.load(path + '.seen')
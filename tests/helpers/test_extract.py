@@ -1,6 +1,13 @@
+import pickle
+import types
+
 import pytest
 
-from crawlster.helpers.extract import ExtractHelper
+from crawlster.config import Configuration
+from crawlster.exceptions import ConfigurationError
+from crawlster.helpers.extract import ExtractHelper, Content, Field, PARSERS
+from crawlster.helpers.http.response import HttpResponse
+from crawlster.helpers.stats import StatsHelper
 
 CONTENT_1 = """<ul>
 <li><a href="https://www.reddit.com/user/roddit-list/m/top"><strong>Top</strong></a></li>
@@ -24,3 +31,116 @@ def test_content_css_extraction(helper: ExtractHelper):
         assert href.startswith('http')
     texts = helper.css(CONTENT_1, 'li > a', content=True)
     assert texts == ['Top', 'Active', 'Inactive']
+
+
+@pytest.mark.parametrize('parser', sorted(PARSERS))
+def test_content_css_same_results_for_all_parsers(parser):
+    """All the parser backends extract the same attributes and texts"""
+    if not PARSERS[parser].available:
+        pytest.skip('{} parser not installed'.format(parser))
+    content = Content(CONTENT_1 + '<p class="a b" hidden>x</p>', parser)
+    reference = Content(CONTENT_1 + '<p class="a b" hidden>x</p>')
+    for selector, attr, text in [('li > a', 'href', False),
+                                 ('li > a', None, True),
+                                 ('p', 'class', False),
+                                 ('p', 'hidden', False),
+                                 ('li strong', None, True)]:
+        assert content.css(selector, attr, text) == \
+            reference.css(selector, attr, text)
+    assert len(content.css('li')) == 3
+
+
+def test_extract_helper_missing_parser(monkeypatch, helper):
+    monkeypatch.setattr(PARSERS['lxml'], 'available', False)
+    helper.config = Configuration({'extract.parser': 'lxml'})
+    helper.config.register_options(helper.config_options)
+    with pytest.raises(ConfigurationError):
+        helper.initialize()
+
+
+def test_extract_helper_parses_documents_once(helper, monkeypatch):
+    helper.config = Configuration({'extract.cache_size': 1})
+    helper.config.register_options(helper.config_options)
+    helper.crawler = types.SimpleNamespace(stats=StatsHelper())
+    helper.initialize()
+    parsed = []
+    parse = PARSERS['html.parser'].parse
+    monkeypatch.setattr(
+        PARSERS['html.parser'], 'parse',
+        lambda data, encoding: parsed.append(data) or parse(data, encoding))
+    helper.css(CONTENT_1, 'a')
+    helper.css(CONTENT_1, 'li', content=True)
+    assert len(parsed) == 1
+    helper.css('<p>other</p>', 'p')
+    helper.css(CONTENT_1, 'a')
+    assert len(parsed) == 3
+    response = HttpResponse(None, 200, {}, CONTENT_1.encode())
+    helper.css(response, 'a')
+    helper.css(response, 'li')
+    assert response.extract.css('strong', get_text=True) == ['Top']
+    assert len(parsed) == 4
+    stats = helper.crawler.stats
+    assert stats.get(ExtractHelper.STAT_CACHE_HITS) == 2
+    assert stats.get(ExtractHelper.STAT_CACHE_MISSES) == 4
+
+
+def test_parsed_response_pickle():
+    """Responses can still be pickled once their document was parsed"""
+    response = HttpResponse(None, 200, {}, CONTENT_1.encode())
+    assert response.extract.css('strong', get_text=True) == ['Top']
+    restored = pickle.loads(pickle.dumps(response))
+    assert not restored.extract.is_parsed()
+    assert restored.extract.css('strong', get_text=True) == ['Top']
+
+
+@pytest.mark.parametrize('parser', sorted(PARSERS))
+def test_content_item(parser):
+    """The fields have the values of the matching css() calls"""
+    if not PARSERS[parser].available:
+        pytest.skip('{} parser not installed'.format(parser))
+    content = Content(CONTENT_1, parser)
+    item = content.item({
+        'first': 'li > a',
+        'strong': 'strong::text',
+        'href': 'a::attr(href)',
+        'texts': ['li > a::text'],
+        'hrefs': ['a::attr(href)'],
+        'missing': Field('a', attr='title', default='-'),
+        'none': 'table',
+        'empty': ['table']
+    })
+    assert item == {
+        'first': 'Top',
+        'strong': 'Top',
+        'href': content.css('a', get_attr='href')[0],
+        'texts': content.css('li > a', get_text=True),
+        'hrefs': content.css('a', get_attr='href'),
+        'missing': '-',
+        'none': None,
+        'empty': []
+    }
+
+
+@pytest.mark.parametrize('parser', sorted(PARSERS))
+def test_content_item_list_default(parser):
+    """The default of a list field is copied for each item"""
+    if not PARSERS[parser].available:
+        pytest.skip('{} parser not installed'.format(parser))
+    default = ['-']
+    fields = {'titles': Field('a', attr='title', many=True, default=default),
+              'texts': Field('li > a', many=True, default=default)}
+    for _ in range(2):
+        item = Content(CONTENT_1, parser).item(fields)
+        assert item['titles'] == ['-']
+        assert item['titles'] is not default
+        assert item['texts'] == ['Top', 'Active', 'Inactive']
+    assert default == ['-']
+
+
+def test_field_from_spec():
+    field = Field.from_spec(['ul > li a::attr(href)'])
+    assert (field.selector, field.attr, field.many) == \
+        ('ul > li a', 'href', True)
+    assert Field.from_spec('h1').attr is None
+    with pytest.raises(ValueError):
+        Field.from_spec(['a', 'b'])
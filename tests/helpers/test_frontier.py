@@ -0,0 +1,207 @@
+import collections
+import threading
+import time
+
+import pytest
+
+from crawlster.helpers.frontier import FifoFrontier, HostFrontier, \
+    PriorityFrontier, SpillingFrontier
+
+Job = collections.namedtuple('Job', 'url')
+
+
+def pop_all(frontier):
+    items = []
+    while True:
+        try:
+            items.append(frontier.pop())
+        except IndexError:
+            return items
+
+
+def test_host_frontier_round_robin():
+    """Hosts take turns, one host can not starve the others"""
+    frontier = HostFrontier(FifoFrontier, concurrency=10)
+    for index in range(3):
+        frontier.push(Job('http://a.com/{}'.format(index)))
+    frontier.push(Job('http://b.com/0'))
+    frontier.push(Job('http://c.com/0'))
+    hosts = [job.url.split('/')[2] for job in pop_all(frontier)]
+    assert hosts == ['a.com', 'b.com', 'c.com', 'a.com', 'a.com']
+    assert len(frontier) == 0
+
+
+def test_host_frontier_concurrency():
+    """A host is not ready while it has too many jobs in progress"""
+    frontier = HostFrontier(FifoFrontier, concurrency=1)
+    first, second = Job('http://a.com/1'), Job('http://a.com/2')
+    frontier.push(first)
+    frontier.push(second)
+    frontier.push(Job(None))
+    assert pop_all(frontier) == [first, Job(None)]
+    assert frontier.next_ready() is None
+    frontier.done(first)
+    assert frontier.next_ready() == 0
+    assert pop_all(frontier) == [second]
+
+
+def test_host_frontier_rate():
+    """A host is delayed when it exceeds its rate"""
+    frontier = HostFrontier(FifoFrontier, rate=20)
+    for index in range(2):
+        frontier.push(Job('http://a.com/{}'.format(index)))
+    assert len(pop_all(frontier)) == 1
+    delay = frontier.next_ready()
+    assert 0 < delay <= 0.05
+    time.sleep(delay)
+    assert len(pop_all(frontier)) == 1
+
+
+@pytest.mark.parametrize('burst', [1, 3])
+def test_host_frontier_burst(burst):
+    frontier = HostFrontier(FifoFrontier, rate=0.1, burst=burst)
+    for index in range(5):
+        frontier.push(Job('http://a.com/{}'.format(index)))
+    assert len(pop_all(frontier)) == burst
+
+
+def test_host_frontier_releases_idle_hosts():
+    """The hosts without pending or in progress jobs are not kept"""
+    frontier = HostFrontier(FifoFrontier, concurrency=2)
+    job = Job('http://a.com/1')
+    frontier.push(job)
+    assert pop_all(frontier) == [job]
+    assert len(frontier._lanes) == 1
+    frontier.done(job)
+    assert frontier._lanes == {}
+
+
+def test_host_frontier_releases_rate_limited_hosts_once_refilled():
+    """A rate limited host is kept until its rate would allow a burst"""
+    frontier = HostFrontier(FifoFrontier, rate=20)
+    job = Job('http://b.com/1')
+    frontier.push(job)
+    frontier.set_host_rate('b.com', 10)
+    assert pop_all(frontier) == [job]
+    frontier.done(job)
+    frontier.push(Job('http://b.com/2'))
+    assert pop_all(frontier) == []
+    assert 0.05 < frontier.next_ready() <= 0.1
+    time.sleep(frontier.next_ready())
+    job = pop_all(frontier)[0]
+    frontier.done(job)
+    assert 'b.com' in frontier._lanes
+    time.sleep(0.11)
+    with pytest.raises(IndexError):
+        frontier.pop()
+    assert frontier._lanes == {}
+    # the rate override is dropped along with the host state
+    frontier.push(Job('http://b.com/3'))
+    assert frontier._lanes['b.com'].rate == 20
+
+
+def test_host_frontier_host_rate_needs_host_state():
+    """The rate of a host without jobs is not kept"""
+    frontier = HostFrontier(FifoFrontier, rate=20)
+    assert not frontier.set_host_rate('a.com', 10)
+    assert frontier._lanes == {}
+    frontier.push(Job('http://a.com/1'))
+    assert frontier.set_host_rate('a.com', 10)
+    assert not frontier.set_host_rate('a.com', 10)
+    assert frontier._lanes['a.com'].rate == 10
+
+
+PriorityJob = collections.namedtuple('PriorityJob', 'name priority depth')
+
+
+def test_priority_frontier_order():
+    """Higher priority first, then shallow first, then insertion order"""
+    frontier = PriorityFrontier()
+    jobs = [PriorityJob('deep', None, 3), PriorityJob('low', -10, 0),
+            PriorityJob('start', None, 0), PriorityJob('high', 5.5, 2),
+            PriorityJob('deep2', None, 3)]
+    for job in jobs:
+        frontier.push(job)
+    assert frontier.band_sizes() == {-3: 2, -10: 1, 0: 1, 5: 1}
+    names = [job.name for job in pop_all(frontier)]
+    assert names == ['high', 'start', 'deep', 'deep2', 'low']
+    assert frontier.band_sizes() == {}
+
+
+def test_priority_frontier_scorer():
+    frontier = PriorityFrontier(scorer=lambda job: len(job.name))
+    for name in ('a', 'abc', 'ab'):
+        frontier.push(PriorityJob(name, None, 0))
+    assert [job.name for job in pop_all(frontier)] == ['abc', 'ab', 'a']
+
+
+@pytest.mark.parametrize('lifo', [False, True])
+def test_spilling_frontier_order(tmp_path, lifo):
+    """Spilled jobs come back in the order of the strategy"""
+    frontier = SpillingFrontier(lifo, max_resident=4, batch=2,
+                                dump=lambda i: {'i': i},
+                                load=lambda state: state['i'],
+                                directory=str(tmp_path))
+    for item in range(10):
+        frontier.push(item)
+    assert len(frontier) == 10
+    assert frontier.spilled_count() >= 6
+    popped = [frontier.pop() for _ in range(3)]
+    for item in range(10, 13):
+        frontier.push(item)
+    popped += pop_all(frontier)
+    if lifo:
+        assert popped == [9, 8, 7, 12, 11, 10, 6, 5, 4, 3, 2, 1, 0]
+    else:
+        assert popped == list(range(13))
+    assert len(frontier) == 0
+    assert frontier.spilled_count() == 0
+    frontier.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize('lifo', [False, True])
+def test_spilling_frontier_write_failure(tmp_path, lifo):
+    """Jobs that can not be spilled stay in memory"""
+    def dump(item):
+        # not picklable
+        return {'i': item, 'lock': threading.Lock() if item == 2 else None}
+
+    frontier = SpillingFrontier(lifo, max_resident=2, batch=2, dump=dump,
+                                load=lambda state: state['i'],
+                                directory=str(tmp_path))
+    failed = []
+    for item in range(5):
+        try:
+            frontier.push(item)
+        except TypeError:
+            failed.append(item)
+    assert failed
+    assert len(frontier) == 5 - len(failed)
+    assert sorted(pop_all(frontier) + failed) == list(range(5))
+    frontier.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_host_frontier_resident_limit_across_hosts(tmp_path):
+    """The jobs over the limit wait on disk, whatever their host"""
+    overflow = SpillingFrontier(False, max_resident=2, batch=2,
+                                dump=lambda job: job.url,
+                                load=Job, directory=str(tmp_path))
+    frontier = HostFrontier(FifoFrontier, concurrency=1, max_resident=3,
+                            overflow=overflow)
+    jobs = [Job('http://host{}.com/'.format(index)) for index in range(10)]
+    for job in jobs:
+        frontier.push(job)
+    assert len(frontier) == 10
+    assert frontier.resident_count() == 3
+    assert frontier.spilled_count() == 5
+    popped = []
+    while len(frontier):
+        job = frontier.pop()
+        assert frontier.resident_count() <= 3
+        frontier.done(job)
+        popped.append(job)
+    assert popped == jobs
+    frontier.close()
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,78 @@
+import pytest
+
+from crawlster.helpers import jsonlib
+from crawlster.helpers.extract import ExtractHelper
+from crawlster.helpers.http.request import HttpRequest
+from crawlster.helpers.http.response import HttpResponse
+from crawlster.helpers.jsonpath import compile_path, find
+
+DOCUMENT = b"""{
+    "data": {
+        "items": [
+            {"id": 1, "name": "one", "tags": ["a", "b"]},
+            {"id": 2, "name": "two", "meta": {"id": 20}}
+        ],
+        "a/b": {"~c": true}
+    },
+    "total": 2
+}"""
+
+
+@pytest.fixture(params=sorted(jsonlib.LOADERS))
+def backend(request):
+    return request.param
+
+
+@pytest.mark.parametrize('path, expected', [
+    ('$', [jsonlib.loads(DOCUMENT)]),
+    ('$.total', [2]),
+    ('$.data.items[0].name', ['one']),
+    ("$['data']['items'][-1].id", [2]),
+    ('$.data.items[*].id', [1, 2]),
+    ('$.data.items[0].tags', [['a', 'b']]),
+    ('$.data.items[1].meta', [{'id': 20}]),
+    ('$..id', [1, 2, 20]),
+    ('$.data.items.*.name', ['one', 'two']),
+    ('$["data"]["a/b"]["~c"]', [True]),
+    ('$.data.items[5].id', []),
+    ('$.missing.id', []),
+    ('$.total.id', []),
+])
+def test_jsonpath_find(backend, path, expected):
+    assert find(DOCUMENT, path, backend) == expected
+
+
+@pytest.mark.parametrize('path', ['data.items', '$.data[', '$.[1]x'])
+def test_jsonpath_invalid(path):
+    with pytest.raises(ValueError):
+        compile_path(path)
+
+
+def test_response_json(backend):
+    resp = HttpResponse(HttpRequest('http://localhost'), 200,
+                        {'Content-Type': 'application/json'}, DOCUMENT)
+    assert resp.json(backend)['data']['items'][1]['name'] == 'two'
+    with pytest.raises(ValueError):
+        HttpResponse(None, 200, {}, b'{"a": ').json(backend)
+
+
+@pytest.mark.parametrize('charset', ['iso-8859-1', 'us-ascii', 'cp1252'])
+def test_response_json_declared_charset(backend, charset):
+    """Bodies declaring another charset than UTF-8 are decoded first"""
+    body = '{"n": "café"}'.encode('latin-1')
+    resp = HttpResponse(
+        HttpRequest('http://localhost'), 200,
+        {'Content-Type': 'application/json; charset=' + charset}, body)
+    assert resp.json(backend) == {'n': 'café'}
+    helper = ExtractHelper()
+    helper.json_backend = backend
+    assert helper.jsonpath(resp, '$.n') == ['café']
+
+
+def test_extract_helper_jsonpath():
+    resp = HttpResponse(HttpRequest('http://localhost'), 200, {}, DOCUMENT)
+    helper = ExtractHelper()
+    assert helper.jsonpath(resp, '$..name') == ['one', 'two']
+    assert helper.jsonpath(resp, '$.total', first=True) == 2
+    assert helper.jsonpath({'a': [1]}, '$.a[0]') == [1]
+    assert helper.jsonpath(DOCUMENT, '$.nothing', first=True) is None
@@ -0,0 +1,61 @@
+import urllib.parse
+
+import pytest
+
+from crawlster.helpers.links import extract_links, make_joiner
+
+PAGE = b"""<!DOCTYPE html>
+<html><head><title>a <a href="/title"> b</title>
+<link rel="stylesheet" href="/style.css">
+<script>document.write('<a href="/script">');</script>
+</head><body>
+<!-- <a href="/comment"> -->
+<A HREF='page?a=1&amp;b=2'>one</A>
+<a class="x" href = "  /two " rel="nofollow noopener">two</a>
+<a name="anchor">no href</a>
+<map><area href="http://other.com/area" alt=""></map>
+<img src="/image.png">
+<a href=three>three</a>
+</body></html>"""
+
+
+def test_extract_links():
+    """Comments and the content of raw text elements are skipped"""
+    base = 'http://example.com/dir/index.html'
+    assert extract_links(PAGE, base) == [
+        'http://example.com/dir/page?a=1&b=2',
+        'http://example.com/two',
+        'http://other.com/area',
+        'http://example.com/dir/three'
+    ]
+
+
+def test_extract_links_base_href():
+    page = b'<base href="http://cdn.com/root/"><a href="x">x</a>'
+    assert extract_links(page, 'http://example.com/') == [
+        'http://cdn.com/root/x']
+    page = b'<a href="x">x</a><base href="/sub/"><base href="/other/">'
+    assert extract_links(page, 'http://example.com/a/') == [
+        'http://example.com/sub/x']
+
+
+@pytest.mark.parametrize('kwargs, expected', [
+    ({'tags': ['link', 'img']},
+     ['http://e.com/style.css', 'http://e.com/image.png']),
+    ({'rel': ['nofollow']}, ['http://e.com/two']),
+    ({'exclude_rel': ['nofollow'], 'tags': ['a']},
+     ['http://e.com/page?a=1&b=2', 'http://e.com/three']),
+])
+def test_extract_links_filters(kwargs, expected):
+    assert extract_links(PAGE, 'http://e.com/', **kwargs) == expected
+
+
+@pytest.mark.parametrize('base', [
+    'http://example.com/a/b?q', 'https://example.com:8443', 'file:///tmp/x',
+])
+@pytest.mark.parametrize('link', [
+    '/x', '/x/../y', '//cdn.com/x', 'http://other.com', 'http://o.com/p',
+    'https://o.com/./p', 'y?z', '?q=1', '#top', '', '/\\\\evil.com',
+])
+def test_make_joiner_matches_urljoin(base, link):
+    assert make_joiner(base)(link) == urllib.parse.urljoin(base, link)
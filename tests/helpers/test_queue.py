@@ -0,0 +1,75 @@
+import collections
+import queue
+import threading
+import time
+
+import pytest
+
+from crawlster.config import Configuration
+from crawlster.helpers.queue import QueueHelper
+
+
+@pytest.mark.parametrize('strategy, expected', [
+    ('fifo', [1, 2, 3]),
+    ('lifo', [3, 2, 1]),
+])
+def test_queue_strategy_order(strategy, expected):
+    """Items are returned in the order imposed by the strategy"""
+    helper = QueueHelper(strategy)
+    for item in (1, 2, 3):
+        helper.put(item)
+    assert [helper.get_nowait() for _ in range(3)] == expected
+    with pytest.raises(queue.Empty):
+        helper.get_nowait()
+
+
+def test_queue_invalid_strategy():
+    with pytest.raises(ValueError):
+        QueueHelper('random')
+
+
+def test_queue_get_wakes_up_on_put():
+    """A blocked consumer is woken up as soon as an item is put"""
+    helper = QueueHelper()
+    helper.put('first')
+    got = []
+    consumer = threading.Thread(target=lambda: got.append(helper.get()))
+    consumer.start()
+    consumer.join(1)
+    assert got == ['first']
+    consumer = threading.Thread(target=lambda: got.append(helper.get()))
+    consumer.start()
+    helper.put('second')
+    consumer.join(1)
+    assert got == ['first', 'second']
+
+
+def test_queue_closes_when_idle():
+    """The queue is closed once all the jobs are done"""
+    helper = QueueHelper()
+    helper.put('job')
+    assert helper.get() == 'job'
+    with pytest.raises(queue.Empty):
+        helper.get(timeout=0.01)
+    assert not helper.is_closed()
+    helper.task_done()
+    assert helper.is_closed()
+    assert helper.get() is None
+    helper.join()
+
+
+def test_queue_per_host_rate():
+    """A consumer waits for a rate limited host instead of failing"""
+    helper = QueueHelper()
+    helper.config = Configuration({'queue.host_rate': 20})
+    helper.config.register_options(helper.config_options)
+    helper.initialize()
+    job = collections.namedtuple('Job', 'url')
+    helper.put(job('http://a.com/1'))
+    helper.put(job('http://a.com/2'))
+    helper.get()
+    with pytest.raises(queue.Empty):
+        helper.get_nowait()
+    started = time.monotonic()
+    assert helper.get(timeout=1) == job('http://a.com/2')
+    assert time.monotonic() - started > 0.02
@@ -0,0 +1,192 @@
+import collections
+import queue
+import threading
+import time
+import types
+
+import pytest
+
+from crawlster.exceptions import ConfigurationError
+from crawlster.helpers.queue import QueueHelper
+from crawlster.helpers.robots import RobotsHelper, RobotsRules
+from crawlster.helpers.urls import UrlsHelper
+
+ROBOTS = """
+User-agent: *
+Disallow: /private
+Allow: /private/public
+Disallow: /*.pdf$
+Disallow: /search?q=
+
+# the rules of mybot
+User-agent: MyBot
+User-agent: otherbot
+Disallow: /
+Allow: /pages
+Crawl-delay: 2
+"""
+
+
+@pytest.mark.parametrize('user_agent, path, expected', [
+    ('*', '/', True),
+    ('*', '/private', False),
+    ('*', '/private/page', False),
+    ('*', '/private/public/page', True),
+    ('*', '/doc.pdf', False),
+    ('*', '/doc.pdf?x=1', True),
+    ('*', '/search?q=crawler', False),
+    ('*', '/robots.txt', True),
+    ('mybot/1.0', '/private/public', False),
+    ('mybot/1.0', '/pages/1', True),
+    ('mybot/1.0', '/robots.txt', True),
+])
+def test_robots_rules(user_agent, path, expected):
+    rules = RobotsRules.parse(ROBOTS, user_agent)
+    assert rules.allowed(path) is expected
+
+
+def test_robots_rules_crawl_delay():
+    assert RobotsRules.parse(ROBOTS, 'MyBot').crawl_delay == 2
+    assert RobotsRules.parse(ROBOTS, 'somebot').crawl_delay is None
+
+
+def test_robots_rules_match_the_whole_product_token():
+    """A group only applies to the exact product token"""
+    text = 'User-agent: bot\nDisallow: /\n'
+    assert not RobotsRules.parse(text, 'Bot/2.1').allowed('/page')
+    assert RobotsRules.parse(text, 'mybot').allowed('/page')
+    assert RobotsRules.parse(ROBOTS, 'bot').crawl_delay is None
+
+
+def test_robots_rules_allow_wins_ties():
+    rules = RobotsRules.parse('User-agent: *\nDisallow: /a\nAllow: /a')
+    assert rules.allowed('/a')
+
+
+class FakeHttp(object):
+    def __init__(self, status_code=200, body=ROBOTS, delay=0):
+        self.status_code = status_code
+        self.body = body.encode()
+        self.delay = delay
+        self.fetched = []
+
+    def get(self, url):
+        self.fetched.append(url)
+        time.sleep(self.delay)
+        if self.status_code is None:
+            return None
+        return types.SimpleNamespace(status_code=self.status_code,
+                                     body=self.body)
+
+
+@pytest.fixture
+def make_helper(init_helper):
+    def make(http, **options):
+        opts = {'robots.enabled': True, 'robots.user_agent': 'mybot'}
+        opts.update(options)
+        robots = RobotsHelper()
+        jobs = init_helper(QueueHelper(), opts, robots=robots)
+        return init_helper(robots, opts, http=http, queue=jobs)
+
+    return make
+
+
+def test_robots_helper_coalesces_fetches(make_helper):
+    """Concurrent checks of the same site fetch robots.txt once"""
+    http = FakeHttp(delay=0.05)
+    helper = make_helper(http)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        helper.allowed('http://example.com/pages/1'))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [True] * 8
+    assert not helper.allowed('http://example.com/other')
+    assert http.fetched == ['http://example.com/robots.txt']
+    assert helper.crawler.stats.get(RobotsHelper.STAT_FORBIDDEN) == 1
+
+
+def test_robots_helper_cache_expiry_and_size(make_helper):
+    http = FakeHttp()
+    helper = make_helper(http, **{'robots.ttl': 0.05,
+                                  'robots.cache_size': 1})
+    helper.allowed('http://a.com/')
+    helper.allowed('http://b.com/')
+    helper.allowed('http://b.com/')
+    helper.allowed('http://a.com/')
+    assert len(http.fetched) == 3
+    time.sleep(0.06)
+    helper.allowed('http://a.com/')
+    assert len(http.fetched) == 4
+
+
+@pytest.mark.parametrize('status_code', [404, 503, None])
+def test_robots_helper_missing_or_failed(status_code, make_helper):
+    helper = make_helper(FakeHttp(status_code=status_code))
+    assert helper.allowed('http://example.com/private')
+
+
+def test_robots_helper_crawl_delay_limits_host_rate(make_helper):
+    """The jobs of a site with a Crawl-delay are spaced in the queue"""
+    helper = make_helper(FakeHttp(), **{'robots.max_crawl_delay': 0.05})
+    job = collections.namedtuple('Job', 'url')
+    jobs = helper.crawler.queue
+    jobs.put(job('http://example.com/pages/1'))
+    jobs.put(job('http://example.com/pages/2'))
+    jobs.put(job('http://other.com/'))
+    assert helper.allowed('http://example.com/pages/1')
+    assert jobs.get_nowait().url.startswith('http://example.com/')
+    assert jobs.get_nowait() == job('http://other.com/')
+    with pytest.raises(queue.Empty):
+        jobs.get_nowait()
+    assert jobs.get(timeout=1).url.startswith('http://example.com/')
+
+
+def test_robots_helper_crawl_delay_outlives_host_state(make_helper):
+    """The Crawl-delay applies again to the new jobs of an idle site"""
+    helper = make_helper(FakeHttp(), **{'robots.max_crawl_delay': 0.05})
+    job = collections.namedtuple('Job', 'url')
+    jobs = helper.crawler.queue
+    jobs.put(job('http://example.com/pages/1'))
+    assert helper.allowed('http://example.com/pages/1')
+    jobs.task_done(jobs.get_nowait())
+    time.sleep(0.06)
+    # the state of the idle host is dropped
+    with pytest.raises(queue.Empty):
+        jobs.get_nowait()
+    jobs.put(job('http://example.com/pages/2'))
+    jobs.put(job('http://example.com/pages/3'))
+    assert helper.allowed('http://example.com/pages/2')
+    jobs.get_nowait()
+    with pytest.raises(queue.Empty):
+        jobs.get_nowait()
+
+
+def test_queue_helper_host_rate_keeps_the_strategy(init_helper):
+    """The jobs are stored per host up front when robots.txt is obeyed"""
+    job = collections.namedtuple('Job', 'url')
+    jobs = init_helper(QueueHelper(strategy='lifo'),
+                       {'robots.enabled': True}, robots=RobotsHelper())
+    jobs.put(job('http://example.com/1'))
+    jobs.put(job('http://example.com/2'))
+    first = jobs.get_nowait()
+    jobs.set_host_rate('example.com', 1000)
+    assert jobs.get(timeout=1) == job('http://example.com/1')
+    assert first == job('http://example.com/2')
+    jobs.task_done(first)
+
+
+def test_queue_helper_host_rate_needs_host_frontier(init_helper):
+    jobs = init_helper(QueueHelper(), robots=RobotsHelper())
+    with pytest.raises(ConfigurationError):
+        jobs.set_host_rate('example.com', 1)
+
+
+def test_urls_helper_can_crawl_checks_robots(init_helper, make_helper):
+    robots = make_helper(FakeHttp())
+    urls = UrlsHelper()
+    init_helper(urls, robots.config.values, robots=robots)
+    assert urls.can_crawl('http://example.com/pages/1')
+    assert not urls.can_crawl('http://example.com/private')
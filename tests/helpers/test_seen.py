@@ -0,0 +1,94 @@
+import pytest
+
+from crawlster.config import Configuration
+from crawlster.exceptions import ConfigurationError
+from crawlster.helpers import seen
+from crawlster.helpers.seen import ExactSeenSet, BloomFilter, \
+    ScalableBloomFilter
+from crawlster.helpers.urls import UrlsHelper
+
+
+def make_urls_helper(**options):
+    helper = UrlsHelper()
+    helper.config = Configuration(options)
+    helper.config.register_options(helper.config_options)
+    helper.initialize()
+    return helper
+
+
+@pytest.mark.parametrize('seen_set', [
+    ExactSeenSet(), ScalableBloomFilter(capacity=100)
+])
+def test_seen_set_add(seen_set):
+    assert seen_set.add('http://a.com/')
+    assert not seen_set.add('http://a.com/')
+    assert 'http://a.com/' in seen_set
+    assert 'http://b.com/' not in seen_set
+    assert len(seen_set) == 1
+
+
+def test_bloom_filter_false_positive_rate():
+    bloom = BloomFilter(10000, 0.01)
+    for i in range(10000):
+        bloom.add('http://a.com/{}'.format(i))
+    false_positives = sum('http://b.com/{}'.format(i) in bloom
+                          for i in range(10000))
+    assert false_positives < 200
+
+
+def test_scalable_bloom_filter_grows():
+    bloom = ScalableBloomFilter(capacity=100, error_rate=0.01)
+    urls = ['http://a.com/{}'.format(i) for i in range(1000)]
+    for url in urls:
+        bloom.add(url)
+    assert len(bloom.filters) > 1
+    assert all(url in bloom for url in urls)
+    # a few bits per url instead of the urls themselves
+    assert bloom.size_in_bytes() < 4 * len(urls)
+
+
+def test_scalable_bloom_filter_save_load(tmpdir):
+    path = str(tmpdir.join('seen.bloom'))
+    bloom = ScalableBloomFilter(capacity=10, error_rate=0.01)
+    for i in range(50):
+        bloom.add('http://a.com/{}'.format(i))
+    bloom.save(path)
+    loaded = ScalableBloomFilter.load(path)
+    assert len(loaded) == len(bloom)
+    assert [f.bits for f in loaded.filters] == [f.bits for f in bloom.filters]
+    assert 'http://a.com/42' in loaded
+    assert loaded.add('http://b.com/')
+
+
+def test_scalable_bloom_filter_save_does_not_lock_writes(tmpdir,
+                                                         monkeypatch):
+    """The filter can be used while its copy is written"""
+    bloom = ScalableBloomFilter(capacity=10, error_rate=0.01)
+    bloom.add('http://a.com/')
+    locked = []
+
+    def fake_open(path, mode):
+        locked.append(bloom._lock.locked())
+        return open(path, mode)
+
+    monkeypatch.setattr(seen, 'open', fake_open, raising=False)
+    bloom.save(str(tmpdir.join('seen.bloom')))
+    assert locked == [False]
+
+
+def test_urls_helper_bloom_backend_persists(tmpdir):
+    path = str(tmpdir.join('seen.bloom'))
+    helper = make_urls_helper(**{'urls.seen_backend': 'bloom',
+                                 'urls.seen_path': path})
+    assert helper.mark_seen('http://a.com/')
+    assert not helper.mark_seen('http://a.com/')
+    helper.finalize()
+    helper = make_urls_helper(**{'urls.seen_backend': 'bloom',
+                                 'urls.seen_path': path})
+    assert helper.seen('http://a.com/')
+    assert not helper.seen('http://b.com/')
+
+
+def test_urls_helper_seen_path_requires_bloom(tmpdir):
+    with pytest.raises(ConfigurationError):
+        make_urls_helper(**{'urls.seen_path': str(tmpdir.join('seen'))})
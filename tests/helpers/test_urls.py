@@ -0,0 +1,17 @@
+import pytest
+
+from crawlster.helpers.urls import UrlsHelper
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('HTTP://Example.COM:80/a?b=2&a=1#top', 'http://example.com/a?a=1&b=2'),
+    ('https://example.com:8443', 'https://example.com:8443/'),
+    ('http://example.com/?utm_source=x&fbclid=y&id=3',
+     'http://example.com/?id=3'),
+    # the parameters are not decoded nor encoded again
+    ('http://example.com/s?q=a%20b&flag&p=%2Fx&utm_medium=y',
+     'http://example.com/s?flag&p=%2Fx&q=a%20b'),
+    ('http://example.com/?b=1&&a=x+y', 'http://example.com/?a=x+y&b=1'),
+])
+def test_urls_helper_canonicalize(url, expected):
+    assert UrlsHelper().canonicalize(url) == expected
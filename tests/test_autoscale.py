@@ -0,0 +1,38 @@
+import pytest
+
+from crawlster.autoscale import Autoscaler
+from crawlster.exceptions import ConfigurationError
+
+
+@pytest.fixture
+def autoscaler():
+    return Autoscaler(min_workers=2, max_workers=20, interval=1.0)
+
+
+@pytest.mark.parametrize('current, busy, backlog, latency, expected', [
+    # backlog without latency info: one worker per pending job
+    (2, 2, 3, None, 4),
+    # the pool at most doubles
+    (4, 4, 100, None, 8),
+    # enough workers to drain the backlog in one interval
+    (4, 4, 10, 0.2, 6),
+    # never above the maximum
+    (16, 16, 100, 1.0, 20),
+    # idle workers can handle the backlog
+    (4, 1, 2, 0.5, 4),
+    # no backlog: the idle workers are halved
+    (10, 2, 0, 0.5, 6),
+    # never below the minimum
+    (3, 0, 0, None, 2),
+])
+def test_autoscaler_desired(autoscaler, current, busy, backlog, latency,
+                            expected):
+    assert autoscaler.desired(current, busy, backlog, latency) == expected
+
+
+@pytest.mark.parametrize('min_workers, max_workers, interval', [
+    (0, 10, 1), (5, 4, 1), (1, 4, 0)
+])
+def test_autoscaler_invalid_limits(min_workers, max_workers, interval):
+    with pytest.raises(ConfigurationError):
+        Autoscaler(min_workers, max_workers, interval)
@@ -1,4 +1,321 @@
+import asyncio
+import gzip
+import threading
+import time
+
+import pytest
+
 from crawlster.config import Configuration
-from crawlster.core import Crawlster
+from crawlster.core import Crawlster, start, cpu_bound, get_current_job
+from crawlster.handlers.base import BaseItemHandler
+from crawlster.helpers import StatsHelper, QueueHelper, UrlsHelper
+from crawlster.helpers.extract import ExtractHelper
+from crawlster.helpers.http.request import GetRequest
+from crawlster.helpers.http.response import HttpResponse
+
+
+class CollectingHandler(BaseItemHandler):
+    """Item handler that keeps the submitted items in memory"""
+
+    def __init__(self):
+        super(CollectingHandler, self).__init__()
+        self.items = []
+        self._lock = threading.Lock()
+
+    def handle(self, item):
+        with self._lock:
+            self.items.append(item)
+
+
+def make_crawler(crawler_cls, **options):
+    opts = {'core.start_urls': ['http://localhost/'], 'core.workers': 2,
+            'log.level': 'warning'}
+    opts.update(options)
+    crawler_cls.item_handler = CollectingHandler()
+    return crawler_cls(Configuration(opts))
+
+
+class SyncCrawler(Crawlster):
+    @start
+    def step_start(self, url):
+        for index in range(10):
+            self.schedule(self.step_child, url, index)
+
+    def step_child(self, url, index):
+        return {'url': url, 'index': index}
+
+
+class AsyncCrawler(Crawlster):
+    @start
+    async def step_start(self, url):
+        for index in range(10):
+            self.schedule(self.step_child, url, index)
+        self.schedule(self.step_sync, url)
+
+    async def step_child(self, url, index):
+        await asyncio.sleep(0)
+        return {'url': url, 'index': index}
+
+    def step_sync(self, url):
+        return {'url': url, 'index': 'sync'}
+
+
+@pytest.mark.parametrize('engine', ['threads', 'asyncio'])
+def test_sync_steps(engine):
+    """Regular steps are processed by both engines"""
+    crawler = make_crawler(SyncCrawler, **{'core.engine': engine})
+    crawler.start()
+    indexes = sorted(i['index'] for i in crawler.item_handler.items)
+    assert indexes == list(range(10))
+
+
+def test_asyncio_engine_coroutine_steps():
+    """Coroutine steps and regular steps are mixed in the asyncio engine"""
+    crawler = make_crawler(AsyncCrawler, **{'core.engine': 'asyncio',
+                                            'core.concurrency': 3})
+    crawler.start()
+    items = crawler.item_handler.items
+    assert len(items) == 11
+    assert {'url': 'http://localhost/', 'index': 'sync'} in items
+
+
+class BlockingCallCrawler(Crawlster):
+    @start
+    async def step_start(self, url):
+        allowed = await self.http.aio.run(self.urls.can_crawl, url)
+        with pytest.raises(RuntimeError):
+            self.http.get(url)
+        return {'url': url, 'allowed': allowed}
+
+
+def test_asyncio_engine_blocking_calls():
+    """Blocking requests are refused on the event loop, aio.run offloads"""
+    crawler = make_crawler(BlockingCallCrawler, **{'core.engine': 'asyncio'})
+    crawler.start()
+    assert crawler.item_handler.items == [
+        {'url': 'http://localhost/', 'allowed': True}]
+
+
+class EagerDispatchCrawler(Crawlster):
+    @start
+    async def step_start(self, url):
+        for index in range(3):
+            self.schedule(self.step_child, url, index)
+        await asyncio.sleep(0.5)
+        return {'finished': time.monotonic()}
+
+    async def step_child(self, url, index):
+        return {'started': time.monotonic()}
+
+
+def test_asyncio_engine_dispatches_scheduled_jobs_right_away():
+    """The children start while their parent is still awaiting"""
+    crawler = make_crawler(EagerDispatchCrawler, **{'core.engine': 'asyncio'})
+    crawler.start()
+    items = crawler.item_handler.items
+    [finished] = [i['finished'] for i in items if 'finished' in i]
+    started = [i['started'] for i in items if 'started' in i]
+    assert len(started) == 3
+    assert max(started) < finished - 0.3
+
+
+class SlowCrawler(Crawlster):
+    stats = StatsHelper()
+
+    @start
+    def step_start(self, url):
+        for index in range(40):
+            self.schedule(self.step_child, url, index)
+
+    def step_child(self, url, index):
+        time.sleep(0.01)
+        return {'url': url, 'index': index}
+
+
+def test_autoscaled_pool_grows():
+    """The worker pool grows with the backlog and reports its size"""
+    crawler = make_crawler(SlowCrawler, **{'core.autoscale': True,
+                                           'core.workers': 1,
+                                           'core.max_workers': 8,
+                                           'core.autoscale_interval': 0.02})
+    crawler.start()
+    assert len(crawler.item_handler.items) == 40
+    history = [count for _, count in
+               crawler.stats.get(Crawlster.STAT_WORKERS_HISTORY)]
+    assert history[0] == 1
+    assert max(history) > 1
+    assert max(history) <= 8
+
+
+PAGE = b"""<ul>
+<li><a href="/first">First</a></li>
+<li><a href="/second">Second</a></li>
+</ul>"""
+
+
+class ParsingCrawler(Crawlster):
+    @start
+    def step_start(self, url):
+        # decompressed by the worker process
+        resp = HttpResponse(GetRequest(url), 200, {}, gzip.compress(PAGE),
+                            content_encoding='gzip')
+        self.schedule(self.step_parse, resp)
+
+    @cpu_bound
+    def step_parse(self, resp):
+        hrefs = self.extract.css(resp.body, 'a', attr='href')
+        for link in self.extract.links(resp):
+            self.schedule(self.step_link, link)
+        return {'links': len(hrefs)}
+
+    def step_link(self, url):
+        return {'url': url}
+
+
+def test_cpu_bound_steps_run_in_processes():
+    """Items and jobs produced in the process pool reach the main queue"""
+    crawler = make_crawler(ParsingCrawler, **{'core.processes': 1})
+    crawler.start()
+    items = crawler.item_handler.items
+    assert {'links': 2} in items
+    assert {'url': 'http://localhost/first'} in items
+    assert {'url': 'http://localhost/second'} in items
+    # counted in the worker process
+    assert crawler.stats.get(ExtractHelper.STAT_CACHE_MISSES) == 1
+
+
+class SeenParsingCrawler(Crawlster):
+    @start
+    def step_start(self, url):
+        self.schedule(self.step_parse, url)
+
+    @cpu_bound
+    def step_parse(self, url):
+        return {'new': self.urls.mark_seen(url)}
+
+
+def test_cpu_bound_steps_refuse_parent_only_helpers():
+    """The seen urls are not silently forked in the process pool"""
+    crawler = make_crawler(SeenParsingCrawler, **{'core.processes': 1})
+    crawler.start()
+    assert crawler.item_handler.items == []
+    errors = crawler.stats.get(Crawlster.STAT_ERRORS)
+    assert 'urls helper' in str(errors[0]['exception'])
+
+
+class PriorityCrawler(Crawlster):
+    queue = QueueHelper(strategy='priority')
+
+    @start
+    def step_start(self, url):
+        self.schedule(self.step_page, url + 'detail')
+        self.schedule(self.step_page, url + 'listing', priority=10)
+        self.schedule(self.step_nested, url)
+
+    def step_nested(self, url):
+        self.schedule(self.step_page, url + 'nested')
+
+    def step_page(self, url):
+        return {'url': url, 'depth': get_current_job().depth}
+
+
+def test_priority_queue_strategy():
+    """Explicit priorities first, then the shallow jobs"""
+    crawler = make_crawler(PriorityCrawler, **{'core.workers': 1})
+    crawler.start()
+    items = crawler.item_handler.items
+    assert items == [
+        {'url': 'http://localhost/listing', 'depth': 1},
+        {'url': 'http://localhost/detail', 'depth': 1},
+        {'url': 'http://localhost/nested', 'depth': 2},
+    ]
+
+
+class AsyncDepthCrawler(Crawlster):
+    @start
+    async def step_start(self, url):
+        self.schedule(self.step_nested, url)
+        await asyncio.sleep(0)
+        self.schedule(self.step_page, url + 'detail')
+
+    async def step_nested(self, url):
+        await asyncio.sleep(0)
+        self.schedule(self.step_page, url + 'nested')
+        self.schedule(self.step_sync, url + 'sync')
+
+    def step_sync(self, url):
+        self.schedule(self.step_page, url)
+
+    async def step_page(self, url):
+        await asyncio.sleep(0)
+        return {'url': url, 'depth': get_current_job().depth}
+
+
+def test_asyncio_engine_job_depth():
+    """The depth follows each coroutine across awaits and threads"""
+    crawler = make_crawler(AsyncDepthCrawler, **{'core.engine': 'asyncio'})
+    crawler.start()
+    items = sorted(crawler.item_handler.items, key=lambda i: i['url'])
+    assert items == [
+        {'url': 'http://localhost/detail', 'depth': 1},
+        {'url': 'http://localhost/nested', 'depth': 2},
+        {'url': 'http://localhost/sync', 'depth': 3},
+    ]
+
+
+class SpillingCrawler(Crawlster):
+    stats = StatsHelper()
+    queue = QueueHelper(strategy='fifo')
+
+    @start
+    def step_start(self, url):
+        for index in range(50):
+            self.schedule(self.step_child, url, index)
+        self.spilled = self.stats.get(QueueHelper.STAT_SPILLED)
+
+    def step_child(self, url, index):
+        return {'url': url, 'index': index}
+
+
+def test_spilling_queue(tmp_path):
+    """Jobs spilled to disk are restored and processed"""
+    crawler = make_crawler(SpillingCrawler, **{'queue.max_resident': 10,
+                                               'queue.spill_batch': 5,
+                                               'queue.spill_dir': str(tmp_path),
+                                               'core.workers': 1})
+    crawler.start()
+    indexes = [i['index'] for i in crawler.item_handler.items]
+    assert indexes == list(range(50))
+    assert crawler.spilled == 40
+    assert crawler.stats.get(QueueHelper.STAT_SPILLED) == 0
+    assert list(tmp_path.iterdir()) == []
+
+
+class DedupCrawler(Crawlster):
+    stats = StatsHelper()
+    urls = UrlsHelper()
+
+    @start
+    def step_start(self, url):
+        for link in ('http://Localhost:80/a#top', 'http://localhost/a',
+                     'http://localhost/a?utm_source=x', 'http://localhost/b'):
+            self.schedule(self.step_child, link)
+        self.schedule(self.step_other, url='http://localhost/a')
+
+    def step_child(self, url):
+        return {'step': 'child', 'url': url}
+
+    def step_other(self, url):
+        return {'step': 'other', 'url': url}
 
 
+def test_schedule_dedup():
+    """Jobs for an already scheduled step and canonical url are dropped"""
+    crawler = make_crawler(DedupCrawler, **{'urls.dedup': True})
+    crawler.start()
+    items = sorted((i['step'], i['url']) for i in crawler.item_handler.items)
+    # the urls are fetched as they were scheduled
+    assert items == [('child', 'http://Localhost:80/a#top'),
+                     ('child', 'http://localhost/b'),
+                     ('other', 'http://localhost/a')]
+    assert crawler.stats.get(UrlsHelper.STAT_DUPLICATES) == 2
@@ -0,0 +1,136 @@
+import json
+import threading
+import time
+
+import pytest
+
+from crawlster.handlers.jsonl import JsonLinesHandler
+from crawlster.helpers import jsonlib
+
+
+def write_concurrently(handler, threads=8, items=500):
+    def worker(index):
+        for number in range(items):
+            handler.handle({'thread': index, 'number': number,
+                            'text': 'x' * (number % 100)})
+    workers = [threading.Thread(target=worker, args=(index,))
+               for index in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+
+@pytest.mark.parametrize('kwargs', [
+    {},
+    {'buffered': True, 'batch_size': 64, 'max_queue': 100},
+    {'buffered': True, 'fsync': 'batch', 'encoder': 'auto'},
+])
+def test_jsonl_handler_lines_are_atomic(tmpdir, kwargs):
+    path = str(tmpdir.join('items.jsonl'))
+    handler = JsonLinesHandler(path, **kwargs)
+    handler.initialize()
+    write_concurrently(handler)
+    handler.finalize()
+    with open(path) as f:
+        items = [json.loads(line) for line in f]
+    assert len(items) == 8 * 500
+    assert sorted((i['thread'], i['number']) for i in items) == \
+        [(t, n) for t in range(8) for n in range(500)]
+
+
+def test_jsonl_handler_flush_interval(tmpdir):
+    path = tmpdir.join('items.jsonl')
+    handler = JsonLinesHandler(str(path), buffered=True, flush_interval=0.05)
+    handler.initialize()
+    handler.handle({'a': 1})
+    deadline = time.monotonic() + 2
+    while not path.read() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert path.read() == '{"a": 1}\n'
+    handler.finalize()
+
+
+def test_jsonl_handler_encoder(tmpdir):
+    path = tmpdir.join('items.jsonl')
+    handler = JsonLinesHandler(
+        str(path), encoder=lambda item: ','.join(sorted(item)))
+    handler.initialize()
+    handler.handle({'b': 1, 'a': 2})
+    handler.finalize()
+    assert path.read() == 'a,b\n'
+    with pytest.raises(ValueError):
+        JsonLinesHandler(str(path), encoder='simdjson')
+    with pytest.raises(ValueError):
+        JsonLinesHandler(str(path), fsync='always')
+
+
+@pytest.mark.skipif('orjson' not in jsonlib.DUMPERS,
+                    reason='orjson not installed')
+def test_jsonl_handler_orjson(tmpdir):
+    path = tmpdir.join('items.jsonl')
+    handler = JsonLinesHandler(str(path), buffered=True, encoder='orjson')
+    handler.initialize()
+    handler.handle({'a': [1, 'é'], 2: None})
+    handler.finalize()
+    assert json.loads(path.read_text('utf-8')) == {'a': [1, 'é'], '2': None}
+
+
+class FailingFile(object):
+    def __init__(self, fail_on='write'):
+        self.fail_on = fail_on
+        self.closed = False
+
+    def write(self, data):
+        if self.fail_on == 'write':
+            raise OSError('No space left on device')
+
+    def flush(self):
+        if self.fail_on == 'flush':
+            raise OSError('No space left on device')
+
+    def close(self):
+        self.closed = True
+
+
+def test_jsonl_handler_writer_failure(tmpdir):
+    """The workers get their own error and never block on a dead writer"""
+    handler = JsonLinesHandler(str(tmpdir.join('items.jsonl')),
+                               buffered=True, batch_size=1, max_queue=1)
+    handler.initialize()
+    handler.fp.close()
+    handler.fp = FailingFile()
+    errors = []
+
+    def worker():
+        for number in range(100):
+            try:
+                handler.handle({'number': number})
+            except RuntimeError as e:
+                errors.append(e)
+                return
+
+    workers = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join(5)
+    assert not any(thread.is_alive() for thread in workers)
+    assert len(errors) == 4
+    assert len(set(map(id, errors))) == 4
+    assert all(isinstance(e.__cause__, OSError) for e in errors)
+    # already reported to the workers
+    handler.finalize()
+    assert handler.fp.closed
+
+
+def test_jsonl_handler_writer_failure_on_finalize(tmpdir):
+    handler = JsonLinesHandler(str(tmpdir.join('items.jsonl')),
+                               buffered=True, flush_interval=60)
+    handler.initialize()
+    handler.fp.close()
+    handler.fp = FailingFile('flush')
+    handler.handle({'a': 1})
+    with pytest.raises(RuntimeError) as info:
+        handler.finalize()
+    assert isinstance(info.value.__cause__, OSError)